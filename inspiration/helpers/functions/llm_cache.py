@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Identical copies of this module live in standalone-chat/src/tools,
+# python-pipeline-sandbox/src/tools and inspiration/helpers/functions (like
+# readwise_transport.py and document_digest.py): each project installs and
+# deploys from its own directory (standalone-chat's Railway root and Dockerfile
+# only see standalone-chat/), so none can import another's code. Change all
+# three together.
+
+# Identical LLM requests (retries, test runs, reprocessing) are answered from here
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_responses.sqlite3")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_DISK_ENTRIES = int(os.getenv("LLM_CACHE_DISK_ENTRIES", "10000"))
+
+# Prune the disk tier once every this many writes
+_PRUNE_EVERY = 100
+
+
+def _canonical(value: Any) -> Any:
+    """JSON-able form of a request value; pydantic model classes become their schema."""
+    if isinstance(value, type) and hasattr(value, "model_json_schema"):
+        return {"schema": value.model_json_schema(), "name": value.__name__}
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return value
+
+
+def request_key(**request: Any) -> str:
+    """Content hash of an LLM request: model, instructions/messages, input, params, response schema."""
+    payload = json.dumps(_canonical(request), sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text or "") // 4 + 1
+
+
+class LLMCache:
+    """Two-tier response cache: in-memory LRU in front of a SQLite file.
+
+    Values are response text (structured outputs are stored as their JSON).
+    Entries expire after ttl seconds; each tier evicts least recently used
+    entries beyond its size. path=None keeps the cache memory-only.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = LLM_CACHE_PATH,
+        ttl: float = LLM_CACHE_TTL_SECONDS,
+        max_memory_entries: int = LLM_CACHE_MEMORY_ENTRIES,
+        max_disk_entries: int = LLM_CACHE_DISK_ENTRIES,
+        enabled: bool = LLM_CACHE_ENABLED,
+    ) -> None:
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.enabled = enabled
+        self._memory: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes = 0
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._saved_tokens = 0
+        if enabled and path:
+            self._db = self._open(path)
+
+    @staticmethod
+    def _open(path: str) -> Optional[sqlite3.Connection]:
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, tokens INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache(last_used)")
+            db.commit()
+            return db
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"⚠️  LLM cache disk tier disabled ({path}): {e}")
+            return None
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached value for key, or None; counts a hit or miss."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached and cached[0] + self.ttl > now:
+                self._memory.move_to_end(key)
+                self._memory_hits += 1
+                self._saved_tokens += cached[2]
+                return cached[1]
+            if cached:
+                del self._memory[key]
+
+            row = None
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT value, tokens, created_at FROM llm_cache WHERE key = ? AND created_at > ?",
+                        (key, now - self.ttl),
+                    ).fetchone()
+                    if row:
+                        self._db.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"⚠️  LLM cache read failed: {e}")
+                    row = None
+            if row is None:
+                self._misses += 1
+                return None
+            value, tokens, created_at = row
+            self._remember(key, created_at, value, tokens)
+            self._disk_hits += 1
+            self._saved_tokens += tokens
+            return value
+
+    def put(self, key: str, value: str, tokens: Optional[int] = None) -> None:
+        """Store a response; tokens is what a later hit saves (estimated from value if unknown)."""
+        if not self.enabled or value is None:
+            return
+        tokens = tokens if tokens is not None else estimate_tokens(value)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value, tokens)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, tokens, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, tokens, now, now),
+                )
+                self._writes += 1
+                if self._writes % _PRUNE_EVERY == 0:
+                    self._prune(now)
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️  LLM cache write failed: {e}")
+
+    def cached(self, key: str, compute: Callable[[], Tuple[str, Optional[int]]], bypass: bool = False) -> str:
+        """Return the cached value for key, or compute() -> (value, tokens) and store it.
+
+        bypass=True always calls compute and leaves the cache untouched (non-deterministic runs).
+        """
+        if bypass:
+            return compute()[0]
+        value = self.get(key)
+        if value is not None:
+            return value
+        value, tokens = compute()
+        self.put(key, value, tokens)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._memory_hits + self._disk_hits
+            total = hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": hits / total if total else 0.0,
+                "saved_tokens": self._saved_tokens,
+                "memory_entries": len(self._memory),
+            }
+
+    # Internals (call with self._lock held)
+    def _remember(self, key: str, created_at: float, value: str, tokens: int) -> None:
+        self._memory[key] = (created_at, value, tokens)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _prune(self, now: float) -> None:
+        self._db.execute("DELETE FROM llm_cache WHERE created_at <= ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+
+
+_default_cache: Optional[LLMCache] = None
+_default_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """Process-wide cache configured from the LLM_CACHE_* env vars."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = LLMCache()
+    return _default_cache
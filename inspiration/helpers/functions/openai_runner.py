@@ -2,6 +2,7 @@ from typing import Type
 from pydantic import BaseModel
 import json, os, traceback
 from openai import OpenAI
+from helpers.functions.llm_cache import get_llm_cache, request_key
 
 def run_openai_structured(
     system_prompt: str,
@@ -10,29 +11,43 @@ def run_openai_structured(
     model: str = "gpt-5",
     retries: int = 2,
     reasoning_effort: str = "medium",
+    use_cache: bool = True,
 ):
+    """use_cache=False skips the response cache (always call the API, store nothing)."""
     client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
     last_error = None
 
+    schema_dict = output_cls.model_json_schema()
+    schema_str = json.dumps(schema_dict, indent=2)
+    request = dict(
+        model=model,
+        instructions=(
+            system_prompt
+            + f"\n\nYou must respond with valid json that matches this exact schema:\n{schema_str}."
+        ),
+        input=f"{user_prompt}. Return a json object that matches the provided schema exactly. No prose.",
+        text={"format": {"type": "json_object"}, "verbosity": "medium"},
+        reasoning={"effort": reasoning_effort},
+        tools=[],
+        include=["reasoning.encrypted_content"],
+    )
+
+    cache = get_llm_cache()
+    cache_key = request_key(api="responses", **request)
+    if use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            try:
+                print("OpenAI response served from cache")
+                return output_cls(**json.loads(cached))
+            except Exception as e:
+                print(f"Cached response no longer matches schema, calling API: {e}")
+
     for attempt in range(retries + 1):
         try:
             print(f"OpenAI attempt {attempt + 1}/{retries + 1}")
 
-            schema_dict = output_cls.model_json_schema()
-            schema_str = json.dumps(schema_dict, indent=2)
-            
-            response = client.responses.create(
-                model=model,
-                instructions=(
-                    system_prompt
-                    + f"\n\nYou must respond with valid json that matches this exact schema:\n{schema_str}."
-                ),
-                input=f"{user_prompt}. Return a json object that matches the provided schema exactly. No prose.",
-                text={"format": {"type": "json_object"}, "verbosity": "medium"},
-                reasoning={"effort": reasoning_effort},
-                tools=[],
-                include=["reasoning.encrypted_content"],
-            )
+            response = client.responses.create(**request)
 
             content = getattr(response, "output_text", None)
             if not content:
@@ -58,7 +73,11 @@ def run_openai_structured(
                 data = json.loads(content[start : end + 1])
 
             try:
-                return output_cls(**data)
+                result = output_cls(**data)
+                if use_cache:
+                    usage = getattr(response, "usage", None)
+                    cache.put(cache_key, json.dumps(data), getattr(usage, "total_tokens", None))
+                return result
             except Exception as validation_error:
                 print(f"Pydantic validation failed: {validation_error}")
                 raise validation_error
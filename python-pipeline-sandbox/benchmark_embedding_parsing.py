@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Embedding Parsing Benchmark
+===========================
+
+Compares ways of turning pgvector's text form ('[0.1,-0.2,...]') into NumPy
+on a few thousand synthetic rows:
+
+- ast.literal_eval (the original parse_embedding)
+- json.loads + np.array
+- parse_vector (np.fromstring, no intermediate Python floats)
+
+With --live it also times a real Supabase round trip: downloading every
+format_examples row and ranking client-side, versus server-side distance
+through the match_format_examples RPC.
+"""
+
+import argparse
+import ast
+import json
+import os
+import time
+
+import numpy as np
+
+from src.tools.vector_utils import parse_vector, parse_vectors
+
+
+def synthetic_rows(count, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    # pgvector prints float4 values in shortest round-trip form
+    return ["[" + ",".join(str(x) for x in row) + "]" for row in rng.normal(size=(count, dim)).astype(np.float32)]
+
+
+def bench(label, fn, rows, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(rows)
+        best = min(best, time.perf_counter() - started)
+    matrix = np.vstack(result).astype(np.float32)
+    print(f"{label:<28} {best * 1000:>10.1f} ms {best / len(rows) * 1e6:>10.1f} µs/row")
+    return matrix
+
+
+def live(top_k):
+    from dotenv import load_dotenv
+    from openai import OpenAI
+    from supabase import create_client
+
+    load_dotenv()
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON_KEY"))
+    openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    query = openai_client.embeddings.create(model="text-embedding-ada-002", input="content strategy frameworks").data[0].embedding
+
+    started = time.perf_counter()
+    rows = supabase.table("format_examples").select("*").execute().data
+    vectors = parse_vectors([row.get("embedding") for row in rows])
+    matrix = np.vstack([v for v in vectors if v is not None])
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    _ = np.argsort(-(matrix @ (np.asarray(query, dtype=np.float32) / np.linalg.norm(query))))[:top_k]
+    client_side = time.perf_counter() - started
+
+    started = time.perf_counter()
+    supabase.rpc("match_format_examples", {"query_embedding": query, "match_threshold": 0.0, "match_count": top_k}).execute()
+    server_side = time.perf_counter() - started
+
+    print(f"\n🌐 Live ({len(rows)} rows)")
+    print(f"{'download + client ranking':<28} {client_side * 1000:>10.1f} ms")
+    print(f"{'match_format_examples RPC':<28} {server_side * 1000:>10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pgvector text parsing")
+    parser.add_argument("--rows", type=int, default=3000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--live", action="store_true", help="Also time fetching from Supabase vs the RPC")
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows, args.dim)
+    print(f"📐 {args.rows} rows × {args.dim} dims ({sum(len(r) for r in rows) / 1e6:.1f} MB of text)\n")
+
+    reference = bench("ast.literal_eval", lambda rs: [np.array(ast.literal_eval(r)) for r in rs], rows, args.repeat)
+    bench("json.loads", lambda rs: [np.array(json.loads(r), dtype=np.float32) for r in rs], rows, args.repeat)
+    fast = bench("parse_vector", lambda rs: [parse_vector(r) for r in rs], rows, args.repeat)
+
+    assert np.allclose(reference, fast), "parsers disagree"
+    print("\n✅ All parsers agree")
+
+    if args.live:
+        live(top_k=3)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+HTML Extraction Benchmark
+=========================
+
+Runs each extraction backend (and the full cascade, serially and through the
+process pool) over a corpus of saved HTML pages and reports throughput,
+p50/p95 latency and extracted-text quality.
+
+Quality is word-level F1 against a reference text when one exists
+(`<page>.txt` next to `<page>.html`, or in --gold-dir); otherwise only
+output length and the share of pages with no text are reported.
+"""
+
+import argparse
+import glob
+import os
+import re
+import statistics
+import time
+from collections import Counter
+
+from src.tools.html_utils import (
+    HTML_EXTRACT_MIN_CHARS,
+    HTML_EXTRACT_TIMEOUT_SECONDS,
+    available_backends,
+    extract_many,
+    extract_readable_text,
+    extract_with,
+    get_extraction_pool,
+)
+
+
+def load_corpus(directory, gold_dir=None, limit=None):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.htm*")))[:limit]:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            html = f.read()
+        stem = os.path.splitext(os.path.basename(path))[0]
+        gold_path = os.path.join(gold_dir or directory, stem + ".txt")
+        gold = None
+        if os.path.exists(gold_path):
+            with open(gold_path, encoding="utf-8", errors="replace") as f:
+                gold = f.read()
+        pages.append({"name": stem, "html": html, "gold": gold})
+    return pages
+
+
+def word_f1(predicted, reference):
+    predicted_words = Counter(re.findall(r"\w+", predicted.lower()))
+    reference_words = Counter(re.findall(r"\w+", reference.lower()))
+    overlap = sum((predicted_words & reference_words).values())
+    if not overlap:
+        return 0.0
+    precision = overlap / sum(predicted_words.values())
+    recall = overlap / sum(reference_words.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(label, pages, texts, latencies, elapsed):
+    scored = [word_f1(text, page["gold"]) for page, text in zip(pages, texts) if page["gold"] is not None]
+    return {
+        "backend": label,
+        "docs_per_s": len(pages) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 95) * 1000 if latencies else None,
+        "avg_chars": sum(len(t) for t in texts) / len(texts),
+        "empty": sum(1 for t in texts if not t) / len(texts),
+        "f1": statistics.mean(scored) if scored else None,
+    }
+
+
+def run_serial(label, pages, extract):
+    texts, latencies = [], []
+    started = time.perf_counter()
+    for page in pages:
+        t0 = time.perf_counter()
+        texts.append(extract(page["html"]))
+        latencies.append(time.perf_counter() - t0)
+    return summarize(label, pages, texts, latencies, time.perf_counter() - started)
+
+
+def run_pool(pages, timeout, min_chars):
+    pool = get_extraction_pool()
+    # Warm the workers so process start-up isn't counted
+    extract_many([("<p>warm up</p>", None)] * getattr(pool, "_max_workers", 1), pool=pool)
+    started = time.perf_counter()
+    texts = extract_many([(page["html"], None) for page in pages], min_chars=min_chars, timeout=timeout, pool=pool)
+    elapsed = time.perf_counter() - started
+    # Per-document latency isn't observable through pool.map; report throughput only
+    return summarize("cascade (pool)", pages, texts, [], elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML text extraction backends")
+    parser.add_argument("--corpus", required=True, help="Directory of saved .html pages")
+    parser.add_argument("--gold-dir", default=None, help="Directory of reference .txt files (default: alongside the pages)")
+    parser.add_argument("--limit", type=int, default=None, help="Use at most this many pages")
+    parser.add_argument("--timeout", type=float, default=HTML_EXTRACT_TIMEOUT_SECONDS, help="Per-document timeout for the pool run")
+    parser.add_argument("--min-chars", type=int, default=HTML_EXTRACT_MIN_CHARS,
+                        help="Cascade threshold for the cascade runs (0: first non-empty result)")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus, args.gold_dir, args.limit)
+    if not pages:
+        print(f"❌ No .html pages in {args.corpus}")
+        return
+    print(f"📚 {len(pages)} pages, {sum(1 for p in pages if p['gold'] is not None)} with reference text")
+    print(f"🔧 Backends: {', '.join(available_backends()) or 'none installed'}")
+
+    results = [run_serial(name, pages, lambda html, name=name: extract_with(name, html)) for name in available_backends()]
+    results.append(run_serial("cascade", pages, lambda html: extract_readable_text(html, min_chars=args.min_chars)))
+    results.append(run_pool(pages, args.timeout, args.min_chars))
+
+    def fmt(value, spec, width):
+        return format(value, f">{width}{spec}") if value is not None else format("-", f">{width}")
+
+    print(f"\n{'Backend':<16} {'docs/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'avg chars':>10} {'empty':>6} {'F1':>6}")
+    print("-" * 68)
+    for r in results:
+        print(f"{r['backend']:<16} {r['docs_per_s']:>8.1f} {fmt(r['p50_ms'], '.1f', 8)} {fmt(r['p95_ms'], '.1f', 8)} "
+              f"{r['avg_chars']:>10.0f} {r['empty']:>6.0%} {fmt(r['f1'], '.3f', 6)}")
+
+
+if __name__ == "__main__":
+    main()
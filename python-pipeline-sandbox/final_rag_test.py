@@ -7,12 +7,13 @@ Parse embeddings correctly and test similarity search
 """
 
 import os
-import ast
 import numpy as np
 from supabase import create_client
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from src.tools.vector_utils import parse_vector
+
 load_dotenv()
 
 def cosine_similarity(a, b):
@@ -20,13 +21,8 @@ def cosine_similarity(a, b):
     return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
 
 def parse_embedding(embedding_str):
-    """Parse embedding string to numpy array"""
-    try:
-        # Try to parse as Python list string
-        embedding_list = ast.literal_eval(embedding_str)
-        return np.array(embedding_list)
-    except:
-        return None
+    """Parse a pgvector '[...]' string straight to a float32 numpy array"""
+    return parse_vector(embedding_str)
 
 def final_rag_query(query_text: str, top_k: int = 3):
     """Final working RAG query"""
@@ -44,7 +40,7 @@ def final_rag_query(query_text: str, top_k: int = 3):
             model="text-embedding-ada-002",
             input=query_text
         )
-        query_embedding = np.array(response.data[0].embedding)
+        query_embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
 
         # Get all format examples
         result = supabase.table('format_examples').select('*').execute()
@@ -8,71 +8,61 @@ Much easier than hardcoding examples!
 """
 
 import os
+import argparse
 import csv
+import hashlib
 import json
 from supabase import create_client, Client
-from openai import OpenAI
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def load_csv_to_supabase(csv_file: str):
-    """Load format examples from CSV to Supabase"""
+from src.tools.example_ingest import ExampleIngest
+
+def read_csv_examples(csv_file: str):
+    """Yield format example rows from the CSV, one at a time"""
+    with open(csv_file, 'r', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            # Parse metadata JSON
+            try:
+                metadata = json.loads(row['metadata']) if row.get('metadata') else {}
+            except json.JSONDecodeError:
+                metadata = {}
+            yield {
+                'format_type': row['format_type'],
+                'title': row['title'],
+                'content': row['content'],
+                'metadata': metadata,
+            }
+
+def load_csv_to_supabase(csv_file: str, dry_run: bool = False):
+    """Load format examples from CSV to Supabase (batched, idempotent; an interrupted run resumes)
+
+    Rows are upserted on a hash of (format_type, content), so rerunning adds no
+    duplicates and only embeds new content. dry_run=True just reports how many
+    rows are new, changed and unchanged.
+    """
 
     # Initialize clients
     supabase: Client = create_client(
         os.getenv("SUPABASE_URL"),
         os.getenv("SUPABASE_ANON_KEY")
     )
-    openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
     print(f"📂 Loading examples from {csv_file}")
 
     try:
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
+        # Checkpoints are per file version, so an edited CSV starts over
+        with open(csv_file, 'rb') as file:
+            job = f"csv:{os.path.abspath(csv_file)}:{hashlib.sha256(file.read()).hexdigest()[:16]}"
 
-            for i, row in enumerate(reader, 1):
-                format_type = row['format_type']
-                title = row['title']
-                content = row['content']
-
-                # Parse metadata JSON
-                try:
-                    metadata = json.loads(row['metadata']) if row['metadata'] else {}
-                except json.JSONDecodeError:
-                    metadata = {}
-
-                print(f"\n{i}. Processing: {title} ({format_type})")
-
-                # Generate embedding
-                try:
-                    response = openai_client.embeddings.create(
-                        model="text-embedding-ada-002",
-                        input=content
-                    )
-                    embedding = response.data[0].embedding
-                    print("   ✅ Embedding generated")
-
-                    # Insert into Supabase
-                    result = supabase.table('format_examples').insert({
-                        'format_type': format_type,
-                        'title': title,
-                        'content': content,
-                        'embedding': embedding,
-                        'metadata': metadata
-                    }).execute()
-
-                    print("   ✅ Saved to database")
-
-                except Exception as e:
-                    print(f"   ❌ Failed: {e}")
-
-        print(f"\n🎉 CSV loading complete!")
+        ExampleIngest(supabase).ingest(read_csv_examples(csv_file), job=job, dry_run=dry_run)
+        if dry_run:
+            return
 
         # Show final count
-        result = supabase.table('format_examples').select('*').execute()
-        print(f"📊 Total examples in database: {len(result.data)}")
+        result = supabase.table('format_examples').select('id', count='exact').limit(1).execute()
+        print(f"📊 Total examples in database: {result.count}")
 
     except FileNotFoundError:
         print(f"❌ File not found: {csv_file}")
@@ -80,4 +70,8 @@ def load_csv_to_supabase(csv_file: str):
         print(f"❌ Error loading CSV: {e}")
 
 if __name__ == "__main__":
-    load_csv_to_supabase("format_examples.csv")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load format examples from a CSV into Supabase")
+    parser.add_argument("csv_file", nargs="?", default="format_examples.csv")
+    parser.add_argument("--dry-run", action="store_true", help="Report new/changed/unchanged rows without writing")
+    args = parser.parse_args()
+    load_csv_to_supabase(args.csv_file, dry_run=args.dry_run)
@@ -8,55 +8,45 @@ Just paste your examples here and run the script.
 """
 
 import os
+import argparse
 from supabase import create_client, Client
-from openai import OpenAI
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from src.tools.example_ingest import ExampleIngest
+
 # Initialize clients
 supabase: Client = create_client(
     os.getenv("SUPABASE_URL"),
     os.getenv("SUPABASE_ANON_KEY")
 )
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+ingest = ExampleIngest(supabase)
 
 def add_format_example(format_type: str, title: str, content: str, metadata: dict = None):
     """Add a format example to the database with embedding"""
 
     print(f"📝 Adding {format_type}: {title}")
+    return add_format_examples([dict(format_type=format_type, title=title, content=content, metadata=metadata)])
 
-    try:
-        # Generate embedding
-        response = openai_client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=content
-        )
-        embedding = response.data[0].embedding
-
-        # Insert into database
-        result = supabase.table('format_examples').insert({
-            'format_type': format_type,
-            'title': title,
-            'content': content,
-            'embedding': embedding,
-            'metadata': metadata or {}
-        }).execute()
-
-        print(f"✅ Added successfully!")
-        return True
+def add_format_examples(examples: list, dry_run: bool = False):
+    """Upsert format examples in batches, keyed by (format_type, content)
 
-    except Exception as e:
-        print(f"❌ Failed to add {title}: {e}")
-        return False
+    Examples already stored are not embedded again; dry_run=True only reports
+    new / changed / unchanged counts.
+    """
 
-def load_sample_examples():
-    """Load a set of sample format examples"""
+    stats = ingest.ingest(examples, dry_run=dry_run)
+    return stats["failed"] == 0
+
+def load_sample_examples(dry_run: bool = False):
+    """Load a set of sample format examples (safe to rerun)"""
 
     print("🔄 Loading sample format examples...")
+    examples = []
 
     # LinkedIn Post Examples
-    add_format_example(
+    examples.append(dict(
         format_type="linkedin_post",
         title="AI Breakthrough Announcement",
         content="""🚀 Exciting breakthrough in AI reasoning!
@@ -77,9 +67,9 @@ What implications do you see for your industry?
 
 #AI #Technology #Innovation #Research""",
         metadata={"tone": "professional", "length": "medium", "engagement": "high"}
-    )
+    ))
 
-    add_format_example(
+    examples.append(dict(
         format_type="linkedin_post",
         title="Productivity Tips",
         content="""💡 3 productivity hacks that changed my workflow:
@@ -99,10 +89,10 @@ Which productivity method works best for you? 👇
 
 #Productivity #TimeManagement #WorkTips #Focus""",
         metadata={"tone": "helpful", "length": "short", "actionable": True}
-    )
+    ))
 
     # Twitter Thread Examples
-    add_format_example(
+    examples.append(dict(
         format_type="twitter_thread",
         title="Startup Lessons Thread",
         content="""🧵 5 hard lessons from building my first startup:
@@ -126,9 +116,9 @@ What would you add to this list? 👇
 
 #StartupLife #Entrepreneurship #Lessons""",
         metadata={"tone": "educational", "length": "long", "thread_length": 7}
-    )
+    ))
 
-    add_format_example(
+    examples.append(dict(
         format_type="twitter_thread",
         title="Remote Work Tips",
         content="""🏠 Remote work productivity secrets (learned the hard way):
@@ -149,10 +139,10 @@ Remote work isn't just "work from home" - it's a completely different skill set.
 
 What's your best remote work tip? 🤔""",
         metadata={"tone": "practical", "length": "medium", "thread_length": 6}
-    )
+    ))
 
     # Newsletter Examples
-    add_format_example(
+    examples.append(dict(
         format_type="newsletter",
         title="Weekly Tech Digest",
         content="""📰 This Week in Tech
@@ -185,10 +175,10 @@ That's all for this week. Stay curious!
 
 P.S. Hit reply and tell me what tech trends you're watching!""",
         metadata={"tone": "friendly", "length": "long", "sections": ["topic", "analysis", "data", "action", "recommendation"]}
-    )
+    ))
 
     # Blog Post Examples
-    add_format_example(
+    examples.append(dict(
         format_type="blog_post",
         title="How-To Guide Example",
         content="""# How to Build Your First RAG System in 30 Minutes
@@ -276,7 +266,11 @@ That's it! You now have a working RAG system. The key is starting simple and ite
 
 *Have questions? Drop them in the comments below.*""",
         metadata={"tone": "instructional", "length": "long", "format": "tutorial", "code_included": True}
-    )
+    ))
+
+    add_format_examples(examples, dry_run=dry_run)
+    if dry_run:
+        return
 
     print(f"\n✅ Sample examples loaded! Check your Supabase dashboard.")
 
@@ -298,6 +292,10 @@ def add_your_examples():
 def main():
     """Main function to load format examples"""
 
+    parser = argparse.ArgumentParser(description="Load sample format examples into Supabase")
+    parser.add_argument("--dry-run", action="store_true", help="Report new/changed/unchanged examples without writing")
+    args = parser.parse_args()
+
     print("🎯 Format Examples Loader")
     print("=" * 30)
 
@@ -311,7 +309,9 @@ def main():
         return
 
     # Load sample examples
-    load_sample_examples()
+    load_sample_examples(dry_run=args.dry_run)
+    if args.dry_run:
+        return
 
     # Add your own examples
     add_your_examples()
@@ -9,13 +9,27 @@ Your existing pipeline + RAG format examples for better content generation
 import sys
 import os
 import argparse
-import ast
-import numpy as np
 from dotenv import load_dotenv
 load_dotenv()
 
 from src.tools.data_models import SetGoalType, RefineICPType, CombinedMetadata, AddProofType, ChooseFormatType, WriterOutputType
-from src.tools.readwise_client import ReadwiseDocument, ReadwiseClient
+from src.tools.readwise_client import ReadwiseDocument
+from src.tools.llm_cache import get_llm_cache, request_key
+from src.tools.document_cache import get_document_cache
+from src.tools.readwise_sync import get_readwise_mirror
+from src.tools.document_digest import get_document_digester
+from src.tools.document_prep import prepare_document
+from src.tools.format_index import (
+    FORMAT_HYBRID_CANDIDATES,
+    FORMAT_SEARCH_BACKEND,
+    FORMAT_SEARCH_HYBRID,
+    fuse_results,
+    get_format_index,
+    get_lexical_index,
+    search_format_examples,
+    search_format_examples_lexical,
+)
+from src.tools.embedding_service import get_embedding_service
 from openai import OpenAI
 from supabase import create_client
 import logging
@@ -31,54 +45,67 @@ logger = logging.getLogger(__name__)
 # Initialize clients
 openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON_KEY"))
+# Searches run in Postgres (HNSW); the in-memory index is the fallback (and FORMAT_SEARCH_BACKEND=index),
+# loaded on first use and refreshed incrementally
+format_index = get_format_index(supabase)
+# Lexical ranking over title/content, fused with the vector ranking so exact format names aren't
+# outranked; runs in Postgres full-text search, this in-memory BM25 index is the fallback
+lexical_index = get_lexical_index(supabase)
+
+# Identical prompts (re-processing a document, test runs) are answered from the response cache;
+# --no-cache sets this for runs that should always sample fresh output
+llm_cache = get_llm_cache()
+bypass_llm_cache = False
+
+def _usage_tokens(completion):
+    return getattr(getattr(completion, "usage", None), "total_tokens", None)
+
+def cached_parse(model, messages, response_format):
+    """beta.chat.completions.parse through the response cache; returns the parsed model"""
+    def compute():
+        completion = openai_client.beta.chat.completions.parse(model=model, messages=messages, response_format=response_format)
+        return completion.choices[0].message.parsed.model_dump_json(), _usage_tokens(completion)
+
+    key = request_key(api="chat.completions.parse", model=model, messages=messages, response_format=response_format)
+    return response_format.model_validate_json(llm_cache.cached(key, compute, bypass=bypass_llm_cache))
+
+def cached_chat(model, messages):
+    """chat.completions.create through the response cache; returns the message text"""
+    def compute():
+        completion = openai_client.chat.completions.create(model=model, messages=messages)
+        return completion.choices[0].message.content, _usage_tokens(completion)
+
+    key = request_key(api="chat.completions", model=model, messages=messages)
+    return llm_cache.cached(key, compute, bypass=bypass_llm_cache)
+
+def find_similar_format_examples(query_text: str, format_type: str = None, top_k: int = 3, metadata: dict = None):
+    """Find similar format examples using RAG (vector search fused with BM25 over title/content)"""
 
-def cosine_similarity(a, b):
-    """Calculate cosine similarity between two vectors"""
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-
-def parse_embedding(embedding_str):
-    """Parse embedding string to numpy array"""
     try:
-        embedding_list = ast.literal_eval(embedding_str)
-        return np.array(embedding_list)
-    except:
-        return None
-
-def find_similar_format_examples(query_text: str, format_type: str = None, top_k: int = 3):
-    """Find similar format examples using RAG"""
-
-    try:
-        # Generate query embedding
-        response = openai_client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=query_text
-        )
-        query_embedding = np.array(response.data[0].embedding)
-
-        # Get format examples (filter by type if specified)
-        if format_type:
-            result = supabase.table('format_examples').select('*').eq('format_type', format_type).execute()
-        else:
-            result = supabase.table('format_examples').select('*').execute()
-
-        examples = result.data
-
-        # Calculate similarities
-        similarities = []
-        for example in examples:
-            embedding_str = example.get('embedding')
-            if embedding_str:
-                example_embedding = parse_embedding(embedding_str)
-                if example_embedding is not None:
-                    similarity = cosine_similarity(query_embedding, example_embedding)
-                    similarities.append({
-                        'example': example,
-                        'similarity': similarity
-                    })
-
-        # Sort by similarity and return top results
-        similarities.sort(key=lambda x: x['similarity'], reverse=True)
-        return similarities[:top_k]
+        # Query embeddings are cached by text, so repeated queries skip the API
+        query_embedding = get_embedding_service().embed(query_text)
+        depth = max(top_k, FORMAT_HYBRID_CANDIDATES) if FORMAT_SEARCH_HYBRID else top_k
+        vector_results = None
+        if FORMAT_SEARCH_BACKEND == "rpc":
+            try:
+                vector_results = search_format_examples(supabase, query_embedding, format_type=format_type, metadata=metadata, top_k=depth)
+            except Exception as e:
+                # e.g. the RPC SQL from supabase_setup.py hasn't been run yet
+                logger.warning(f"Format search RPC failed, using in-memory index: {e}")
+        if vector_results is None:
+            vector_results = format_index.search(query_embedding, format_type=format_type, top_k=depth, metadata=metadata)
+        if not FORMAT_SEARCH_HYBRID:
+            return vector_results
+
+        lexical_results = None
+        if FORMAT_SEARCH_BACKEND == "rpc":
+            try:
+                lexical_results = search_format_examples_lexical(supabase, query_text, format_type=format_type, metadata=metadata, top_k=depth)
+            except Exception as e:
+                logger.warning(f"Lexical search RPC failed, using in-memory BM25 index: {e}")
+        if lexical_results is None:
+            lexical_results = lexical_index.search(query_text, format_type=format_type, top_k=depth, metadata=metadata)
+        return fuse_results(vector_results, lexical_results, top_k=top_k)
 
     except Exception as e:
         logger.error(f"RAG retrieval failed: {e}")
@@ -91,12 +118,14 @@ def retrieve_document(document_id: str) -> ReadwiseDocument:
     try:
         print(f"   Fetching document {document_id} with HTML content...")
 
-        client = ReadwiseClient()
-        document = client.get_document_content(document_id, include_html=True)
-
-        if not document:
-            print(f" ❌ Document {document_id} not found")
-            return None
+        # Prefer the synced library mirror (sync_readwise.py), then the document cache / API
+        document = get_readwise_mirror().get(document_id)
+        if document is None:
+            cached = get_document_cache().fetch(document_id)
+            if not cached:
+                print(f" ❌ Document {document_id} not found")
+                return None
+            document, _ = cached
 
         print(f" Retrieved: {document.title} ({document.word_count} words)")
         print(f" Author: {document.author}")
@@ -109,48 +138,46 @@ def retrieve_document(document_id: str) -> ReadwiseDocument:
         print(f"   ❌ Error retrieving document: {e}")
         return None
 
-def set_goal(document: ReadwiseDocument) -> SetGoalType:
-    """Set Goal Type: Determine the type of content to create"""
+def set_goal(document: ReadwiseDocument, text_snippet: str = None) -> SetGoalType:
+    """Set Goal Type: Determine the type of content to create from the title and a text snippet"""
     logger.info("Setting goal for content creation")
 
     # Use existing logic
     from src.tools.prompts_utils import SET_GOAL_SYSTEM_PROMPT
 
     model = "gpt-4o-mini"
-    completion = openai_client.beta.chat.completions.parse(
+    result = cached_parse(
         model=model,
         messages=[
             {
                 "role": "system",
                 "content": SET_GOAL_SYSTEM_PROMPT,
             },
-            {"role": "user", "content": f"Title: {document.title}\nAuthor: {document.author}\nURL: {document.url}\n\nHTML snippet:\n{document.html_content[:200]}"},
+            {"role": "user", "content": f"Title: {document.title}\nAuthor: {document.author}\nURL: {document.url}\n\nSnippet:\n{(text_snippet or document.html_content or '')[:200]}"},
         ],
         response_format=SetGoalType,
     )
-    result = completion.choices[0].message.parsed
     logger.info(f"Request routed as: {result.request_type} with confidence: {result.confidence_score}")
     return result
 
-def refine_icp(document: ReadwiseDocument, goal: SetGoalType) -> RefineICPType:
-    """Refine the ICP based on the document and the goal"""
+def refine_icp(document: ReadwiseDocument, goal: SetGoalType, content_digest: str = None) -> RefineICPType:
+    """Refine the ICP based on the document (its digest when given) and the goal"""
     logger.info("Refining ICP")
 
     from src.tools.prompts_utils import REFINE_ICP_SYSTEM_PROMPT
 
     model = "gpt-4o-mini"
-    completion = openai_client.beta.chat.completions.parse(
+    result = cached_parse(
         model=model,
         messages=[
             {
                 "role": "system",
                 "content": REFINE_ICP_SYSTEM_PROMPT,
             },
-            {"role": "user", "content": f"Title: {document.title}\nAuthor: {document.author}\nURL: {document.url}\n\nHTML content:\n{document.html_content}\n\nGoal: {goal.request_type}"},
+            {"role": "user", "content": f"Title: {document.title}\nAuthor: {document.author}\nURL: {document.url}\n\nContent:\n{content_digest or document.html_content}\n\nGoal: {goal.request_type}"},
         ],
         response_format=RefineICPType,
     )
-    result = completion.choices[0].message.parsed
     logger.info(f"found ICP: {result.problem} {result.takeaway} {result.change} {result.wondering}")
     return result
 
@@ -194,18 +221,17 @@ def choose_format_with_rag(state: CombinedMetadata) -> ChooseFormatType:
     from src.tools.prompts_utils import CHOOSE_FORMAT_SYSTEM_PROMPT
 
     model = "gpt-4o-mini"
-    completion = openai_client.beta.chat.completions.parse(
+    result = cached_parse(
         model=model,
         messages=[
             {
                 "role": "system",
                 "content": CHOOSE_FORMAT_SYSTEM_PROMPT + examples_context,
             },
-            {"role": "user", "content": f"Title: {state.title}\nAuthor: {state.author}\nURL: {state.url}\n\nHTML content:\n{state.html_snippet or ''}\n\nGoal: {state.goal}\nICP: {state.icp}"},
+            {"role": "user", "content": f"Title: {state.title}\nAuthor: {state.author}\nURL: {state.url}\n\nContent snippet:\n{state.html_snippet or ''}\n\nGoal: {state.goal}\nICP: {state.icp}"},
         ],
         response_format=ChooseFormatType,
     )
-    result = completion.choices[0].message.parsed
     logger.info(f"found format: {result.format_type} {result.format_description}")
     return result
 
@@ -235,7 +261,7 @@ def write_summary_with_rag(state: CombinedMetadata) -> WriterOutputType:
     logger.info(f"✅ Using template: '{best_example['title']}' (similarity: {similar_examples[0]['similarity']:.3f})")
 
     model = "gpt-5-mini"
-    full_html = state.html_full or ""
+    article_text = state.content_digest or state.html_full or ""
 
     # STEP 1: Generate initial summary draft
     logger.info("📝 Step 1: Generating initial summary draft...")
@@ -245,21 +271,19 @@ def write_summary_with_rag(state: CombinedMetadata) -> WriterOutputType:
 Focus on the key insights, problems, solutions, and outcomes mentioned in the article.
 Write this as a detailed paragraph capturing all important points.
 
-Article content: {full_html}
+Article content: {article_text}
 
 Title: {state.title}
 Goal: {state.goal.request_type if state.goal else 'general'}
 Target audience problem: {state.icp.problem if state.icp else 'general audience'}"""
 
-    draft_response = openai_client.chat.completions.create(
+    summary_draft = cached_chat(
         model=model,
         messages=[
             {"role": "system", "content": "You are a content summarization expert. Create detailed, comprehensive summaries."},
             {"role": "user", "content": draft_prompt}
         ]
     )
-
-    summary_draft = draft_response.choices[0].message.content
     logger.info(f"✅ Draft created ({len(summary_draft)} chars)")
 
     # STEP 2: Refine into key points
@@ -275,15 +299,13 @@ Extract the most important insights and present them as:
 - Focus on the core message and outcomes
 - Keep the essence but make it more impactful"""
 
-    refine_response = openai_client.chat.completions.create(
+    refined_points = cached_chat(
         model=model,
         messages=[
             {"role": "system", "content": "You are an expert at distilling content into clear, impactful key points."},
             {"role": "user", "content": refine_prompt}
         ]
     )
-
-    refined_points = refine_response.choices[0].message.content
     logger.info(f"✅ Key points extracted ({len(refined_points)} chars)")
 
     # STEP 3: Apply format template
@@ -312,7 +334,7 @@ INSTRUCTIONS:
 
 Create the final post that matches the template's proven format while incorporating the article's insights."""
 
-    final_response = openai_client.beta.chat.completions.parse(
+    result = cached_parse(
         model=model,
         messages=[
             {"role": "system", "content": f"You are an expert at creating {format_type} content using proven templates. Follow the template structure exactly while making the content original and relevant."},
@@ -321,7 +343,6 @@ Create the final post that matches the template's proven format while incorporat
         response_format=WriterOutputType,
     )
 
-    result = final_response.choices[0].message.parsed
     logger.info("✅ Final templated content created successfully")
 
     # Log the process for debugging
@@ -336,13 +357,13 @@ Create the final post that matches the template's proven format while incorporat
 def write_standard_summary(state: CombinedMetadata) -> WriterOutputType:
     """Fallback method when no format examples are available"""
     model = "gpt-5-mini"
-    full_html = state.html_full or ""
+    article_text = state.content_digest or state.html_full or ""
     goal_str = state.goal.model_dump_json() if state.goal else "{}"
     icp_str = state.icp.model_dump_json() if state.icp else "{}"
     proof_str = state.proof.model_dump_json() if state.proof else "{}"
     format_str = state.format.model_dump_json() if state.format else "{}"
 
-    completion = openai_client.beta.chat.completions.parse(
+    result = cached_parse(
         model=model,
         messages=[
             {
@@ -351,12 +372,12 @@ def write_standard_summary(state: CombinedMetadata) -> WriterOutputType:
             },
             {
                 "role": "user",
-                "content": f"Title: {state.title}\nAuthor: {state.author}\nURL: {state.url}\n\nGoal: {goal_str}\nICP: {icp_str}\nProof: {proof_str}\nFormat: {format_str}\n\nFULL_HTML:\n{full_html}",
+                "content": f"Title: {state.title}\nAuthor: {state.author}\nURL: {state.url}\n\nGoal: {goal_str}\nICP: {icp_str}\nProof: {proof_str}\nFormat: {format_str}\n\nARTICLE:\n{article_text}",
             },
         ],
         response_format=WriterOutputType,
     )
-    return completion.choices[0].message.parsed
+    return result
 
 def review_writer_content(state: CombinedMetadata) -> WriterOutputType:
     """Review the writer content with LinkedIn design principles"""
@@ -408,7 +429,7 @@ Focus on:
 
     model = "gpt-4o-mini"
 
-    completion = openai_client.beta.chat.completions.parse(
+    result = cached_parse(
         model=model,
         messages=[
             {
@@ -419,7 +440,6 @@ Focus on:
         ],
         response_format=WriterOutputType,
     )
-    result = completion.choices[0].message.parsed
     logger.info("✅ Content reviewed with LinkedIn design principles applied")
     return result
 
@@ -439,9 +459,17 @@ def main():
         choices=["summarize", "extract-key-points", "analyze-sentiment"],
         help="Task to perform on the document"
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always call the LLM (skip the response cache)"
+    )
 
     args = parser.parse_args()
 
+    global bypass_llm_cache
+    bypass_llm_cache = args.no_cache
+
     print(f"🔍 Processing Readwise document: {args.document_id}")
     print(f"📋 Task: {args.task}")
     print(f"🧠 Enhanced with RAG format examples")
@@ -457,24 +485,28 @@ def main():
 
     print(f"✅ Retrieved: {document.title}")
 
+    # Extract readable text once; every step below prompts with it instead of raw HTML
+    prepared = prepare_document(document)
+    print(f"📄 Prepared text: {prepared.text_tokens} tokens (HTML: {prepared.html_tokens})")
+
     # Step 2: Process with LLM
     print("Step 2: Set goal...")
-    result_set_goal = set_goal(document)
+    result_set_goal = set_goal(document, prepared.snippet(200))
 
-    print("Step 3: Refine ICP...")
-    result_refine_icp = refine_icp(document, result_set_goal)
+    # Long articles are condensed once (map-reduce, cached per document) for every later step
+    content_digest = get_document_digester().digest(document.id, prepared.text) if prepared.text else None
 
-    # Build a readable snippet from HTML for prompting
-    from src.tools.html_utils import build_readable_snippet
-    readable_snippet = build_readable_snippet(document.html_content or document.content or "", url=document.url, max_chars=700)
+    print("Step 3: Refine ICP...")
+    result_refine_icp = refine_icp(document, result_set_goal, content_digest)
 
     state = CombinedMetadata(
         document_id=document.id,
         title=document.title,
         author=document.author,
         url=document.url,
-        html_snippet=readable_snippet or (document.html_content[:500] if document.html_content else None),
+        html_snippet=prepared.snippet(700) or (document.html_content[:500] if document.html_content else None),
         html_full=document.html_content or document.content or "",
+        content_digest=content_digest,
         goal=result_set_goal,
         icp=result_refine_icp,
     )
@@ -512,5 +544,13 @@ def main():
     print("="*50)
     print(state.model_dump_json(indent=2))
 
+    embedding_stats = get_embedding_service().stats()
+    print(f"🧮 Embeddings: {embedding_stats['hits']} cached, {embedding_stats['misses']} embedded "
+          f"in {embedding_stats['api_calls']} API calls")
+
+    cache_stats = llm_cache.stats()
+    print(f"\n🗄️  LLM cache: {cache_stats['memory_hits'] + cache_stats['disk_hits']} hits, "
+          f"{cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%}), ~{cache_stats['saved_tokens']} tokens saved")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -24,9 +24,10 @@ from openai import OpenAI
 import os
 import logging
 
-from src.tools.readwise_client import ReadwiseClient
 from src.tools.prompts_utils import SET_GOAL_SYSTEM_PROMPT, REFINE_ICP_SYSTEM_PROMPT,CHOOSE_FORMAT_SYSTEM_PROMPT,REVIEW_WRITER_CONTENT_SYSTEM_PROMPT
-from src.tools.html_utils import build_readable_snippet
+from src.tools.document_prep import prepare_document
+from src.tools.document_cache import get_document_cache
+from src.tools.readwise_sync import get_readwise_mirror
 # Set up logging configuration
 logging.basicConfig(
     level=logging.INFO,
@@ -56,12 +57,14 @@ def retrieve_document(document_id: str) -> ReadwiseDocument:
     try:
         print(f"   Fetching document {document_id} with HTML content...")
 
-        client = ReadwiseClient()
-        document = client.get_document_content(document_id, include_html=True)
-
-        if not document:
-            print(f" ❌ Document {document_id} not found")
-            return None
+        # Prefer the synced library mirror (sync_readwise.py), then the document cache / API
+        document = get_readwise_mirror().get(document_id)
+        if document is None:
+            cached = get_document_cache().fetch(document_id)
+            if not cached:
+                print(f" ❌ Document {document_id} not found")
+                return None
+            document, _ = cached
 
         print(f" Retrieved: {document.title} ({document.word_count} words)")
         print(f" Author: {document.author}")
@@ -79,8 +82,8 @@ def retrieve_document(document_id: str) -> ReadwiseDocument:
 # Step 2: Process document with LLM based on the specified task
 # ----------------------------
 
-def set_goal(document: ReadwiseDocument) -> SetGoalType:
-    """Set Goal Type: Determine the type of content to create"""
+def set_goal(document: ReadwiseDocument, text_snippet: str = None) -> SetGoalType:
+    """Set Goal Type: Determine the type of content to create from the title and a text snippet"""
     logger.info("Setting goal for content creation")
 
     model = "gpt-4o-mini"
@@ -91,7 +94,7 @@ def set_goal(document: ReadwiseDocument) -> SetGoalType:
                 "role": "system",
                 "content": SET_GOAL_SYSTEM_PROMPT,
             },
-            {"role": "user", "content": f"Title: {document.title}\nAuthor: {document.author}\nURL: {document.url}\n\nHTML snippet:\n{document.html_content[:200]}"},
+            {"role": "user", "content": f"Title: {document.title}\nAuthor: {document.author}\nURL: {document.url}\n\nSnippet:\n{(text_snippet or document.html_content or '')[:200]}"},
         ],
         response_format=SetGoalType,
     )
@@ -101,8 +104,8 @@ def set_goal(document: ReadwiseDocument) -> SetGoalType:
     )
     return result
 
-def refine_icp(document: ReadwiseDocument, goal: SetGoalType) -> RefineICPType:
-    """Refine the ICP based on the document and the goal"""
+def refine_icp(document: ReadwiseDocument, goal: SetGoalType, content_text: str = None) -> RefineICPType:
+    """Refine the ICP based on the document (its readable text when given) and the goal"""
     logger.info("Refining ICP")
     model = "gpt-4o-mini"
     completion = client.beta.chat.completions.parse(
@@ -112,7 +115,7 @@ def refine_icp(document: ReadwiseDocument, goal: SetGoalType) -> RefineICPType:
                 "role": "system",
                 "content": REFINE_ICP_SYSTEM_PROMPT,
             },
-            {"role": "user", "content": f"Title: {document.title}\nAuthor: {document.author}\nURL: {document.url}\n\nHTML content:\n{document.html_content}\n\nGoal: {goal.request_type}"},
+            {"role": "user", "content": f"Title: {document.title}\nAuthor: {document.author}\nURL: {document.url}\n\nContent:\n{content_text or document.html_content}\n\nGoal: {goal.request_type}"},
         ],
         response_format=RefineICPType,
     )
@@ -145,7 +148,7 @@ def choose_format(state: CombinedMetadata) -> ChooseFormatType:
                 "role": "system",
                 "content": CHOOSE_FORMAT_SYSTEM_PROMPT,
             },
-            {"role": "user", "content": f"Title: {state.title}\nAuthor: {state.author}\nURL: {state.url}\n\nHTML content:\n{state.html_snippet or ''}\n\nGoal: {state.goal}\nICP: {state.icp}"},
+            {"role": "user", "content": f"Title: {state.title}\nAuthor: {state.author}\nURL: {state.url}\n\nContent snippet:\n{state.html_snippet or ''}\n\nGoal: {state.goal}\nICP: {state.icp}"},
         ],
         response_format=ChooseFormatType,
     )
@@ -155,14 +158,14 @@ def choose_format(state: CombinedMetadata) -> ChooseFormatType:
 
 
 def write_summary(state: CombinedMetadata) -> WriterOutputType:
-    """Generate a thoughtful summary using the full HTML content.
+    """Generate a thoughtful summary using the full article text.
 
-    Note: We intentionally pass the full HTML (no truncation) so the model
-    can leverage full context.
+    Note: We intentionally pass the full readable text (no truncation) so the
+    model can leverage full context without paying for markup.
     """
-    logger.info("Writing thoughtful summary from full HTML")
+    logger.info("Writing thoughtful summary from full article text")
     model = "gpt-4o-mini"
-    full_html = state.html_full or ""
+    article_text = state.content_digest or state.html_full or ""
     goal_str = state.goal.model_dump_json() if state.goal else "{}"
     icp_str = state.icp.model_dump_json() if state.icp else "{}"
     proof_str = state.proof.model_dump_json() if state.proof else "{}"
@@ -173,11 +176,11 @@ def write_summary(state: CombinedMetadata) -> WriterOutputType:
         messages=[
             {
                 "role": "system",
-                "content": "You are a precise summarization and synthesis assistant. Read the full HTML and produce a thoughtful, well-structured summary capturing key insights, evidence, and implications.",
+                "content": "You are a precise summarization and synthesis assistant. Read the full article and produce a thoughtful, well-structured summary capturing key insights, evidence, and implications.",
             },
             {
                 "role": "user",
-                "content": f"Title: {state.title}\nAuthor: {state.author}\nURL: {state.url}\n\nGoal: {goal_str}\nICP: {icp_str}\nProof: {proof_str}\nFormat: {format_str}\n\nFULL_HTML:\n{full_html}",
+                "content": f"Title: {state.title}\nAuthor: {state.author}\nURL: {state.url}\n\nGoal: {goal_str}\nICP: {icp_str}\nProof: {proof_str}\nFormat: {format_str}\n\nARTICLE:\n{article_text}",
             },
         ],
         response_format=WriterOutputType,
@@ -240,23 +243,25 @@ def main():
 
     print(f"✅ Retrieved: {document.title}")
 
+    # Extract readable text once; every step below prompts with it instead of raw HTML
+    prepared = prepare_document(document)
+    print(f"📄 Prepared text: {prepared.text_tokens} tokens (HTML: {prepared.html_tokens})")
+
     # Step 2: Process with LLM
     print("Step 2: Set goal...")
-    result_set_goal = set_goal(document)
+    result_set_goal = set_goal(document, prepared.snippet(200))
 
     print("Step 3: Refine ICP...")
-    result_refine_icp = refine_icp(document, result_set_goal)
+    result_refine_icp = refine_icp(document, result_set_goal, prepared.text)
     # Initialize workflow state once, then immutably update via model_copy
-    # Build a readable snippet from HTML for prompting
-    readable_snippet = build_readable_snippet(document.html_content or document.content or "", url=document.url, max_chars=700)
-
     state = CombinedMetadata(
         document_id=document.id,
         title=document.title,
         author=document.author,
         url=document.url,
-        html_snippet=readable_snippet or (document.html_content[:500] if document.html_content else None),
+        html_snippet=prepared.snippet(700) or (document.html_content[:500] if document.html_content else None),
         html_full=document.html_content or document.content or "",
+        content_digest=prepared.text or None,
         goal=result_set_goal,
         icp=result_refine_icp,
     )
@@ -90,11 +90,15 @@ class ChatStore:
         return res.data.get("state", {}) if res.data else {}
 
     def update_conversation_state(self, conversation_id: str, state_updates: Dict[str, Any]) -> Dict[str, Any]:
-        """Update conversation state (merges with existing state)"""
-        current_state = self.get_conversation_state(conversation_id)
-        new_state = {**current_state, **state_updates}
-        
-        res = self.client.table("conversations").update({"state": new_state}).eq("id", conversation_id).execute()
+        """Update conversation state (merges with existing state).
+
+        The merge runs server-side (`state || patch` in merge_conversation_state),
+        so it is a single round trip and concurrent updates don't overwrite each other.
+        """
+        res = self.client.rpc(
+            "merge_conversation_state",
+            {"p_conversation_id": conversation_id, "p_patch": state_updates},
+        ).execute()
         return res.data[0] if res.data else {}
 
     # Summary management
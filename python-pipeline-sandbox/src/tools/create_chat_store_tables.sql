@@ -57,6 +57,15 @@ create trigger trg_conversations_updated_at
 before update on public.conversations
 for each row execute function public.set_updated_at();
 
+-- Atomic state merge: one round trip, concurrent patches can't drop each other's keys
+create or replace function public.merge_conversation_state(p_conversation_id uuid, p_patch jsonb)
+returns setof public.conversations as $$
+  update public.conversations
+  set state = coalesce(state, '{}'::jsonb) || coalesce(p_patch, '{}'::jsonb)
+  where id = p_conversation_id
+  returning *;
+$$ language sql;
+
 -- Enable Row Level Security (future-ready)
 alter table public.conversations enable row level security;
 alter table public.messages enable row level security;
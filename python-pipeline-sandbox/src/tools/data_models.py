@@ -33,6 +33,7 @@ class CombinedMetadata(BaseModel):
     url: str = Field(description="Document URL")
     html_snippet: Optional[str] = Field(default=None, description="Optional HTML snippet for prompting")
     html_full: Optional[str] = Field(default=None, description="Full HTML content for writer or deep processing")
+    content_digest: Optional[str] = Field(default=None, description="Readable text, or a map-reduce digest of it for long documents")
 
     # Step outputs (optional until produced)
     goal: Optional[SetGoalType] = Field(default=None, description="Goal routing result")
@@ -0,0 +1,111 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from .document_cache import get_document_cache, strip_html
+from .document_digest import count_tokens
+from .html_utils import extract_many
+from .readwise_client import ReadwiseDocument
+from .readwise_sync import get_readwise_mirror
+
+# Prepared documents kept in-process (a pipeline run touches a handful)
+_MAX_PREPARED = 64
+
+
+class PreparedDocument(BaseModel):
+    """Readable text of a document, extracted once and shared by every pipeline step."""
+
+    document_id: str = Field(description="Readwise document ID")
+    text: str = Field(description="Normalized readable text")
+    html_tokens: int = Field(description="Tokens in the raw HTML")
+    text_tokens: int = Field(description="Tokens in the prepared text")
+
+    def snippet(self, max_chars: int = 700) -> str:
+        """Leading slice of the text for prompts that only need a preview."""
+        return self.text[:max_chars]
+
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse runs of spaces within lines and of blank lines between paragraphs."""
+    text = (text or "").replace("\r\n", "\n").replace("\r", "\n").replace("\xa0", " ")
+    text = re.sub(r"[ \t\f\v]+", " ", text)
+    text = re.sub(r" ?\n ?", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def _stored_text(document: ReadwiseDocument) -> Optional[str]:
+    """Clean text already extracted for this version of the document by the mirror or document cache."""
+    try:
+        mirror = get_readwise_mirror()
+        if mirror.updated_at([document.id]).get(document.id) == document.updated_at:
+            text = mirror.get_clean_text(document.id)
+            if text:
+                return text
+        cached = get_document_cache().get(document.id)
+        if cached is not None and cached[0].updated_at == document.updated_at and cached[1]:
+            return cached[1]
+    except Exception as e:  # pylint: disable=broad-except
+        print(f"⚠️  Could not read stored text for {document.id}: {e}")
+    return None
+
+
+_prepared: "OrderedDict[Tuple[str, Optional[str]], PreparedDocument]" = OrderedDict()
+_prepared_lock = threading.Lock()
+
+
+def prepare_document(document: ReadwiseDocument) -> PreparedDocument:
+    """Extract and normalize a document's readable text once per (id, updated_at).
+
+    Reuses the clean text stored by the mirror or document cache when it is
+    for the same version, so HTML is parsed at most once per document.
+    """
+    return prepare_documents([document])[0]
+
+
+def prepare_documents(documents: List[ReadwiseDocument]) -> List[PreparedDocument]:
+    """prepare_document for many documents; those needing extraction are parsed in parallel."""
+    results: Dict[int, PreparedDocument] = {}
+    with _prepared_lock:
+        for i, document in enumerate(documents):
+            key = (document.id, document.updated_at)
+            if key in _prepared:
+                _prepared.move_to_end(key)
+                results[i] = _prepared[key]
+
+    texts: Dict[int, str] = {}
+    to_extract: List[int] = []
+    for i, document in enumerate(documents):
+        if i in results:
+            continue
+        text = _stored_text(document)
+        if text is None:
+            to_extract.append(i)
+        else:
+            texts[i] = text
+    extracted = extract_many([(_html(documents[i]), documents[i].url) for i in to_extract])
+    for i, text in zip(to_extract, extracted):
+        texts[i] = text or strip_html(_html(documents[i]))
+
+    for i, text in texts.items():
+        document = documents[i]
+        text = normalize_whitespace(text)
+        prepared = PreparedDocument(
+            document_id=document.id,
+            text=text,
+            html_tokens=count_tokens(_html(document)),
+            text_tokens=count_tokens(text),
+        )
+        with _prepared_lock:
+            _prepared[(document.id, document.updated_at)] = prepared
+            while len(_prepared) > _MAX_PREPARED:
+                _prepared.popitem(last=False)
+        results[i] = prepared
+    return [results[i] for i in range(len(documents))]
+
+
+def _html(document: ReadwiseDocument) -> str:
+    return document.html_content or document.content or ""
@@ -0,0 +1,191 @@
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from openai import BadRequestError, OpenAI, UnprocessableEntityError
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3")
+# Most inputs sent in one embeddings request (the API accepts up to 2048)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+# How long the batcher waits for more requests before sending a partial batch
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "10"))
+# Embedding requests that may be in flight at once (bulk loads fill several batches)
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+
+
+def text_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingService:
+    """Embeddings with a persistent text-hash cache and a micro-batcher.
+
+    Vectors are stored as float32 blobs in SQLite keyed by sha256(model, text),
+    so a text is embedded once across runs. Cache misses go to a background
+    thread that coalesces concurrent requests into one API call of up to
+    max_batch inputs (with up to concurrency calls in flight); identical texts
+    already in flight share one result. A batch the API rejects is split until
+    the bad input is isolated, so only that input's caller gets the error.
+    """
+
+    def __init__(
+        self,
+        client: Optional[OpenAI] = None,
+        model: str = EMBEDDING_MODEL,
+        cache_path: Optional[str] = EMBEDDING_CACHE_PATH,
+        max_batch: int = EMBEDDING_BATCH_SIZE,
+        wait_ms: float = EMBEDDING_BATCH_WAIT_MS,
+        concurrency: int = EMBEDDING_CONCURRENCY,
+    ) -> None:
+        self.client = client or OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.model = model
+        self.max_batch = max(1, max_batch)
+        self.wait_seconds = wait_ms / 1000.0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if cache_path:
+            directory = os.path.dirname(cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(cache_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._db.commit()
+        self._pending: Dict[str, Future] = {}
+        self._queue: "queue.Queue[Tuple[str, str]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._senders = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="embedding-send")
+        self._hits = 0
+        self._misses = 0
+        self._api_calls = 0
+        self._embedded = 0
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: Sequence[str]) -> List[np.ndarray]:
+        """float32 vectors for texts, in order; cached texts cost no API call."""
+        keys = [text_key(self.model, text) for text in texts]
+        found = self._load(set(keys))
+        futures: Dict[str, Future] = {}
+        with self._lock:
+            self._hits += sum(1 for key in keys if key in found)
+            for key, text in zip(keys, texts):
+                if key in found or key in futures:
+                    continue
+                self._misses += 1
+                future = self._pending.get(key)
+                if future is None:
+                    future = Future()
+                    self._pending[key] = future
+                    self._queue.put((key, text))
+                futures[key] = future
+            if futures:
+                self._ensure_worker()
+        for key, future in futures.items():
+            found[key] = future.result()
+        return [found[key] for key in keys]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self._hits, "misses": self._misses, "api_calls": self._api_calls, "embedded": self._embedded}
+
+    # Internals
+    def _load(self, keys: set) -> Dict[str, np.ndarray]:
+        if self._db is None or not keys:
+            return {}
+        keys = list(keys)
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+        return found
+
+    def _store(self, items: List[Tuple[str, np.ndarray]]) -> None:
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, vector.astype(np.float32).tobytes()) for key, vector in items],
+            )
+            self._db.commit()
+
+    def _ensure_worker(self) -> None:
+        # Called with self._lock held
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.wait_seconds
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._senders.submit(self._send, batch)
+
+    def _send(self, batch: List[Tuple[str, str]]) -> None:
+        results = self._embed_batch(batch)
+        embedded = [(key, result) for (key, _), result in zip(batch, results) if not isinstance(result, Exception)]
+        try:
+            self._store(embedded)
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"⚠️  Could not cache {len(embedded)} embeddings: {e}")
+        with self._lock:
+            self._embedded += len(embedded)
+            futures = [self._pending.pop(key) for key, _ in batch]
+        for future, result in zip(futures, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _embed_batch(self, batch: List[Tuple[str, str]]) -> List[Union[np.ndarray, Exception]]:
+        """Vector (or error) per input; a rejected batch is bisected to isolate the bad inputs.
+
+        Transient errors are already retried by the OpenAI client and fail the
+        whole batch, since splitting would only multiply failing calls.
+        """
+        with self._lock:
+            self._api_calls += 1
+        try:
+            response = self.client.embeddings.create(model=self.model, input=[text for _, text in batch])
+            return [np.asarray(item.embedding, dtype=np.float32) for item in sorted(response.data, key=lambda d: d.index)]
+        except (BadRequestError, UnprocessableEntityError) as e:
+            if len(batch) == 1:
+                return [e]
+            middle = len(batch) // 2
+            return self._embed_batch(batch[:middle]) + self._embed_batch(batch[middle:])
+        except Exception as e:  # pylint: disable=broad-except
+            return [e] * len(batch)
+
+
+_default_service: Optional[EmbeddingService] = None
+_default_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Process-wide embedding service configured from the EMBEDDING_* env vars."""
+    global _default_service
+    if _default_service is None:
+        with _default_lock:
+            if _default_service is None:
+                _default_service = EmbeddingService()
+    return _default_service
@@ -0,0 +1,264 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from supabase import Client, create_client
+
+from .embedding_service import EmbeddingService, get_embedding_service
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "100"))
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+INGEST_CHECKPOINT_PATH = os.getenv("INGEST_CHECKPOINT_PATH", ".cache/ingest_checkpoints.sqlite3")
+# Rows read per request when scanning for missing embeddings
+_SCAN_PAGE_SIZE = 1000
+
+
+def content_hash(format_type: str, content: str) -> str:
+    """Upsert key of a format example; matches the SQL in supabase_setup.py."""
+    return hashlib.sha256(f"{format_type}\n{content}".encode("utf-8")).hexdigest()
+
+
+class IngestCheckpoint:
+    """Completed batch numbers per ingest job, so a rerun skips work already stored."""
+
+    def __init__(self, path: str = INGEST_CHECKPOINT_PATH) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ingest_batches (job TEXT NOT NULL, batch INTEGER NOT NULL, "
+            "rows INTEGER NOT NULL, done_at REAL NOT NULL, PRIMARY KEY (job, batch))"
+        )
+        self._db.commit()
+
+    def done(self, job: str) -> set:
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT batch FROM ingest_batches WHERE job = ?", (job,))}
+
+    def mark(self, job: str, batch: int, rows: int) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO ingest_batches (job, batch, rows, done_at) VALUES (?, ?, ?, ?)",
+                (job, batch, rows, time.time()),
+            )
+            self._db.commit()
+
+    def clear(self, job: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM ingest_batches WHERE job = ?", (job,))
+            self._db.commit()
+
+
+class ExampleIngest:
+    """Batched, resumable, idempotent loading of format_examples.
+
+    Rows are streamed in batches of batch_size, with up to concurrency batches
+    in flight. Each row is keyed by content_hash(format_type, content): rows
+    already stored with a vector cost no embedding call (and no write if their
+    title and metadata match); the rest are embedded in one call per batch and
+    upserted on content_hash in one request. When a job name is given,
+    finished batches are checkpointed and skipped on rerun; failed batches are
+    reported and retried by the next run.
+    """
+
+    def __init__(
+        self,
+        supabase: Optional[Client] = None,
+        embeddings: Optional[EmbeddingService] = None,
+        batch_size: int = INGEST_BATCH_SIZE,
+        concurrency: int = INGEST_CONCURRENCY,
+        checkpoint: Optional[IngestCheckpoint] = None,
+    ) -> None:
+        self.supabase = supabase or create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON_KEY"))
+        self.embeddings = embeddings or get_embedding_service()
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self._checkpoint = checkpoint
+
+    @property
+    def checkpoint(self) -> IngestCheckpoint:
+        if self._checkpoint is None:
+            self._checkpoint = IngestCheckpoint()
+        return self._checkpoint
+
+    def ingest(self, rows: Iterable[Dict[str, Any]], job: Optional[str] = None, dry_run: bool = False) -> Dict[str, int]:
+        """Upsert rows (format_type, title, content, metadata).
+
+        dry_run=True only classifies rows as new / changed / unchanged against
+        the table, without embedding or writing anything.
+        """
+        stats = {"duplicates": 0}
+        batches = self._batches(self._unique(rows, stats))
+        if dry_run:
+            return self._run(batches, lambda batch: self._upsert(batch, dry_run=True), None, stats, "Dry run")
+        return self._run(batches, self._upsert, job, stats)
+
+    def backfill(self) -> Dict[str, int]:
+        """Embed every stored row whose embedding is missing.
+
+        Resumable without a checkpoint: a rerun only sees rows still missing one.
+        """
+        return self._run(self._batches(self._missing_embeddings()), self._backfill_batch, None)
+
+    # Internals
+    def _batches(self, rows: Iterable[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def _unique(self, rows: Iterable[Dict[str, Any]], stats: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+        """Rows with their content_hash, dropping repeats within this input."""
+        seen = set()
+        for row in rows:
+            key = content_hash(row["format_type"], row["content"])
+            if key in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(key)
+            yield dict(row, content_hash=key)
+
+    def _run(
+        self,
+        batches: Iterator[List[Dict[str, Any]]],
+        process: Callable[[List[Dict[str, Any]]], Dict[str, int]],
+        job: Optional[str],
+        stats: Optional[Dict[str, int]] = None,
+        label: str = "Ingest",
+    ) -> Dict[str, int]:
+        # Updated in place: the row stream may still be adding to it while batches run
+        stats = stats if stats is not None else {}
+        stats.update(batches=0, rows=0, skipped=0, failed=0)
+        done = self.checkpoint.done(job) if job else set()
+        started = time.time()
+        in_flight: Dict[Future, tuple] = {}
+
+        def collect(futures) -> None:
+            for future in futures:
+                number, batch = in_flight.pop(future)
+                try:
+                    counts = future.result()
+                except Exception as e:  # pylint: disable=broad-except
+                    stats["failed"] += len(batch)
+                    print(f"   ❌ Batch {number} ({len(batch)} rows) failed: {e}")
+                    continue
+                for name, count in counts.items():
+                    stats[name] = stats.get(name, 0) + count
+                stats["batches"] += 1
+                stats["rows"] += len(batch)
+                if job:
+                    self.checkpoint.mark(job, number, len(batch))
+                print(f"   ✅ Batch {number}: {len(batch)} rows ({stats['rows']} done, {time.time() - started:.0f}s)")
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ingest") as pool:
+            for number, batch in enumerate(batches):
+                if number in done:
+                    stats["skipped"] += len(batch)
+                    continue
+                # Bound how much of the stream is held in memory
+                if len(in_flight) >= self.concurrency * 2:
+                    finished, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                    collect(finished)
+                in_flight[pool.submit(process, batch)] = (number, batch)
+            collect(list(in_flight))
+
+        counts = ", ".join(f"{stats[name]} {name}" for name in ("new", "changed", "unchanged", "duplicates") if name in stats)
+        print(
+            f"🎉 {label} done: {stats['rows']} rows in {stats['batches']} batches"
+            f"{f' ({counts})' if counts else ''}, {stats['skipped']} skipped (checkpointed), "
+            f"{stats['failed']} failed, {time.time() - started:.1f}s"
+        )
+        return stats
+
+    def _upsert(self, batch: List[Dict[str, Any]], dry_run: bool = False) -> Dict[str, int]:
+        hashes = [row["content_hash"] for row in batch]
+        stored = {
+            r["content_hash"]: r
+            for r in self.supabase.table("format_examples").select("content_hash, title, metadata")
+            .in_("content_hash", hashes).execute().data or []
+        }
+        with_vector = set()
+        if stored:
+            with_vector = {
+                r["content_hash"]
+                for r in self.supabase.table("format_examples").select("content_hash")
+                .in_("content_hash", list(stored)).not_.is_("embedding", "null").execute().data or []
+            }
+
+        to_embed, to_touch, unchanged = [], [], 0
+        for row in batch:
+            current = stored.get(row["content_hash"])
+            if current is None or row["content_hash"] not in with_vector:
+                to_embed.append(row)
+            elif current.get("title") != row.get("title") or (current.get("metadata") or {}) != (row.get("metadata") or {}):
+                to_touch.append(row)
+            else:
+                unchanged += 1
+        counts = {
+            "new": sum(1 for row in to_embed if row["content_hash"] not in stored),
+            "changed": len(to_touch) + sum(1 for row in to_embed if row["content_hash"] in stored),
+            "unchanged": unchanged,
+        }
+        if dry_run:
+            return counts
+
+        if to_embed:
+            vectors = self.embeddings.embed_many([row["content"] for row in to_embed])
+            self._write([dict(self._columns(row), embedding=vector.tolist()) for row, vector in zip(to_embed, vectors)])
+        if to_touch:
+            # Same content, so the stored vector is still right; only title/metadata change
+            self._write([self._columns(row) for row in to_touch])
+        return counts
+
+    @staticmethod
+    def _columns(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "format_type": row["format_type"],
+            "title": row.get("title"),
+            "content": row["content"],
+            "metadata": row.get("metadata") or {},
+            "content_hash": row["content_hash"],
+        }
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        self.supabase.table("format_examples").upsert(rows, on_conflict="content_hash").execute()
+
+    def _backfill_batch(self, batch: List[Dict[str, Any]]) -> Dict[str, int]:
+        vectors = self.embeddings.embed_many([row["content"] for row in batch])
+        # Upsert on id with the NOT NULL columns present updates the rows in one request
+        self.supabase.table("format_examples").upsert(
+            [
+                {
+                    "id": row["id"],
+                    "format_type": row["format_type"],
+                    "content": row["content"],
+                    "content_hash": content_hash(row["format_type"], row["content"]),
+                    "embedding": vector.tolist(),
+                }
+                for row, vector in zip(batch, vectors)
+            ],
+            on_conflict="id",
+        ).execute()
+        return {"embedded": len(batch)}
+
+    def _missing_embeddings(self) -> Iterator[Dict[str, Any]]:
+        # Keyset pagination: rows fixed by earlier batches drop out of the filter without shifting pages
+        last_id = None
+        while True:
+            query = self.supabase.table("format_examples").select("id, format_type, content").is_("embedding", "null")
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            page = query.order("id").limit(_SCAN_PAGE_SIZE).execute().data or []
+            yield from page
+            if len(page) < _SCAN_PAGE_SIZE:
+                return
+            last_id = page[-1]["id"]
@@ -0,0 +1,359 @@
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from supabase import Client, create_client
+
+from .lexical_index import BM25Index, reciprocal_rank_fusion
+from .vector_utils import parse_vectors
+
+# The in-memory index checks Supabase for changed rows at most this often
+FORMAT_INDEX_REFRESH_SECONDS = float(os.getenv("FORMAT_INDEX_REFRESH_SECONDS", "300"))
+# "rpc" searches in Postgres (HNSW and full-text indexes); "index" uses the in-memory indexes below
+FORMAT_SEARCH_BACKEND = os.getenv("FORMAT_SEARCH_BACKEND", "rpc")
+# HNSW candidate list size per query: higher raises recall and latency
+FORMAT_SEARCH_EF_SEARCH = int(os.getenv("FORMAT_SEARCH_EF_SEARCH", "40"))
+# Fuse vector results with BM25 over title/content ("0" for vector-only retrieval)
+FORMAT_SEARCH_HYBRID = os.getenv("FORMAT_SEARCH_HYBRID", "1") != "0"
+# Results taken from each ranking before fusion
+FORMAT_HYBRID_CANDIDATES = int(os.getenv("FORMAT_HYBRID_CANDIDATES", "50"))
+# RRF constant: larger values flatten the advantage of top ranks
+FORMAT_HYBRID_RRF_K = float(os.getenv("FORMAT_HYBRID_RRF_K", "60"))
+# PostgREST returns at most 1000 rows per request by default
+_PAGE_SIZE = 1000
+_COLUMNS = "id, format_type, title, content, metadata, updated_at"
+
+
+def search_format_examples(
+    supabase: Client,
+    query_embedding: Any,
+    format_type: Optional[str] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    top_k: int = 3,
+    ef_search: int = FORMAT_SEARCH_EF_SEARCH,
+) -> List[Dict[str, Any]]:
+    """Top-k rows from the match_format_examples_filtered RPC, shaped like FormatExampleIndex.search."""
+    if top_k <= 0:
+        return []
+    params = {
+        "query_embedding": np.asarray(query_embedding, dtype=np.float32).ravel().tolist(),
+        "match_count": top_k,
+        "filter_format_type": format_type,
+        "filter_metadata": metadata or {},
+        "ef_search": ef_search,
+    }
+    rows = supabase.rpc("match_format_examples_filtered", params).execute().data or []
+    return [{"example": row, "similarity": float(row.pop("similarity"))} for row in rows]
+
+
+def search_format_examples_lexical(
+    supabase: Client,
+    query_text: str,
+    format_type: Optional[str] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    top_k: int = 3,
+) -> List[Dict[str, Any]]:
+    """Top-k rows from the search_format_examples_lexical RPC (Postgres ts_rank), shaped like FormatExampleLexicalIndex.search."""
+    if top_k <= 0 or not (query_text or "").strip():
+        return []
+    params = {
+        "query_text": query_text,
+        "match_count": top_k,
+        "filter_format_type": format_type,
+        "filter_metadata": metadata or {},
+    }
+    rows = supabase.rpc("search_format_examples_lexical", params).execute().data or []
+    return [{"example": row, "score": float(row.pop("score"))} for row in rows]
+
+
+class FormatExampleIndex:
+    """In-memory cosine index over format_examples embeddings.
+
+    All embeddings live in one contiguous, L2-normalized float32 matrix, so a
+    query is a single matrix-vector product plus argpartition. format_type
+    filters use precomputed boolean row masks. refresh() pulls only rows whose
+    updated_at moved past the last one seen (and drops deleted ids), and runs
+    automatically once refresh_seconds have passed.
+    """
+
+    def __init__(self, supabase: Optional[Client] = None, refresh_seconds: float = FORMAT_INDEX_REFRESH_SECONDS) -> None:
+        self.supabase = supabase or create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON_KEY"))
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._rows: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+        self._masks: Dict[str, np.ndarray] = {}
+        self._high_water_mark: Optional[str] = None
+        self._refreshed_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def search(
+        self,
+        query_embedding: Any,
+        format_type: Optional[str] = None,
+        top_k: int = 3,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Top-k rows by cosine similarity as [{'example': row, 'similarity': float}], best first.
+
+        metadata keeps rows whose metadata has all of the given top-level key/value pairs.
+        """
+        if time.time() - self._refreshed_at >= self.refresh_seconds:
+            self.refresh()
+
+        # Read one consistent snapshot; refresh() swaps these references under the lock
+        with self._lock:
+            matrix, rows, masks = self._matrix, self._rows, self._masks
+        if not rows or top_k <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm == 0 or query.shape[0] != matrix.shape[1]:
+            return []
+        scores = matrix @ (query / norm)
+
+        candidates = None
+        if format_type or metadata:
+            mask = masks.get(format_type) if format_type else np.ones(len(rows), dtype=bool)
+            if mask is None:
+                return []
+            if metadata:
+                mask = mask & np.array([_contains(row.get("metadata"), metadata) for row in rows], dtype=bool)
+            candidates = np.flatnonzero(mask)
+            if not candidates.size:
+                return []
+            scores = scores[candidates]
+
+        k = min(top_k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        positions = candidates[top] if candidates is not None else top
+        return [{"example": rows[p], "similarity": float(scores[t])} for p, t in zip(positions, top)]
+
+    def refresh(self, full: bool = False) -> Dict[str, int]:
+        """Apply rows added, changed or deleted since the last refresh (full=True reloads everything)."""
+        since = None if full else self._high_water_mark
+        try:
+            changed = _fetch_rows(self.supabase, _COLUMNS + ", embedding", since)
+            live_ids = None if since is None else {row["id"] for row in _fetch_rows(self.supabase, "id", None)}
+        except Exception as e:  # pylint: disable=broad-except
+            # Keep serving the current snapshot; try again on the next interval
+            print(f"⚠️  Format index refresh failed: {e}")
+            self._refreshed_at = time.time()
+            return {"changed": 0, "deleted": 0, "size": len(self._rows)}
+
+        parsed = parse_vectors([row.pop("embedding", None) for row in changed])
+
+        with self._lock:
+            rows = [] if since is None else list(self._rows)
+            vectors = [] if since is None else list(self._matrix)
+            positions = {} if since is None else dict(self._positions)
+            high_water_mark = self._high_water_mark if since is not None else None
+
+            applied = 0
+            for row, vector in zip(changed, parsed):
+                if row.get("updated_at") and (high_water_mark is None or row["updated_at"] > high_water_mark):
+                    high_water_mark = row["updated_at"]
+                if row["id"] in positions and rows[positions[row["id"]]].get("updated_at") == row.get("updated_at"):
+                    continue
+                if vector is None or not vector.any():
+                    continue
+                applied += 1
+                vector = vector / np.linalg.norm(vector)
+                if row["id"] in positions:
+                    rows[positions[row["id"]]] = row
+                    vectors[positions[row["id"]]] = vector
+                else:
+                    positions[row["id"]] = len(rows)
+                    rows.append(row)
+                    vectors.append(vector)
+
+            deleted = 0
+            if live_ids is not None:
+                keep = [i for i, row in enumerate(rows) if row["id"] in live_ids]
+                deleted = len(rows) - len(keep)
+                if deleted:
+                    rows = [rows[i] for i in keep]
+                    vectors = [vectors[i] for i in keep]
+                    positions = {row["id"]: i for i, row in enumerate(rows)}
+
+            if applied or deleted or since is None:
+                self._matrix = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32) if vectors else np.zeros((0, 0), dtype=np.float32)
+                self._rows = rows
+                self._positions = positions
+                format_types = np.array([row.get("format_type") for row in rows], dtype=object)
+                self._masks = {t: format_types == t for t in set(format_types.tolist())}
+            self._high_water_mark = high_water_mark
+            self._refreshed_at = time.time()
+
+        if applied or deleted:
+            print(f"🗂️  Format index: {applied} rows updated, {deleted} removed ({len(rows)} indexed)")
+        return {"changed": applied, "deleted": deleted, "size": len(rows)}
+
+
+class FormatExampleLexicalIndex:
+    """BM25 index over format_examples title and content.
+
+    Titles are indexed twice so a format name in the title outweighs a passing
+    mention in the body. Built on first search, then kept current like
+    FormatExampleIndex: rows past the updated_at high-water mark are
+    re-indexed and deleted ids dropped, at most every refresh_seconds.
+
+    The first search downloads every row and keeps its text plus postings in
+    memory (a few times the table's text size), so it is only the fallback for
+    when the search_format_examples_lexical RPC is unavailable or
+    FORMAT_SEARCH_BACKEND=index.
+    """
+
+    def __init__(self, supabase: Optional[Client] = None, refresh_seconds: float = FORMAT_INDEX_REFRESH_SECONDS) -> None:
+        self.supabase = supabase or create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON_KEY"))
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._bm25 = BM25Index()
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._high_water_mark: Optional[str] = None
+        self._refreshed_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def search(
+        self,
+        query_text: str,
+        format_type: Optional[str] = None,
+        top_k: int = 3,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Top-k rows by BM25 as [{'example': row, 'score': float}], best first."""
+        if time.time() - self._refreshed_at >= self.refresh_seconds:
+            self.refresh()
+        with self._lock:
+            keys = None
+            if format_type or metadata:
+                keys = [
+                    id_ for id_, row in self._rows.items()
+                    if (not format_type or row.get("format_type") == format_type)
+                    and (not metadata or _contains(row.get("metadata"), metadata))
+                ]
+            hits = self._bm25.search(query_text, top_k=top_k, keys=keys)
+            return [{"example": self._rows[id_], "score": score} for id_, score in hits]
+
+    def refresh(self, full: bool = False) -> Dict[str, int]:
+        """Index rows added, changed or deleted since the last refresh (full=True rebuilds)."""
+        since = None if full else self._high_water_mark
+        try:
+            changed = _fetch_rows(self.supabase, _COLUMNS, since)
+            live_ids = None if since is None else {row["id"] for row in _fetch_rows(self.supabase, "id", None)}
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"⚠️  Format lexical index refresh failed: {e}")
+            self._refreshed_at = time.time()
+            return {"changed": 0, "deleted": 0, "size": len(self._rows)}
+
+        with self._lock:
+            if since is None:
+                self._bm25 = BM25Index()
+                self._rows = {}
+                self._high_water_mark = None
+            applied = 0
+            for row in changed:
+                if row.get("updated_at") and (self._high_water_mark is None or row["updated_at"] > self._high_water_mark):
+                    self._high_water_mark = row["updated_at"]
+                current = self._rows.get(row["id"])
+                if current is not None and current.get("updated_at") == row.get("updated_at"):
+                    continue
+                applied += 1
+                self._rows[row["id"]] = row
+                title = row.get("title") or ""
+                self._bm25.add(row["id"], f"{title}\n{title}\n{row.get('content') or ''}")
+
+            deleted = 0
+            if live_ids is not None:
+                for id_ in [id_ for id_ in self._rows if id_ not in live_ids]:
+                    del self._rows[id_]
+                    self._bm25.remove(id_)
+                    deleted += 1
+            self._refreshed_at = time.time()
+
+        if applied or deleted:
+            print(f"🔤 Format lexical index: {applied} rows updated, {deleted} removed ({len(self._rows)} indexed)")
+        return {"changed": applied, "deleted": deleted, "size": len(self._rows)}
+
+
+def fuse_results(
+    vector_results: List[Dict[str, Any]],
+    lexical_results: List[Dict[str, Any]],
+    top_k: int = 3,
+    k: float = FORMAT_HYBRID_RRF_K,
+) -> List[Dict[str, Any]]:
+    """Reciprocal rank fusion of vector and BM25 results, best first.
+
+    Each item is {'example', 'similarity', 'score'}: score is the RRF score
+    used for ordering, similarity the cosine from the vector results (0.0 for
+    rows only the lexical ranking found).
+    """
+    examples: Dict[str, Dict[str, Any]] = {}
+    similarities: Dict[str, float] = {}
+    for item in vector_results:
+        examples[item["example"]["id"]] = item["example"]
+        similarities[item["example"]["id"]] = item["similarity"]
+    for item in lexical_results:
+        examples.setdefault(item["example"]["id"], item["example"])
+
+    scores = reciprocal_rank_fusion(
+        [[item["example"]["id"] for item in vector_results], [item["example"]["id"] for item in lexical_results]], k=k
+    )
+    ranked = sorted(scores, key=lambda id_: (-scores[id_], -similarities.get(id_, 0.0)))[:top_k]
+    return [{"example": examples[id_], "similarity": similarities.get(id_, 0.0), "score": scores[id_]} for id_ in ranked]
+
+
+def _fetch_rows(supabase: Client, columns: str, updated_since: Optional[str]) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        query = supabase.table("format_examples").select(columns)
+        if updated_since:
+            # >= so rows sharing the last timestamp aren't missed; re-applying them is harmless
+            query = query.gte("updated_at", updated_since)
+        page = query.order("id").range(start, start + _PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < _PAGE_SIZE:
+            return rows
+        start += _PAGE_SIZE
+
+
+def _contains(metadata: Optional[Dict[str, Any]], wanted: Dict[str, Any]) -> bool:
+    metadata = metadata or {}
+    return all(metadata.get(key) == value for key, value in wanted.items())
+
+
+_default_index: Optional[FormatExampleIndex] = None
+_default_lock = threading.Lock()
+
+
+def get_format_index(supabase: Optional[Client] = None) -> FormatExampleIndex:
+    """Process-wide format example index (loaded on first search)."""
+    global _default_index
+    if _default_index is None:
+        with _default_lock:
+            if _default_index is None:
+                _default_index = FormatExampleIndex(supabase)
+    return _default_index
+
+
+_default_lexical_index: Optional[FormatExampleLexicalIndex] = None
+
+
+def get_lexical_index(supabase: Optional[Client] = None) -> FormatExampleLexicalIndex:
+    """Process-wide BM25 index over format examples (built on first search)."""
+    global _default_lexical_index
+    if _default_lexical_index is None:
+        with _default_lock:
+            if _default_lexical_index is None:
+                _default_lexical_index = FormatExampleLexicalIndex(supabase)
+    return _default_lexical_index
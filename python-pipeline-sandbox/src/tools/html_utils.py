@@ -1,4 +1,11 @@
-from typing import Optional
+import asyncio
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
 # We prefer trafilatura for robust content extraction.
 try:
@@ -21,8 +28,70 @@ try:
 except Exception:
     _HAS_BS4 = False
 
+# Opt-in cascade: with a value > 0, extractor output shorter than this (a caption,
+# a cookie banner) lets the next extractor try. The default 0 keeps the first
+# non-empty result, i.e. trafilatura's whenever it finds any text
+HTML_EXTRACT_MIN_CHARS = int(os.getenv("HTML_EXTRACT_MIN_CHARS", "0"))
+HTML_EXTRACT_WORKERS = int(os.getenv("HTML_EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+HTML_EXTRACT_TIMEOUT_SECONDS = float(os.getenv("HTML_EXTRACT_TIMEOUT_SECONDS", "10"))
 
-def extract_readable_text(html: str, url: Optional[str] = None, max_length: Optional[int] = None) -> str:
+
+class ExtractionTimeout(Exception):
+    """Raised inside a pool worker when a document exceeds its extraction deadline."""
+
+
+def _trafilatura_text(html: str, url: Optional[str]) -> str:
+    return trafilatura.extract(
+        html,
+        url=url,
+        favor_recall=True,
+        include_links=False,
+        include_images=False,
+        with_metadata=False,
+    ) or ""
+
+
+def _readability_text(html: str, url: Optional[str]) -> str:
+    summary_html = Document(html).summary(html_partial=True)
+    if _HAS_BS4:
+        return BeautifulSoup(summary_html, "lxml").get_text(separator=" ", strip=True)
+    # Extremely naive strip if bs4 is missing
+    return summary_html
+
+
+def _bs4_text(html: str, url: Optional[str]) -> str:
+    return BeautifulSoup(html, "lxml").get_text(separator=" ", strip=True)
+
+
+# Extractors in preference order, with whether each one's library is installed
+EXTRACTORS: Dict[str, Tuple[Callable[[str, Optional[str]], str], bool]] = {
+    "trafilatura": (_trafilatura_text, _HAS_TRAFILATURA),
+    "readability": (_readability_text, _HAS_READABILITY),
+    "bs4": (_bs4_text, _HAS_BS4),
+}
+
+
+def available_backends() -> List[str]:
+    return [name for name, (_, installed) in EXTRACTORS.items() if installed]
+
+
+def extract_with(backend: str, html: str, url: Optional[str] = None) -> str:
+    """Text from a single extractor backend ('' if it fails)."""
+    extractor, _ = EXTRACTORS[backend]
+    try:
+        return (extractor(html, url) or "").strip()
+    except ExtractionTimeout:
+        raise
+    except Exception:
+        return ""
+
+
+def extract_readable_text(
+    html: str,
+    url: Optional[str] = None,
+    max_length: Optional[int] = None,
+    min_chars: int = HTML_EXTRACT_MIN_CHARS,
+) -> str:
     """Extract readable main text from raw HTML using battle-tested libraries.
 
     Preference order:
@@ -30,50 +99,30 @@ def extract_readable_text(html: str, url: Optional[str] = None, max_length: Opti
     2) readability-lxml (good boilerplate removal)
     3) BeautifulSoup get_text (basic fallback)
 
+    The first extractor producing non-empty text wins. With min_chars > 0,
+    shorter output falls through to the next extractor; if none reaches
+    min_chars, the first non-empty result is used.
+
     Args:
         html: Raw HTML content
         url: Optional source URL to help extractors
         max_length: Optional character cap for the returned text
+        min_chars: Output length at which an extractor's result is accepted (0: any text)
 
     Returns:
         Clean readable text suitable for LLM prompts or previews.
     """
-    text: str = ""
-
-    if _HAS_TRAFILATURA:
-        try:
-            text = trafilatura.extract(
-                html,
-                url=url,
-                favor_recall=True,
-                include_links=False,
-                include_images=False,
-                with_metadata=False,
-            ) or ""
-        except Exception:
-            text = ""
-
-    if not text and _HAS_READABILITY:
-        try:
-            doc = Document(html)
-            summary_html = doc.summary(html_partial=True)
-            if _HAS_BS4:
-                soup = BeautifulSoup(summary_html, "lxml")
-                text = soup.get_text(separator=" ", strip=True)
-            else:
-                # Extremely naive strip if bs4 is missing
-                text = summary_html
-        except Exception:
-            text = ""
-
-    if not text and _HAS_BS4:
-        try:
-            soup = BeautifulSoup(html, "lxml")
-            text = soup.get_text(separator=" ", strip=True)
-        except Exception:
-            text = ""
-
-    text = text.strip()
+    text = ""
+    try:
+        for backend in available_backends():
+            candidate = extract_with(backend, html, url)
+            if candidate and len(candidate) >= min_chars:
+                text = candidate
+                break
+            text = text or candidate
+    except ExtractionTimeout:
+        print(f"⏱️  HTML extraction timed out{f' for {url}' if url else ''}; using partial result")
+
     if max_length is not None and max_length > 0 and len(text) > max_length:
         return text[:max_length]
     return text
@@ -84,3 +133,90 @@ def build_readable_snippet(html: str, url: Optional[str] = None, max_chars: int
     return extract_readable_text(html, url=url, max_length=max_chars)
 
 
+# ----------------------------
+# Batch / off-thread extraction
+# ----------------------------
+def _raise_timeout(signum, frame):
+    raise ExtractionTimeout()
+
+
+@contextmanager
+def _deadline(seconds: Optional[float]):
+    """Raise ExtractionTimeout after seconds (Unix worker processes only; no-op elsewhere)."""
+    if not seconds or not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _extract_job(job: Tuple[str, Optional[str], Optional[int], int, Optional[float]]) -> str:
+    html, url, max_length, min_chars, timeout = job
+    with _deadline(timeout):
+        return extract_readable_text(html, url=url, max_length=max_length, min_chars=min_chars)
+
+
+_default_pool: Optional[ProcessPoolExecutor] = None
+_default_lock = threading.Lock()
+
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """Process-wide extraction pool sized by HTML_EXTRACT_WORKERS."""
+    global _default_pool
+    if _default_pool is None:
+        with _default_lock:
+            if _default_pool is None:
+                _default_pool = ProcessPoolExecutor(max_workers=HTML_EXTRACT_WORKERS)
+    return _default_pool
+
+
+def _reset_pool(pool: ProcessPoolExecutor) -> None:
+    global _default_pool
+    with _default_lock:
+        if _default_pool is pool:
+            _default_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_many(
+    documents: Sequence[Tuple[str, Optional[str]]],
+    max_length: Optional[int] = None,
+    min_chars: int = HTML_EXTRACT_MIN_CHARS,
+    timeout: Optional[float] = HTML_EXTRACT_TIMEOUT_SECONDS,
+    pool: Optional[ProcessPoolExecutor] = None,
+) -> List[str]:
+    """Readable text for many (html, url) pairs, extracted in parallel worker processes.
+
+    Results keep the input order. A document that runs past timeout seconds
+    gets whatever an earlier extractor produced (possibly ''). If the pool
+    breaks (a worker crashed), the batch is redone in this process.
+    """
+    if not documents:
+        return []
+    jobs = [(html or "", url, max_length, min_chars, timeout) for html, url in documents]
+    pool = pool or get_extraction_pool()
+    workers = getattr(pool, "_max_workers", HTML_EXTRACT_WORKERS)
+    try:
+        return list(pool.map(_extract_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    except BrokenProcessPool:
+        print("⚠️  HTML extraction pool broke; extracting in-process")
+        _reset_pool(pool)
+        return [extract_readable_text(html, url=url, max_length=max_length, min_chars=min_chars)
+                for html, url, _, _, _ in jobs]
+
+
+async def extract_readable_text_async(
+    html: str,
+    url: Optional[str] = None,
+    max_length: Optional[int] = None,
+    min_chars: int = HTML_EXTRACT_MIN_CHARS,
+    timeout: Optional[float] = HTML_EXTRACT_TIMEOUT_SECONDS,
+) -> str:
+    """extract_readable_text in the process pool, so async servers don't block their event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_extraction_pool(), _extract_job, (html or "", url, max_length, min_chars, timeout))
@@ -0,0 +1,95 @@
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i in is it its of on or so that the this to was we what "
+    "when which who why will with you your".split()
+)
+
+
+def _stem(word: str) -> str:
+    # Plural folding only, so "objections" matches "objection" without a stemmer dependency
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased, plural-folded words without stopwords, plus adjacent-word bigrams.
+
+    Bigrams ("objection post") let exact phrases outrank documents that only
+    share the individual words.
+    """
+    words = [_stem(w) for w in _WORD.findall((text or "").lower()) if w not in _STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class BM25Index:
+    """Okapi BM25 over an in-memory inverted index, updated one document at a time."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[Hashable, int]] = {}
+        self._terms: Dict[Hashable, Counter] = {}
+        self._lengths: Dict[Hashable, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def add(self, key: Hashable, text: str) -> None:
+        """Index text under key, replacing what was indexed for key before."""
+        self.remove(key)
+        terms = Counter(tokenize(text))
+        self._terms[key] = terms
+        self._lengths[key] = sum(terms.values())
+        self._total_length += self._lengths[key]
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[key] = count
+
+    def remove(self, key: Hashable) -> None:
+        terms = self._terms.pop(key, None)
+        if terms is None:
+            return
+        self._total_length -= self._lengths.pop(key)
+        for term in terms:
+            posting = self._postings[term]
+            del posting[key]
+            if not posting:
+                del self._postings[term]
+
+    def search(self, query: str, top_k: int = 10, keys: Optional[Iterable[Hashable]] = None) -> List[Tuple[Hashable, float]]:
+        """Top-k (key, score) pairs for query, best first; keys restricts the candidates."""
+        if not self._terms or top_k <= 0:
+            return []
+        allowed = set(keys) if keys is not None else None
+        count = len(self._terms)
+        average_length = self._total_length / count or 1.0
+        scores: Dict[Hashable, float] = {}
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for key, frequency in posting.items():
+                if allowed is not None and key not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[key] / average_length)
+                scores[key] = scores.get(key, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: float = 60.0) -> Dict[Hashable, float]:
+    """RRF score per key: the sum of 1 / (k + rank) over every ranking that contains it (rank from 1)."""
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return scores
@@ -1,9 +1,12 @@
 import os
 import requests
-from typing import Dict, List, Optional
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Union
 from pydantic import BaseModel
 from dotenv import load_dotenv, find_dotenv
 
+from .readwise_transport import ReadwiseTransport, get_readwise_transport
+
 # Ensure environment variables are loaded from the nearest .env if present
 load_dotenv(find_dotenv(usecwd=True), override=False)
 
@@ -33,9 +36,92 @@ class ReadwiseDocument(BaseModel):
     last_moved_at: str
 
 
+def document_from_api(doc_data: Dict) -> ReadwiseDocument:
+    """Build a ReadwiseDocument from one Reader API list result."""
+    # Handle tags: convert dict to list or use empty list
+    tags_raw = doc_data.get("tags", [])
+    if isinstance(tags_raw, dict):
+        tags = list(tags_raw.keys()) if tags_raw else []
+    elif isinstance(tags_raw, list):
+        tags = tags_raw
+    else:
+        tags = []
+
+    # Handle content: ensure it's a string
+    content_raw = doc_data.get("content")
+    content = content_raw if content_raw is not None else ""
+
+    return ReadwiseDocument(
+        id=doc_data.get("id", ""),
+        url=doc_data.get("url", ""),
+        title=doc_data.get("title", ""),
+        author=doc_data.get("author", ""),
+        source=doc_data.get("source", ""),
+        category=doc_data.get("category", ""),
+        location=doc_data.get("location", ""),
+        tags=tags,
+        site_name=doc_data.get("site_name", ""),
+        word_count=doc_data.get("word_count", 0),
+        created_at=doc_data.get("created_at", ""),
+        updated_at=doc_data.get("updated_at", ""),
+        notes=doc_data.get("notes", ""),
+        summary=doc_data.get("summary", ""),
+        image_url=doc_data.get("image_url", ""),
+        content=content,
+        html_content=doc_data.get("html_content") or "",
+        reading_progress=doc_data.get("reading_progress", 0.0),
+        first_opened_at=doc_data.get("first_opened_at"),
+        last_opened_at=doc_data.get("last_opened_at"),
+        saved_at=doc_data.get("saved_at", ""),
+        last_moved_at=doc_data.get("last_moved_at", "")
+    )
+
+
+# Large per-document fields left out of metadata-only listings
+CONTENT_FIELDS = ("content", "html_content", "notes", "summary")
+
+# Reader API maximum page size for list/
+MAX_PAGE_SIZE = 100
+
+
+class LazyReadwiseDocument:
+    """Metadata-only document from a listing; content/html_content are fetched on first access.
+
+    Every other ReadwiseDocument attribute is available without a request.
+    """
+
+    __slots__ = ("_meta", "_client", "_full")
+
+    def __init__(self, meta: ReadwiseDocument, client: "ReadwiseClient") -> None:
+        self._meta = meta
+        self._client = client
+        self._full: Optional[ReadwiseDocument] = None
+
+    def load(self) -> ReadwiseDocument:
+        """Full document with HTML (one API call, then cached on this object).
+
+        If the fetch fails, the metadata-only document is returned for this
+        access but not cached, so the next access tries again.
+        """
+        if self._full is None:
+            full = self._client.get_document_content(self._meta.id, include_html=True)
+            if full is None:
+                return self._meta
+            self._full = full
+        return self._full
+
+    def __getattr__(self, name: str) -> Any:
+        if name in CONTENT_FIELDS:
+            return getattr(self.load(), name)
+        return getattr(self._meta, name)
+
+    def __repr__(self) -> str:
+        return f"LazyReadwiseDocument(id={self._meta.id!r}, title={self._meta.title!r}, loaded={self._full is not None})"
+
+
 class ReadwiseClient:
-    def __init__(self, api_token: Optional[str] = None):
-        """Initialize Readwise API client."""
+    def __init__(self, api_token: Optional[str] = None, transport: Optional[ReadwiseTransport] = None):
+        """Initialize Readwise API client (transport defaults to the shared pooled one)."""
         # Try to get token from parameter, environment, or settings
         if api_token:
             self.api_token = api_token
@@ -65,6 +151,7 @@ class ReadwiseClient:
             raise ValueError("READWISE token not found. Set READWISE_TOKEN (or readwise_token) in .env")
 
         self.base_url = "https://readwise.io/api/v3"
+        self.transport = transport or get_readwise_transport()
         self.headers = {
             "Authorization": f"Token {self.api_token}",
             "Content-Type": "application/json"
@@ -75,18 +162,26 @@ class ReadwiseClient:
         url = f"{self.base_url}/{endpoint}"
 
         try:
-            response = requests.get(url, headers=self.headers, params=params, timeout=30)
-            response.raise_for_status()
-            return response.json()
+            return self.transport.get(url, headers=self.headers, params=params, timeout=30)
         except requests.exceptions.RequestException as e:
             print(f"Readwise API request failed: {e}")
             return {}
 
-    def list_documents(self, limit: int = 20, cursor: Optional[str] = None) -> Dict:
-        """List documents from Readwise."""
+    def list_documents(
+        self,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        updated_after: Optional[str] = None,
+        include_html: bool = False,
+    ) -> Dict:
+        """List one page of documents from Readwise (follow nextPageCursor for the rest)."""
         params = {"page_size": limit}
         if cursor:
             params["page_cursor"] = cursor
+        if updated_after:
+            params["updatedAfter"] = updated_after
+        if include_html:
+            params["withHtmlContent"] = True
 
         print(f"DEBUG: Requesting {limit} documents from Readwise API")
         result = self._make_request("list/", params)
@@ -94,6 +189,46 @@ class ReadwiseClient:
             print(f"DEBUG: API returned {len(result['results'])} documents")
         return result
 
+    def iter_pages(
+        self,
+        page_size: int = MAX_PAGE_SIZE,
+        updated_after: Optional[str] = None,
+        include_html: bool = False,
+    ) -> Iterator[List[Dict]]:
+        """Raw result lists, one page at a time; the next page is requested only when needed."""
+        cursor = None
+        while True:
+            page = self.list_documents(limit=page_size, cursor=cursor, updated_after=updated_after, include_html=include_html)
+            if not page or "results" not in page:
+                return
+            yield page["results"]
+            cursor = page.get("nextPageCursor")
+            if not cursor:
+                return
+
+    def iter_documents(
+        self,
+        page_size: int = MAX_PAGE_SIZE,
+        updated_after: Optional[str] = None,
+        full_content: bool = False,
+        limit: Optional[int] = None,
+    ) -> Iterator[Union[ReadwiseDocument, LazyReadwiseDocument]]:
+        """Stream the library page by page.
+
+        full_content=False (default) lists without HTML and yields
+        LazyReadwiseDocument objects with the content fields dropped, so memory
+        stays flat; html_content is fetched only for documents that touch it.
+        full_content=True requests HTML with each page and yields ReadwiseDocument.
+        """
+        pages = self.iter_pages(page_size=min(page_size, MAX_PAGE_SIZE), updated_after=updated_after, include_html=full_content)
+        items = (item for page in pages for item in page)
+        for item in islice(items, limit):
+            if full_content:
+                yield document_from_api(item)
+            else:
+                meta = document_from_api({k: v for k, v in item.items() if k not in CONTENT_FIELDS})
+                yield LazyReadwiseDocument(meta, self)
+
     def get_document_content(self, document_id: str, include_html: bool = False) -> Optional[ReadwiseDocument]:
         """Get full content of a specific document."""
         endpoint = "list/"
@@ -106,45 +241,7 @@ class ReadwiseClient:
         if not data or "results" not in data or not data["results"]:
             return None
 
-        doc_data = data["results"][0]
-
-        # Handle tags: convert dict to list or use empty list
-        tags_raw = doc_data.get("tags", [])
-        if isinstance(tags_raw, dict):
-            tags = list(tags_raw.keys()) if tags_raw else []
-        elif isinstance(tags_raw, list):
-            tags = tags_raw
-        else:
-            tags = []
-
-        # Handle content: ensure it's a string
-        content_raw = doc_data.get("content")
-        content = content_raw if content_raw is not None else ""
-
-        return ReadwiseDocument(
-            id=doc_data.get("id", ""),
-            url=doc_data.get("url", ""),
-            title=doc_data.get("title", ""),
-            author=doc_data.get("author", ""),
-            source=doc_data.get("source", ""),
-            category=doc_data.get("category", ""),
-            location=doc_data.get("location", ""),
-            tags=tags,
-            site_name=doc_data.get("site_name", ""),
-            word_count=doc_data.get("word_count", 0),
-            created_at=doc_data.get("created_at", ""),
-            updated_at=doc_data.get("updated_at", ""),
-            notes=doc_data.get("notes", ""),
-            summary=doc_data.get("summary", ""),
-            image_url=doc_data.get("image_url", ""),
-            content=content,
-            html_content=doc_data.get("html_content", ""),
-            reading_progress=doc_data.get("reading_progress", 0.0),
-            first_opened_at=doc_data.get("first_opened_at"),
-            last_opened_at=doc_data.get("last_opened_at"),
-            saved_at=doc_data.get("saved_at", ""),
-            last_moved_at=doc_data.get("last_moved_at", "")
-        )
+        return document_from_api(data["results"][0])
 
 
 def get_readwise_content(document_id: Optional[str] = None, limit: int = 10, api_token: Optional[str] = None) -> List[ReadwiseDocument]:
@@ -157,50 +254,9 @@ def get_readwise_content(document_id: Optional[str] = None, limit: int = 10, api
             doc = client.get_document_content(document_id)
             return [doc] if doc else []
         else:
-            # List recent documents
-            data = client.list_documents(limit=limit)
-            documents = []
-
-            for item in data.get("results", []):
-                # Handle tags: convert dict to list or use empty list
-                tags_raw = item.get("tags", [])
-                if isinstance(tags_raw, dict):
-                    tags = list(tags_raw.keys()) if tags_raw else []
-                elif isinstance(tags_raw, list):
-                    tags = tags_raw
-                else:
-                    tags = []
-
-                # Handle content: ensure it's a string
-                content_raw = item.get("content")
-                content = content_raw if content_raw is not None else ""
-
-                doc = ReadwiseDocument(
-                    id=item.get("id", ""),
-                    url=item.get("url", ""),
-                    title=item.get("title", ""),
-                    author=item.get("author", ""),
-                    source=item.get("source", ""),
-                    category=item.get("category", ""),
-                    location=item.get("location", ""),
-                    tags=tags,
-                    site_name=item.get("site_name", ""),
-                    word_count=item.get("word_count", 0),
-                    created_at=item.get("created_at", ""),
-                    updated_at=item.get("updated_at", ""),
-                    notes=item.get("notes", ""),
-                    summary=item.get("summary", ""),
-                    image_url=item.get("image_url", ""),
-                    content=content,
-                    reading_progress=item.get("reading_progress", 0.0),
-                    first_opened_at=item.get("first_opened_at"),
-                    last_opened_at=item.get("last_opened_at"),
-                    saved_at=item.get("saved_at", ""),
-                    last_moved_at=item.get("last_moved_at", "")
-                )
-                documents.append(doc)
-
-            return documents
+            # List recent documents (across pages when limit exceeds one page)
+            pages = client.iter_pages(page_size=min(limit, MAX_PAGE_SIZE))
+            return [document_from_api(item) for item in islice((item for page in pages for item in page), limit)]
 
     except Exception as e:
         print(f"Error getting Readwise content: {e}")
@@ -0,0 +1,269 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .html_utils import extract_many
+from .readwise_client import ReadwiseClient, ReadwiseDocument, document_from_api
+
+READWISE_MIRROR_PATH = os.getenv("READWISE_MIRROR_PATH", ".cache/readwise_mirror.sqlite3")
+READWISE_SYNC_WORKERS = int(os.getenv("READWISE_SYNC_WORKERS", "4"))
+# Reader API maximum page size for list/
+READWISE_SYNC_PAGE_SIZE = 100
+
+
+class ReadwiseMirror:
+    """Local SQLite copy of the Readwise library: documents, HTML, clean text and sync state."""
+
+    def __init__(self, path: str = READWISE_MIRROR_PATH, extract_text: Optional[Callable[[str], str]] = None) -> None:
+        # Clean text is extracted in the shared process pool unless an extractor is given
+        self.extract_text = extract_text
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                id TEXT PRIMARY KEY,
+                updated_at TEXT,
+                document TEXT NOT NULL,
+                clean_text TEXT,
+                has_html INTEGER NOT NULL DEFAULT 0,
+                synced_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS documents_missing_html ON documents(has_html) WHERE has_html = 0;
+            CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT);
+            """
+        )
+        self._db.commit()
+
+    # Documents
+    def get(self, document_id: str, require_html: bool = True) -> Optional[ReadwiseDocument]:
+        """Mirrored document, or None if it isn't mirrored (or its HTML hasn't been fetched yet)."""
+        with self._lock:
+            row = self._db.execute("SELECT document, has_html FROM documents WHERE id = ?", (document_id,)).fetchone()
+        if row is None or (require_html and not row[1]):
+            return None
+        return ReadwiseDocument.model_validate_json(row[0])
+
+    def get_clean_text(self, document_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT clean_text FROM documents WHERE id = ? AND has_html = 1", (document_id,)).fetchone()
+        return row[0] if row else None
+
+    def updated_at(self, document_ids: List[str]) -> Dict[str, Optional[str]]:
+        """{id: updated_at} for mirrored documents whose HTML is already stored."""
+        if not document_ids:
+            return {}
+        placeholders = ",".join("?" * len(document_ids))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, updated_at FROM documents WHERE has_html = 1 AND id IN ({placeholders})",
+                document_ids,
+            ).fetchall()
+        return dict(rows)
+
+    def put_metadata(self, documents: List[ReadwiseDocument]) -> None:
+        """Record listed documents; their HTML is marked missing until put_full stores it."""
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO documents (id, updated_at, document, has_html, synced_at) VALUES (?, ?, ?, 0, ?) "
+                "ON CONFLICT(id) DO UPDATE SET updated_at = excluded.updated_at, document = excluded.document, "
+                "has_html = 0, synced_at = excluded.synced_at",
+                [(d.id, d.updated_at, d.model_dump_json(), now) for d in documents],
+            )
+            self._db.commit()
+
+    def put_full(self, document: ReadwiseDocument) -> None:
+        self.put_full_many([document])
+
+    def put_full_many(self, documents: List[ReadwiseDocument]) -> None:
+        """Store documents with their HTML; clean text is extracted for the whole batch in parallel."""
+        if not documents:
+            return
+        sources = [(d.html_content or d.content or "", d.url) for d in documents]
+        if self.extract_text is not None:
+            clean_texts = [self.extract_text(html) for html, _ in sources]
+        else:
+            clean_texts = extract_many(sources)
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO documents (id, updated_at, document, clean_text, has_html, synced_at) "
+                "VALUES (?, ?, ?, ?, 1, ?)",
+                [(d.id, d.updated_at, d.model_dump_json(), text, now) for d, text in zip(documents, clean_texts)],
+            )
+            self._db.commit()
+
+    def iter_documents(self, limit: Optional[int] = None) -> Iterator[ReadwiseDocument]:
+        """Mirrored documents with HTML, most recently updated first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT document FROM documents WHERE has_html = 1 ORDER BY updated_at DESC LIMIT ?",
+                (limit if limit is not None else -1,),
+            ).fetchall()
+        for (payload,) in rows:
+            yield ReadwiseDocument.model_validate_json(payload)
+
+    def missing_html(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT id FROM documents WHERE has_html = 0").fetchall()]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM documents").fetchone()[0]
+
+    # Sync state
+    def get_state(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, **values: Optional[str]) -> None:
+        """Write several state keys in one transaction (None deletes a key)."""
+        with self._lock:
+            for key, value in values.items():
+                if value is None:
+                    self._db.execute("DELETE FROM sync_state WHERE key = ?", (key,))
+                else:
+                    self._db.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+            self._db.commit()
+
+
+class ReadwiseSync:
+    """Incremental Readwise → ReadwiseMirror sync.
+
+    Lists the library page by page with updatedAfter set to the last completed
+    run's high-water mark and withHtmlContent, so one request brings the HTML
+    of up to 100 documents; only new or changed ones are stored. Documents
+    whose HTML could not be stored are marked missing and fetched one by one,
+    a few at a time, at the start of the next run (the shared Readwise
+    transport keeps the overall request rate within the API limit). The page
+    cursor is saved after each page is fully stored, so an interrupted run
+    resumes from that page.
+    """
+
+    def __init__(
+        self,
+        client: Optional[ReadwiseClient] = None,
+        mirror: Optional[ReadwiseMirror] = None,
+        workers: int = READWISE_SYNC_WORKERS,
+        page_size: int = READWISE_SYNC_PAGE_SIZE,
+    ) -> None:
+        self.client = client or ReadwiseClient()
+        self.mirror = mirror or ReadwiseMirror()
+        self.workers = workers
+        self.page_size = page_size
+
+    def run(self, full: bool = False) -> Dict[str, Any]:
+        """Sync the mirror; full=True ignores the high-water mark and re-lists everything."""
+        stats = {"pages": 0, "listed": 0, "fetched": 0, "unchanged": 0, "failed": 0, "resumed": False}
+
+        cursor = self.mirror.get_state("run_cursor")
+        if cursor is not None and not full:
+            # A previous run stopped part way; continue it with the same updatedAfter
+            stats["resumed"] = True
+            updated_after = self.mirror.get_state("run_updated_after") or None
+            run_max = self.mirror.get_state("run_max_updated_at")
+            print(f"♻️  Resuming Readwise sync (updatedAfter={updated_after})")
+        else:
+            cursor = ""
+            updated_after = None if full else self.mirror.get_state("high_water_mark")
+            run_max = None
+            self.mirror.set_state(run_cursor="", run_updated_after=updated_after or "", run_max_updated_at=None)
+            print(f"🔄 Readwise sync starting (updatedAfter={updated_after or 'beginning'})")
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="readwise-sync") as pool:
+            # Retry documents whose HTML fetch failed (or was interrupted) last time
+            self._fetch_html(pool, self.mirror.missing_html(), stats)
+
+            while True:
+                page = self.client.list_documents(
+                    limit=self.page_size, cursor=cursor or None, updated_after=updated_after, include_html=True
+                )
+                if not page or "results" not in page:
+                    # Listing failed after retries; the saved cursor lets the next run resume here
+                    raise RuntimeError("Readwise list request failed; run the sync again to resume")
+
+                documents = [document_from_api(item) for item in page["results"]]
+                stats["pages"] += 1
+                stats["listed"] += len(documents)
+
+                known = self.mirror.updated_at([d.id for d in documents])
+                changed = [d for d in documents if known.get(d.id) != d.updated_at]
+                stats["unchanged"] += len(documents) - len(changed)
+                # Marked missing first, so a document that fails to store is retried next run
+                self.mirror.put_metadata(changed)
+                self._store_listed(changed, stats)
+
+                for document in documents:
+                    if document.updated_at and (run_max is None or document.updated_at > run_max):
+                        run_max = document.updated_at
+                cursor = page.get("nextPageCursor")
+                self.mirror.set_state(run_cursor=cursor or "", run_max_updated_at=run_max)
+                print(f"   page {stats['pages']}: {len(documents)} listed, {len(changed)} new/changed")
+                if not cursor:
+                    break
+
+        # The high-water mark only moves once every page of the run is stored
+        high_water_mark = max(filter(None, [run_max, self.mirror.get_state("high_water_mark")]), default=None)
+        self.mirror.set_state(
+            high_water_mark=high_water_mark,
+            run_cursor=None,
+            run_updated_after=None,
+            run_max_updated_at=None,
+        )
+        print(
+            f"✅ Readwise sync done: {stats['listed']} listed, {stats['fetched']} fetched, "
+            f"{stats['unchanged']} unchanged, {stats['failed']} failed ({self.mirror.count()} mirrored)"
+        )
+        return stats
+
+    def _store_listed(self, documents: List[ReadwiseDocument], stats: Dict[str, Any]) -> None:
+        """Store documents from a withHtmlContent listing (same payload as a per-document fetch)."""
+        if not documents:
+            return
+        try:
+            self.mirror.put_full_many(documents)
+        except Exception as e:  # pylint: disable=broad-except
+            stats["failed"] += len(documents)
+            print(f"   ❌ Could not store {len(documents)} documents: {e}; will retry next sync")
+            return
+        stats["fetched"] += len(documents)
+
+    def _fetch_html(self, pool: ThreadPoolExecutor, document_ids: List[str], stats: Dict[str, Any]) -> None:
+        fetched = []
+        for document_id, document in zip(document_ids, pool.map(self._fetch_one, document_ids)):
+            if document is None:
+                stats["failed"] += 1
+                print(f"   ❌ Could not fetch HTML for {document_id}; will retry next sync")
+                continue
+            fetched.append(document)
+        self._store_listed(fetched, stats)
+
+    def _fetch_one(self, document_id: str) -> Optional[ReadwiseDocument]:
+        try:
+            return self.client.get_document_content(document_id, include_html=True)
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"   ❌ Error fetching {document_id}: {e}")
+            return None
+
+
+_default_mirror: Optional[ReadwiseMirror] = None
+_default_lock = threading.Lock()
+
+
+def get_readwise_mirror() -> ReadwiseMirror:
+    """Process-wide mirror at READWISE_MIRROR_PATH."""
+    global _default_mirror
+    if _default_mirror is None:
+        with _default_lock:
+            if _default_mirror is None:
+                _default_mirror = ReadwiseMirror()
+    return _default_mirror
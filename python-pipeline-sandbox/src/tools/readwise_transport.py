@@ -0,0 +1,147 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Readwise Reader API allows 20 requests/minute per token on the list endpoint
+READWISE_RATE_LIMIT_PER_MINUTE = float(os.getenv("READWISE_RATE_LIMIT_PER_MINUTE", "20"))
+# Requests that may go out back to back before pacing kicks in (small, so a minute never runs far over)
+READWISE_RATE_BURST = int(os.getenv("READWISE_RATE_BURST", "3"))
+READWISE_MAX_RETRIES = int(os.getenv("READWISE_MAX_RETRIES", "5"))
+READWISE_POOL_SIZE = int(os.getenv("READWISE_POOL_SIZE", "10"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Cap on any single backoff sleep, including server-sent Retry-After
+MAX_BACKOFF_SECONDS = 120.0
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a request may be sent."""
+
+    def __init__(self, rate_per_minute: float, burst: int = 1) -> None:
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(max(1, burst))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate if self.rate > 0 else 1.0)
+            time.sleep(min(wait, MAX_BACKOFF_SECONDS))
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller for seconds (the server told us to back off) and drop the burst."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+def _retry_after_seconds(response: requests.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ReadwiseTransport:
+    """Pooled keep-alive HTTP session for the Readwise API.
+
+    Requests go through a client-side token bucket sized to Readwise's rate
+    limit. 429 and 5xx responses are retried, honoring Retry-After when the
+    server sends it and backing off exponentially (with jitter) otherwise.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float = READWISE_RATE_LIMIT_PER_MINUTE,
+        burst: int = READWISE_RATE_BURST,
+        max_retries: int = READWISE_MAX_RETRIES,
+        pool_size: int = READWISE_POOL_SIZE,
+    ) -> None:
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._retries = 0
+        self._throttled = 0
+
+    def get(self, url: str, headers: Dict[str, str], params: Optional[Dict[str, Any]] = None, timeout: float = 30) -> Dict[str, Any]:
+        """GET url and return its JSON; raises requests.RequestException once retries are exhausted."""
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            self._count("_requests")
+            try:
+                response = self.session.get(url, headers=headers, params=params, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                self._backoff(attempt, None)
+                attempt += 1
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                retry_after = _retry_after_seconds(response)
+                if response.status_code == 429:
+                    self._count("_throttled")
+                    print(f"⏳ Readwise rate limited, retrying in {retry_after if retry_after is not None else 'backoff'}s")
+                self._backoff(attempt, retry_after)
+                attempt += 1
+                continue
+
+            response.raise_for_status()
+            return response.json()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": self._requests, "retries": self._retries, "throttled": self._throttled}
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> None:
+        self._count("_retries")
+        delay = retry_after if retry_after is not None else min(2 ** attempt, 60) + random.uniform(0, 1)
+        delay = min(delay, MAX_BACKOFF_SECONDS)
+        # Pause the shared bucket so concurrent callers back off too
+        self.bucket.pause(delay)
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+_default_transport: Optional[ReadwiseTransport] = None
+_default_lock = threading.Lock()
+
+
+def get_readwise_transport() -> ReadwiseTransport:
+    """Process-wide transport, so every ReadwiseClient shares one pool and one rate limit."""
+    global _default_transport
+    if _default_transport is None:
+        with _default_lock:
+            if _default_transport is None:
+                _default_transport = ReadwiseTransport()
+    return _default_transport
@@ -0,0 +1,39 @@
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+
+def parse_vector(value: Any, dim: Optional[int] = None) -> Optional[np.ndarray]:
+    """pgvector value as a float32 array, or None if it isn't a valid vector.
+
+    PostgREST returns vector columns as text like '[0.1,-0.2,...]'; that is
+    parsed in C by np.fromstring without building a Python float per element.
+    Lists (already-decoded JSON) are converted directly.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        body = value.strip()
+        if body[:1] == "[" and body[-1:] == "]":
+            body = body[1:-1]
+        if not body:
+            return None
+        try:
+            vector = np.fromstring(body, dtype=np.float32, sep=",")
+        except ValueError:
+            return None
+        # fromstring stops quietly at the first bad token; a short result means malformed input
+        if vector.size != body.count(",") + 1:
+            return None
+    else:
+        try:
+            vector = np.asarray(value, dtype=np.float32).ravel()
+        except (TypeError, ValueError):
+            return None
+    if dim is not None and vector.shape[0] != dim:
+        return None
+    return vector
+
+
+def parse_vectors(values: Sequence[Any]) -> List[Optional[np.ndarray]]:
+    return [parse_vector(v) for v in values]
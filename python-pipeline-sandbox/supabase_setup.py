@@ -110,6 +110,9 @@ class SupabaseRAGSetup:
             -- Metadata for filtering and organization
             metadata jsonb DEFAULT '{}',
 
+            -- sha256 of format_type + newline + content; loaders upsert on it
+            content_hash text UNIQUE,
+
             -- Usage tracking
             usage_count integer DEFAULT 0,
             last_used_at timestamp with time zone,
@@ -119,17 +122,40 @@ class SupabaseRAGSetup:
         );
 
         -- Create indexes for fast vector similarity search
-        CREATE INDEX IF NOT EXISTS articles_embedding_idx ON articles
-        USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+        -- HNSW needs no training data (ivfflat lists built on a near-empty table recall poorly);
+        -- query-time accuracy is set per search with hnsw.ef_search
+        DROP INDEX IF EXISTS articles_embedding_idx;
+        DROP INDEX IF EXISTS format_examples_embedding_idx;
+
+        CREATE INDEX IF NOT EXISTS articles_embedding_hnsw_idx ON articles
+        USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
 
-        CREATE INDEX IF NOT EXISTS format_examples_embedding_idx ON format_examples
-        USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+        CREATE INDEX IF NOT EXISTS format_examples_embedding_hnsw_idx ON format_examples
+        USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
 
         -- Additional indexes for common queries
         CREATE INDEX IF NOT EXISTS articles_readwise_id_idx ON articles (readwise_id);
         CREATE INDEX IF NOT EXISTS articles_created_at_idx ON articles (created_at DESC);
         CREATE INDEX IF NOT EXISTS format_examples_format_type_idx ON format_examples (format_type);
 
+        -- Existing tables: add content_hash, fill it, drop duplicate examples (keeping the oldest)
+        ALTER TABLE format_examples ADD COLUMN IF NOT EXISTS content_hash text;
+        UPDATE format_examples
+            SET content_hash = encode(sha256(convert_to(format_type || E'\\n' || content, 'UTF8')), 'hex')
+            WHERE content_hash IS NULL;
+        DELETE FROM format_examples a USING format_examples b
+            WHERE a.content_hash = b.content_hash
+              AND (a.created_at, a.id::text) > (b.created_at, b.id::text);
+        CREATE UNIQUE INDEX IF NOT EXISTS format_examples_content_hash_key ON format_examples (content_hash);
+
+        -- Full-text search over title (weight A) and content (weight B), the lexical half of hybrid retrieval
+        ALTER TABLE format_examples ADD COLUMN IF NOT EXISTS fts tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(content, '')), 'B')
+            ) STORED;
+        CREATE INDEX IF NOT EXISTS format_examples_fts_idx ON format_examples USING gin (fts);
+
         -- Enable Row Level Security (RLS) - good practice
         ALTER TABLE articles ENABLE ROW LEVEL SECURITY;
         ALTER TABLE format_examples ENABLE ROW LEVEL SECURITY;
@@ -403,6 +429,88 @@ class SupabaseRAGSetup:
         END;
         $$;
 
+        -- Top-k format examples, optionally restricted to one format_type and to rows whose
+        -- metadata contains filter_metadata (jsonb @>). Ordering by distance lets the HNSW
+        -- index answer it; ef_search trades recall for speed (pgvector default 40).
+        CREATE OR REPLACE FUNCTION match_format_examples_filtered (
+            query_embedding vector(1536),
+            match_count int DEFAULT 3,
+            filter_format_type text DEFAULT NULL,
+            filter_metadata jsonb DEFAULT '{}',
+            ef_search int DEFAULT 40
+        )
+        RETURNS TABLE (
+            id uuid,
+            format_type text,
+            title text,
+            content text,
+            metadata jsonb,
+            similarity float
+        )
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            -- Transaction-local, so other queries keep the server default
+            PERFORM set_config('hnsw.ef_search', GREATEST(ef_search, match_count)::text, true);
+            -- pgvector 0.8+: keep scanning the graph when filters drop candidates,
+            -- so a rare format_type still returns match_count rows
+            BEGIN
+                PERFORM set_config('hnsw.iterative_scan', 'relaxed_order', true);
+            EXCEPTION WHEN OTHERS THEN
+                NULL;
+            END;
+
+            RETURN QUERY
+            SELECT *
+            FROM (
+                SELECT
+                    fe.id,
+                    fe.format_type,
+                    fe.title,
+                    fe.content,
+                    fe.metadata,
+                    1 - (fe.embedding <=> query_embedding) AS similarity
+                FROM format_examples fe
+                WHERE fe.embedding IS NOT NULL
+                  AND (filter_format_type IS NULL OR fe.format_type = filter_format_type)
+                  AND (filter_metadata IS NULL OR COALESCE(fe.metadata, '{}') @> filter_metadata)
+                ORDER BY fe.embedding <=> query_embedding
+                LIMIT match_count
+            ) matches
+            -- relaxed_order may return near-ties slightly out of order
+            ORDER BY matches.similarity DESC;
+        END;
+        $$;
+
+        -- Top-k format examples by full-text rank, with the same filters. Like BM25, any query
+        -- term may match (the terms are OR-ed); ts_rank normalization 1 damps long examples.
+        -- The GIN index on fts finds the matching rows, so only match_count rows leave Postgres.
+        CREATE OR REPLACE FUNCTION search_format_examples_lexical (
+            query_text text,
+            match_count int DEFAULT 3,
+            filter_format_type text DEFAULT NULL,
+            filter_metadata jsonb DEFAULT '{}'
+        )
+        RETURNS TABLE (
+            id uuid,
+            format_type text,
+            title text,
+            content text,
+            metadata jsonb,
+            score real
+        )
+        LANGUAGE sql STABLE
+        AS $$
+            SELECT fe.id, fe.format_type, fe.title, fe.content, fe.metadata, ts_rank(fe.fts, q.query, 1) AS score
+            FROM format_examples fe,
+                 (SELECT NULLIF(replace(plainto_tsquery('english', query_text)::text, ' & ', ' | '), '')::tsquery AS query) q
+            WHERE fe.fts @@ q.query
+              AND (filter_format_type IS NULL OR fe.format_type = filter_format_type)
+              AND (filter_metadata IS NULL OR COALESCE(fe.metadata, '{}') @> filter_metadata)
+            ORDER BY 6 DESC, fe.id
+            LIMIT match_count;
+        $$;
+
         -- Function to search for similar articles
         CREATE OR REPLACE FUNCTION match_articles (
             query_embedding vector(1536),
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Sync Readwise Library
+=====================
+
+Mirror the Readwise library (metadata + HTML) into a local SQLite file.
+Later runs only fetch what changed; an interrupted run resumes where it stopped.
+The pipelines read documents from the mirror before calling the API.
+"""
+
+import argparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.tools.readwise_sync import READWISE_SYNC_WORKERS, ReadwiseSync
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the Readwise library into the local mirror")
+    parser.add_argument("--full", action="store_true", help="Re-list the whole library instead of changes since the last sync")
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent HTML fetches when retrying documents stored without HTML")
+    args = parser.parse_args()
+
+    sync = ReadwiseSync(workers=args.workers or READWISE_SYNC_WORKERS)
+    sync.run(full=args.full)
+
+
+if __name__ == "__main__":
+    main()
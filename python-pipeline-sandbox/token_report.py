@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Prompt Token Report
+===================
+
+Compare the tokens a document costs as raw HTML versus the prepared readable
+text the pipelines now prompt with. Runs over documents in the local Readwise
+mirror (see sync_readwise.py) or over a directory of saved .html pages.
+"""
+
+import argparse
+import glob
+import os
+import statistics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.tools.document_prep import prepare_documents
+from src.tools.readwise_client import document_from_api
+from src.tools.readwise_sync import get_readwise_mirror
+
+
+def load_html_dir(directory: str, limit: int):
+    """Saved pages as ReadwiseDocuments (file name as id and title)."""
+    paths = sorted(glob.glob(os.path.join(directory, "*.htm*")))[:limit]
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            html = f.read()
+        name = os.path.basename(path)
+        yield document_from_api({"id": name, "title": name, "html_content": html})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report HTML vs prepared-text prompt tokens")
+    parser.add_argument("--limit", type=int, default=50, help="Documents to include")
+    parser.add_argument("--html-dir", type=str, default=None, help="Use saved .html files instead of the mirror")
+    args = parser.parse_args()
+
+    if args.html_dir:
+        documents = load_html_dir(args.html_dir, args.limit)
+    else:
+        documents = get_readwise_mirror().iter_documents(limit=args.limit)
+
+    documents = list(documents)
+    rows = [
+        (document.title or document.id, prepared.html_tokens, prepared.text_tokens)
+        for document, prepared in zip(documents, prepare_documents(documents))
+    ]
+
+    if not rows:
+        print("❌ No documents found (run sync_readwise.py or pass --html-dir)")
+        return
+
+    print(f"{'Document':<50} {'HTML':>10} {'Text':>10} {'Saved':>7}")
+    print("-" * 80)
+    for title, html_tokens, text_tokens in rows:
+        saved = 1 - text_tokens / html_tokens if html_tokens else 0.0
+        print(f"{title[:50]:<50} {html_tokens:>10} {text_tokens:>10} {saved:>7.0%}")
+
+    html_total = sum(r[1] for r in rows)
+    text_total = sum(r[2] for r in rows)
+    ratios = [r[2] / r[1] for r in rows if r[1]]
+    print("-" * 80)
+    print(f"{'Total (' + str(len(rows)) + ' documents)':<50} {html_total:>10} {text_total:>10} "
+          f"{(1 - text_total / html_total) if html_total else 0.0:>7.0%}")
+    if ratios:
+        print(f"📉 Median text/HTML ratio: {statistics.median(ratios):.2f}")
+    # refine_icp and the writer each used to carry the full HTML
+    print(f"💰 Per pipeline run: ~{2 * (html_total - text_total) // len(rows)} input tokens saved per document")
+
+
+if __name__ == "__main__":
+    main()
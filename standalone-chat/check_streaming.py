@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Streaming Endpoint Check
+========================
+
+Runs the SSE routes in server.py against a fake OpenAI server that streams
+tokens slowly, with the chat store kept in memory, and checks:
+
+    order       /coordinator/start/stream emits accepted, conversation,
+                writer started/tokens/completed, format_agent
+                started/tokens/completed, then done, and the streamed tokens
+                add up to the final output.
+    first byte  the first SSE event arrives well before the first model token
+                (--first-token-ms), i.e. the response is not buffered.
+    disconnect  a client that hangs up after the first writer token still
+                gets both assistant messages and the waiting_for_approval
+                state persisted once the run finishes in the background.
+
+No Supabase or OpenAI credentials are needed:
+
+    pip install -r requirements.txt
+    python check_streaming.py --tokens 30 --token-ms 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# server.py builds its clients at import time; point them at nothing real
+os.environ.update({
+    "SUPABASE_URL": "http://127.0.0.1:9",
+    "SUPABASE_SERVICE_ROLE_KEY": "check-streaming",
+    "OPENAI_API_KEY": "check-streaming",
+    "TELEGRAM_BOT_TOKEN": "",
+    "LLM_CACHE_ENABLED": "0",
+    "SUMMARY_EVERY_N_MESSAGES": "0",
+})
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from openai import AsyncOpenAI  # noqa: E402
+
+import server  # noqa: E402
+from src.tools.async_chat_store import AsyncChatStore, AsyncCoordinator  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FakeOpenAI(ThreadingHTTPServer):
+    """Streams Chat Completions and Responses events: first token after first_token_ms, then one per token_ms."""
+
+    daemon_threads = True
+
+    def __init__(self, port: int, tokens: int, first_token_ms: float, token_ms: float) -> None:
+        self.tokens = tokens
+        self.first_token = first_token_ms / 1000.0
+        self.token_delay = token_ms / 1000.0
+        super().__init__(("127.0.0.1", port), FakeOpenAIHandler)
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server: FakeOpenAI
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    def do_POST(self) -> None:  # noqa: N802
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not body.get("stream"):
+            self.send_error(400, "check_streaming only serves stream=True requests")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        agent = "writer" if self.path.endswith("/chat/completions") else "format"
+        deltas = [f"{agent}-{i} " for i in range(self.server.tokens)]
+        try:
+            time.sleep(self.server.first_token)
+            for i, delta in enumerate(deltas):
+                if i:
+                    time.sleep(self.server.token_delay)
+                self._send(self._chunk(agent, delta, i))
+            if agent == "writer":
+                self.wfile.write(b"data: [DONE]\n\n")
+            else:
+                self._send({
+                    "type": "response.completed",
+                    "sequence_number": len(deltas),
+                    "response": {"id": "resp_check", "object": "response", "output": [], "usage": {"total_tokens": len(deltas)}},
+                })
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _chunk(self, agent: str, delta: str, i: int) -> Dict[str, Any]:
+        if agent == "writer":
+            return {
+                "id": "chatcmpl-check", "object": "chat.completion.chunk", "created": 0, "model": "gpt-5-mini",
+                "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}],
+            }
+        return {
+            "type": "response.output_text.delta", "item_id": "msg_check", "output_index": 0,
+            "content_index": 0, "sequence_number": i, "delta": delta,
+        }
+
+    def _send(self, data: Dict[str, Any]) -> None:
+        event = f"event: {data['type']}\n" if "type" in data else ""
+        self.wfile.write(f"{event}data: {json.dumps(data)}\n\n".encode())
+        self.wfile.flush()
+
+
+class MemoryChatStore(AsyncChatStore):
+    """AsyncChatStore with conversations, messages and prompts held in memory."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.conversations: Dict[str, Dict[str, Any]] = {}
+        self.messages: List[Dict[str, Any]] = []
+
+    async def create_conversation(self, title: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
+        conv = {"id": str(uuid.uuid4()), "title": title, "user_id": user_id, "state": {}, "summary": None}
+        self.conversations[conv["id"]] = conv
+        return conv
+
+    async def add_message(
+        self,
+        conversation_id: str,
+        role: str,
+        content: str,
+        user_id: Optional[str] = None,
+        agent_name: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        row = {
+            "id": str(uuid.uuid4()),
+            "conversation_id": conversation_id,
+            "role": role,
+            "content": content,
+            "user_id": user_id,
+            "agent_name": agent_name,
+            "metadata": metadata or {},
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.messages.append(row)
+        return row
+
+    async def get_messages(self, conversation_id: str, limit: int = 100, before_iso: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [m for m in self.messages if m["conversation_id"] == conversation_id][-limit:]
+
+    async def get_conversation_state(self, conversation_id: str) -> Dict[str, Any]:
+        return dict(self.conversations[conversation_id]["state"])
+
+    async def update_conversation_state(self, conversation_id: str, state_updates: Dict[str, Any]) -> Dict[str, Any]:
+        self.conversations[conversation_id]["state"].update(state_updates)
+        return self.conversations[conversation_id]
+
+    async def _get_current_prompt_entry(self, agent_name: str) -> Optional[Dict[str, Any]]:
+        return {"prompt": f"You are the {agent_name}.", "version": "check"}
+
+    async def load_agent_context(self, conversation_id: str, agent_name: str, recent_turns: int = 30) -> Dict[str, Any]:
+        return {
+            "summary": self.conversations[conversation_id]["summary"],
+            "prompt": await self._get_current_prompt_entry(agent_name),
+            "messages": await self.get_messages(conversation_id, limit=recent_turns),
+        }
+
+    async def get_template_by_id(self, template_id: str) -> Optional[Dict[str, Any]]:
+        return None
+
+    async def get_latest_template_by_category_format(self, category: str, format: str) -> Optional[Dict[str, Any]]:  # noqa: A002
+        return None
+
+
+def parse_events(lines: List[str]) -> List[Dict[str, Any]]:
+    events, current = [], {}
+    for line in lines:
+        if line.startswith("event: "):
+            current["event"] = line[len("event: "):]
+        elif line.startswith("data: "):
+            current["data"] = json.loads(line[len("data: "):])
+        elif not line and current:
+            events.append(current)
+            current = {}
+    return events
+
+
+def event_names(events: List[Dict[str, Any]]) -> List[str]:
+    """Event names with stage events expanded and token runs collapsed to one entry."""
+    names: List[str] = []
+    for e in events:
+        name = e["event"]
+        if name == "stage":
+            name = "stage:" + e["data"]["stage"] + (":" + e["data"]["status"] if "status" in e["data"] else "")
+        if not names or names[-1] != name or not name.endswith("_token"):
+            names.append(name)
+    return names
+
+
+EXPECTED_ORDER = [
+    "stage:accepted",
+    "conversation",
+    "stage:writer:started",
+    "writer_token",
+    "stage:writer:completed",
+    "stage:format_agent:started",
+    "format_token",
+    "stage:format_agent:completed",
+    "done",
+]
+
+
+def check_order(base_url: str, first_token_ms: float) -> List[str]:
+    failures = []
+    started = time.perf_counter()
+    first_byte = None
+    lines: List[str] = []
+    with httpx.Client(timeout=60) as http:
+        with http.stream("POST", f"{base_url}/coordinator/start/stream", json={"user_request": "Write a post about onboarding"}) as res:
+            for line in res.iter_lines():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - started
+                lines.append(line)
+    total = time.perf_counter() - started
+    events = parse_events(lines)
+    names = event_names(events)
+    print(f"⏱️  first byte {first_byte * 1000:.0f} ms, stream complete {total * 1000:.0f} ms, {len(events)} events")
+
+    if names != EXPECTED_ORDER:
+        failures.append(f"event order {names}")
+    if first_byte is None or first_byte * 1000 >= first_token_ms / 2:
+        failures.append(f"first byte after {first_byte and first_byte * 1000:.0f} ms (first model token at {first_token_ms:.0f} ms)")
+    done = next((e["data"] for e in events if e["event"] == "done"), {})
+    format_text = "".join(e["data"]["delta"] for e in events if e["event"] == "format_token")
+    if done.get("final_output") != format_text:
+        failures.append("done.final_output does not match the streamed format tokens")
+    return failures
+
+
+async def check_disconnect(base_url: str, store: MemoryChatStore, timeout: float) -> List[str]:
+    conversation_id = None
+    async with httpx.AsyncClient(timeout=60) as http:
+        async with http.stream("POST", f"{base_url}/coordinator/start/stream", json={"user_request": "Write a post about churn"}) as res:
+            lines: List[str] = []
+            async for line in res.aiter_lines():
+                lines.append(line)
+                events = parse_events(lines)
+                conversation_id = next((e["data"]["conversation_id"] for e in events if e["event"] == "conversation"), None)
+                if any(e["event"] == "writer_token" for e in events):
+                    break
+    print(f"🔌 Disconnected after the first writer token (conversation {conversation_id})")
+    if not conversation_id:
+        return ["no conversation event before the first writer token"]
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        state = store.conversations[conversation_id]["state"]
+        if state.get("status") == "waiting_for_approval":
+            break
+        await asyncio.sleep(0.05)
+    state = store.conversations[conversation_id]["state"]
+    agents = [m["agent_name"] for m in await store.get_messages(conversation_id) if m["role"] == "assistant"]
+    print(f"💾 After disconnect: status={state.get('status')}, assistant messages={agents}")
+
+    failures = []
+    if state.get("status") != "waiting_for_approval" or not state.get("final_output"):
+        failures.append(f"state not persisted after disconnect: {state.get('status')}")
+    if agents != ["Writer", "Format Agent"]:
+        failures.append(f"assistant messages after disconnect: {agents}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the SSE coordinator routes against a fake OpenAI server")
+    parser.add_argument("--tokens", type=int, default=30, help="Tokens streamed per model call")
+    parser.add_argument("--first-token-ms", type=float, default=400.0, help="Fake model latency before its first token")
+    parser.add_argument("--token-ms", type=float, default=20.0, help="Delay between streamed tokens")
+    args = parser.parse_args()
+
+    openai_port, api_port = free_port(), free_port()
+    fake = FakeOpenAI(openai_port, args.tokens, args.first_token_ms, args.token_ms)
+    threading.Thread(target=fake.serve_forever, daemon=True).start()
+
+    store = MemoryChatStore()
+    server.async_store = store
+    server.async_coordinator = AsyncCoordinator(
+        store, AsyncOpenAI(api_key="check-streaming", base_url=f"http://127.0.0.1:{openai_port}/v1"), bypass_cache=True
+    )
+
+    # lifespan off: the job runner would try to reach Supabase on startup
+    api = uvicorn.Server(uvicorn.Config(server.app, port=api_port, log_level="warning", lifespan="off"))
+    threading.Thread(target=api.run, daemon=True).start()
+    while not api.started:
+        time.sleep(0.05)
+    base_url = f"http://127.0.0.1:{api_port}"
+    run_seconds = 2 * (args.first_token_ms + args.tokens * args.token_ms) / 1000.0
+
+    print(f"📡 Fake model: {args.tokens} tokens, first after {args.first_token_ms:.0f} ms, then every {args.token_ms:.0f} ms\n")
+    failures = check_order(base_url, args.first_token_ms)
+    failures += asyncio.run(check_disconnect(base_url, store, timeout=run_seconds + 5))
+
+    api.should_exit = True
+    fake.shutdown()
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        return 1
+    print("\n✅ Events in order, first byte before the first token, run persisted after disconnect")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
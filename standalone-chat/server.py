@@ -1,17 +1,22 @@
+import json
 import os
+import time
 import uuid
-from typing import Any, Dict, Optional, List
+from typing import Any, Awaitable, Callable, Dict, Optional, List
 
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 import telebot
 import asyncio
 import threading
 
+from src.tools.async_chat_store import AsyncChatStore, AsyncCoordinator
 from src.tools.chat_store import ChatStore, Coordinator
+from src.tools.job_runner import TERMINAL_JOB_STATUSES, JobQueueFull, JobRunner
 
 
 load_dotenv()
@@ -36,17 +41,37 @@ app.add_middleware(
 store = ChatStore()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 coordinator = Coordinator(store, client)
+job_runner = JobRunner(store, coordinator)
+
+# Request-path routes await the async classes on this event loop; the sync
+# store/coordinator above run the same classes on their own loop for the job
+# runner and the Telegram bot, and serve the admin/template endpoints.
+# Both stores share the prompt cache and the write-behind message writer.
+async_store = AsyncChatStore(prompt_cache=store.prompt_cache, message_writer=store.message_writer)
+async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+async_coordinator = AsyncCoordinator(async_store, async_client)
 
 
 class StartRequest(BaseModel):
     user_request: str
     conversation_title: str | None = None
     category: str | None = None  # attract, nurture, convert
+    use_cache: bool | None = None  # True: an identical earlier request may be answered from the response cache
 
 
 class ContinueRequest(BaseModel):
     conversation_id: str
     user_response: str
+    use_cache: bool | None = None
+
+class JobRequest(BaseModel):
+    # New run: user_request (+ optional title/category). Follow-up: conversation_id + user_response.
+    user_request: Optional[str] = None
+    conversation_title: Optional[str] = None
+    category: Optional[str] = None
+    conversation_id: Optional[str] = None
+    user_response: Optional[str] = None
+    use_cache: Optional[bool] = None
 
 class FormatAgentRequest(BaseModel):
     conversation_id: str
@@ -55,6 +80,7 @@ class FormatAgentRequest(BaseModel):
     category: Optional[str] = None
     format: Optional[str] = None
     feedback: Optional[str] = None
+    use_cache: Optional[bool] = None
 
 class TemplateRequest(BaseModel):
     title: str
@@ -68,46 +94,156 @@ class TemplateRequest(BaseModel):
 
 
 @app.post("/coordinator/start")
-def start(req: StartRequest) -> Dict[str, Any]:
+async def start(req: StartRequest) -> Dict[str, Any]:
     try:
-        conv = store.create_conversation(title=req.conversation_title or "New conversation")
-        result = coordinator.process_request(req.user_request, conv["id"], req.category)
+        conv = await async_store.create_conversation(title=req.conversation_title or "New conversation")
+        result = await async_coordinator.process_request(req.user_request, conv["id"], req.category, use_cache=req.use_cache)
         return {"conversation_id": conv["id"], **result}
     except Exception as e:  # pylint: disable=broad-except
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/coordinator/continue")
-def continue_(req: ContinueRequest) -> Dict[str, Any]:
+async def continue_(req: ContinueRequest) -> Dict[str, Any]:
     try:
-        result = coordinator.continue_after_user_input(req.conversation_id, req.user_response)
+        result = await async_coordinator.continue_after_user_input(req.conversation_id, req.user_response, use_cache=req.use_cache)
+        return {"conversation_id": req.conversation_id, **result}
+    except Exception as e:  # pylint: disable=broad-except
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+EmitFn = Callable[[str, Dict[str, Any]], None]
+
+# Keep references to in-flight streaming runs so they aren't garbage collected
+_stream_tasks: "set[asyncio.Task[Any]]" = set()
+
+
+def _stream_coordinator_run(run: Callable[[EmitFn], Awaitable[Dict[str, Any]]]) -> StreamingResponse:
+    """Run a coordinator workflow as a background task and relay its events as SSE.
+
+    The workflow keeps running (and persists its messages/state) even if the
+    client disconnects mid-stream.
+    """
+    events: "asyncio.Queue[Any]" = asyncio.Queue()
+    finished = object()
+
+    def emit(event: str, data: Dict[str, Any]) -> None:
+        events.put_nowait((event, data))
+
+    async def worker() -> None:
+        try:
+            events.put_nowait(("done", await run(emit)))
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"❌ Streaming run error: {e}")
+            events.put_nowait(("error", {"detail": str(e)}))
+        finally:
+            events.put_nowait(finished)
+
+    task = asyncio.create_task(worker())
+    _stream_tasks.add(task)
+    task.add_done_callback(_stream_tasks.discard)
+
+    async def body():
+        yield _sse_event("stage", {"stage": "accepted"})
+        while True:
+            item = await events.get()
+            if item is finished:
+                break
+            yield _sse_event(*item)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/coordinator/start/stream")
+async def start_stream(req: StartRequest) -> StreamingResponse:
+    async def run(emit: EmitFn) -> Dict[str, Any]:
+        conv = await async_store.create_conversation(title=req.conversation_title or "New conversation")
+        emit("conversation", {"conversation_id": conv["id"]})
+        result = await async_coordinator.process_request(
+            req.user_request, conv["id"], req.category, emit=emit, use_cache=req.use_cache
+        )
+        return {"conversation_id": conv["id"], **result}
+
+    return _stream_coordinator_run(run)
+
+
+@app.post("/coordinator/continue/stream")
+async def continue_stream(req: ContinueRequest) -> StreamingResponse:
+    async def run(emit: EmitFn) -> Dict[str, Any]:
+        result = await async_coordinator.continue_after_user_input(
+            req.conversation_id, req.user_response, emit=emit, use_cache=req.use_cache
+        )
         return {"conversation_id": req.conversation_id, **result}
+
+    return _stream_coordinator_run(run)
+
+
+@app.post("/coordinator/jobs", status_code=202)
+def create_job(req: JobRequest) -> Dict[str, Any]:
+    if req.conversation_id and req.user_response:
+        kind = "continue"
+        payload = {"conversation_id": req.conversation_id, "user_response": req.user_response, "use_cache": req.use_cache}
+    elif req.user_request:
+        kind = "start"
+        payload = {
+            "user_request": req.user_request,
+            "conversation_title": req.conversation_title,
+            "category": req.category,
+            "use_cache": req.use_cache,
+        }
+    else:
+        raise HTTPException(status_code=400, detail="Provide user_request, or conversation_id and user_response")
+
+    try:
+        job = job_runner.submit(kind, payload, conversation_id=req.conversation_id if kind == "continue" else None)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:  # pylint: disable=broad-except
         raise HTTPException(status_code=500, detail=str(e))
+    return {"job_id": job["id"], "status": job["status"]}
+
+
+@app.get("/coordinator/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0) -> Dict[str, Any]:
+    """Job status and output; wait=N long-polls up to N seconds (max 60) for completion."""
+    deadline = time.monotonic() + max(0.0, min(wait, 60.0))
+    job = await asyncio.to_thread(job_runner.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    # Jobs run by this process are tracked in memory; others are read from the DB off the event loop
+    while job.get("status") not in TERMINAL_JOB_STATUSES and time.monotonic() < deadline:
+        await asyncio.sleep(0.5)
+        job = await asyncio.to_thread(job_runner.get, job_id) or job
+    return job
+
+
+@app.get("/stats/jobs")
+def job_stats() -> Dict[str, Any]:
+    return job_runner.stats()
 
 
 @app.post("/format-agent/transform")
-def format_agent_transform(req: FormatAgentRequest) -> Dict[str, Any]:
+async def format_agent_transform(req: FormatAgentRequest) -> Dict[str, Any]:
     try:
         print(f"🔧 Format Agent Transform Request: {req.category}/{req.format}")
         
-        if req.feedback:
-            content = coordinator._call_format_agent_with_feedback(  # noqa: SLF001
-                req.conversation_id,
-                req.draft,
-                req.feedback,
-                template_id=req.template_id,
-                category=req.category,
-                format=req.format,
-            )
-        else:
-            content = coordinator._call_format_agent(  # noqa: SLF001
-                req.conversation_id,
-                req.draft,
-                template_id=req.template_id,
-                category=req.category,
-                format=req.format,
-            )
+        content = await async_coordinator._call_format_agent(  # noqa: SLF001
+            req.conversation_id,
+            req.draft,
+            template_id=req.template_id,
+            category=req.category,
+            format=req.format,
+            feedback=req.feedback,
+            use_cache=req.use_cache,
+        )
         
         print(f"✅ Format Agent completed: {len(content)} characters")
         return {"conversation_id": req.conversation_id, "content": content}
@@ -115,6 +251,28 @@ def format_agent_transform(req: FormatAgentRequest) -> Dict[str, Any]:
         print(f"❌ Format Agent error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.on_event("startup")
+def start_job_runner() -> None:
+    job_runner.start()
+
+
+@app.on_event("shutdown")
+async def flush_pending_messages() -> None:
+    job_runner.shutdown()
+    await async_store.aclose()
+    store.close()
+
+
+@app.get("/stats/prompt-cache")
+def prompt_cache_stats() -> Dict[str, Any]:
+    return store.prompt_cache_stats()
+
+
+@app.get("/stats/llm-cache")
+def llm_cache_stats() -> Dict[str, Any]:
+    return coordinator.cache.stats()
+
+
 # Template endpoints
 @app.get("/templates")
 async def get_templates(category: Optional[str] = None, format: Optional[str] = None):
@@ -144,7 +302,7 @@ async def create_template(req: TemplateRequest):
 @app.get("/templates/{template_id}")
 async def get_template(template_id: str):
     try:
-        template = store.get_template_by_id(template_id)
+        template = await async_store.get_template_by_id(template_id)
         if not template:
             raise HTTPException(status_code=404, detail="Template not found")
         return template
@@ -0,0 +1,1035 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from supabase import AsyncClient, Client, acreate_client, create_client
+
+from .context_planner import ContextPlanner
+from .document_cache import get_document_cache
+from .document_digest import get_document_digester
+from .llm_cache import LLMCache, get_llm_cache, request_key
+from .message_writer import MESSAGE_WRITE_BEHIND, MessageWriter, stamp_message
+
+load_dotenv()
+
+
+def _supabase_credentials() -> Tuple[str, str]:
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY")
+    if not url or not key:
+        raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY/ANON_KEY env vars")
+    return url, key
+
+
+def _create_client() -> Client:
+    return create_client(*_supabase_credentials())
+
+
+# Current system prompts change rarely; serve them from memory for this long
+PROMPT_CACHE_TTL_SECONDS = float(os.getenv("PROMPT_CACHE_TTL_SECONDS", "300"))
+
+# Coordinators answer identical Writer/Format Agent requests from the LLM response cache only when enabled
+COORDINATOR_LLM_CACHE = os.getenv("COORDINATOR_LLM_CACHE", "").lower() in ("1", "true", "yes")
+
+# Token budgets for agent context and summary transcripts
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "16000"))
+CONTEXT_HISTORY_LIMIT = int(os.getenv("CONTEXT_HISTORY_LIMIT", "200"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "4000"))
+
+# Refresh the running summary in the background after this many new messages (0 disables)
+SUMMARY_EVERY_N_MESSAGES = int(os.getenv("SUMMARY_EVERY_N_MESSAGES", "10"))
+
+SUMMARY_SYSTEM_PROMPT = "Update the running summary of this conversation with the new messages. Keep key facts, decisions, and user preferences. Be concise."
+
+
+class PromptCache:
+    """TTL cache of current system prompts: agent_name -> {"prompt", "version"} or None."""
+
+    def __init__(self, ttl: float = PROMPT_CACHE_TTL_SECONDS) -> None:
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, Optional[Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, agent_name: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """(hit, entry); counts the lookup as a hit or miss."""
+        with self._lock:
+            cached = self._entries.get(agent_name)
+            if cached and cached[0] > time.monotonic():
+                self._hits += 1
+                return True, cached[1]
+            self._misses += 1
+            return False, None
+
+    def put(self, agent_name: str, entry: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._entries[agent_name] = (time.monotonic() + self.ttl, entry)
+
+    def invalidate(self, agent_name: Optional[str] = None) -> None:
+        with self._lock:
+            if agent_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(agent_name, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self._hits, self._misses
+            size = len(self._entries)
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "entries": size,
+            "ttl_seconds": self.ttl,
+        }
+
+
+class ContentInstructionMixin:
+    """Parsing of user instructions and Readwise retrieval, shared by the sync and async stores."""
+
+    # Readwise Content Retrieval
+    def extract_readwise_url(self, text: str) -> Optional[str]:
+        """Extract Readwise URL from text if present."""
+        # First try YAML format: - url: <url>
+        yaml_url_pattern = r'-\s*url:\s*(https://read\.readwise\.io/[^\s\]]+)'
+        match = re.search(yaml_url_pattern, text, re.IGNORECASE)
+        if match:
+            return match.group(1)
+        
+        # Fallback to direct URL pattern
+        readwise_pattern = r'https://read\.readwise\.io/[^\s\]]+'
+        match = re.search(readwise_pattern, text)
+        return match.group(0) if match else None
+
+    def retrieve_readwise_content(self, url: str) -> Dict[str, Any]:
+        """Retrieve content from Readwise URL using the proper Readwise API."""
+        try:
+            print(f"📖 Retrieving Readwise content from: {url}")
+            
+            # Extract document ID from Readwise URL
+            # URL format: https://read.readwise.io/new/read/01k56vzpz8cz9zncnsj2drsqer
+            doc_id_match = re.search(r'/read/([a-zA-Z0-9]+)', url)
+            if not doc_id_match:
+                raise ValueError(f"Could not extract document ID from URL: {url}")
+            
+            document_id = doc_id_match.group(1)
+            print(f"📖 Extracted document ID: {document_id}")
+            
+            # Served from the local document cache when we've seen this article before
+            cached = get_document_cache().fetch(document_id)
+            
+            if not cached:
+                raise ValueError(f"Document {document_id} not found in Readwise")
+            document, clean_content = cached
+            
+            print(f"✅ Retrieved: {document.title} ({document.word_count} words)")
+            print(f"Author: {document.author}")
+            print(f"URL: {document.url}")
+            
+            # Long articles are condensed with a (cached) map-reduce digest instead of cut off
+            if not clean_content:
+                clean_content = "No content available"
+            else:
+                digester = get_document_digester()
+                if digester.needs_digest(clean_content):
+                    try:
+                        clean_content = digester.digest(document_id, clean_content)
+                        print(f"🧩 Using digest of long article ({len(clean_content)} chars)")
+                    except Exception as e:  # pylint: disable=broad-except
+                        print(f"⚠️  Digest failed, truncating article instead: {e}")
+                        clean_content = clean_content[:8000] + "..."
+            
+            result = {
+                "title": document.title,
+                "content": clean_content,
+                "html_content": document.html_content,
+                "author": document.author,
+                "url": document.url,
+                "word_count": document.word_count,
+                "document_id": document_id,
+                "success": True,
+                "content_length": len(clean_content)
+            }
+            
+            print(f"✅ Retrieved Readwise content: {result['content_length']} characters")
+            return result
+            
+        except Exception as e:
+            print(f"❌ Error retrieving Readwise content: {e}")
+            return {
+                "title": "Error",
+                "content": f"Failed to retrieve content from {url}: {str(e)}",
+                "url": url,
+                "success": False,
+                "error": str(e)
+            }
+
+    def parse_content_instruction(self, instruction: str) -> Dict[str, Optional[str]]:
+        """Parse YAML-style instruction format:
+        - url: <url>
+        - icp: <target audience>
+        - dream: <desired outcome>
+        - category: <content category>
+        - format: <content format>
+        """
+        result = {
+            "icp": None,
+            "dream": None,
+            "category": None,
+            "format": None,
+            "instruction_text": instruction
+        }
+        
+        # Pattern to match YAML-style key-value pairs
+        yaml_pattern = r'-\s*(\w+):\s*(.+?)(?=\n\s*-\s*\w+:|$)'
+        matches = re.findall(yaml_pattern, instruction, re.MULTILINE | re.DOTALL)
+        
+        for key, value in matches:
+            key = key.strip().lower()
+            value = value.strip()
+            
+            if key == "icp":
+                result["icp"] = value
+            elif key == "dream":
+                result["dream"] = value
+            elif key == "category":
+                result["category"] = value
+            elif key == "format":
+                result["format"] = value
+        
+        return result
+
+
+# Streaming callback: emit(event_name, payload). Used for SSE stage/token events.
+EmitFn = Callable[[str, Dict[str, Any]], None]
+
+
+def _response_text(response: Any) -> str:
+    """Text of a Responses API result, with a fallback walk if output_text is missing."""
+    content = getattr(response, "output_text", "") or ""
+    if not content:
+        # Fallback extraction if SDK structure changes
+        for item in getattr(response, "output", []) or []:
+            for block in getattr(item, "content", []) or []:
+                if getattr(block, "type", "") in ("output_text", "input_text"):
+                    text_val = getattr(block, "text", "") or ""
+                    if text_val:
+                        content = text_val
+                        break
+            if content:
+                break
+    return content
+
+
+def _usage_tokens(response: Any) -> Optional[int]:
+    """total_tokens from a Chat Completions / Responses usage block, if reported."""
+    return getattr(getattr(response, "usage", None), "total_tokens", None)
+
+
+# Responses API options shared by every Format Agent call
+FORMAT_AGENT_OPTIONS: Dict[str, Any] = {
+    "model": "gpt-5-mini",
+    "reasoning": {"effort": "medium"},
+    "text": {"format": {"type": "text"}, "verbosity": "medium"},
+}
+
+SATISFACTION_INDICATORS = [
+    "perfect", "great", "good", "looks good", "that works", 
+    "i'm satisfied", "done", "complete", "thanks", "approve"
+]
+
+
+def build_writer_prompt(
+    user_request: str,
+    readwise_content: Optional[Dict[str, Any]],
+    parsed_instruction: Dict[str, Optional[str]],
+    category: Optional[str] = None,
+) -> str:
+    """Writer user prompt: request + Readwise article + content strategy + category focus."""
+    # Build enhanced prompt
+    enhanced_prompt = user_request
+    
+    # Add Readwise content if available
+    if readwise_content and readwise_content.get("success"):
+        enhanced_prompt += f"\n\n--- READWISE ARTICLE TO SUMMARIZE ---\n"
+        enhanced_prompt += f"Title: {readwise_content['title']}\n"
+        enhanced_prompt += f"Author: {readwise_content.get('author', 'Unknown')}\n"
+        enhanced_prompt += f"URL: {readwise_content['url']}\n"
+        enhanced_prompt += f"Word Count: {readwise_content.get('word_count', 'Unknown')}\n"
+        enhanced_prompt += f"Content: {readwise_content['content']}\n"
+        enhanced_prompt += f"--- END READWISE ARTICLE ---\n"
+        enhanced_prompt += f"\nTASK: Summarize this article and create LinkedIn content based on it.\n"
+    
+    # Add parsed instruction context
+    if parsed_instruction["icp"] or parsed_instruction["dream"]:
+        enhanced_prompt += f"\n\n--- CONTENT STRATEGY ---\n"
+        if parsed_instruction["icp"]:
+            enhanced_prompt += f"Target ICP: {parsed_instruction['icp']}\n"
+        if parsed_instruction["dream"]:
+            enhanced_prompt += f"Desired Outcome: {parsed_instruction['dream']}\n"
+        if parsed_instruction["category"]:
+            enhanced_prompt += f"Content Category: {parsed_instruction['category']}\n"
+        if parsed_instruction["format"]:
+            enhanced_prompt += f"Content Format: {parsed_instruction['format']}\n"
+        enhanced_prompt += f"--- END CONTENT STRATEGY ---\n"
+    
+    # Add category context to user prompt if provided
+    if category:
+        category_context = f"\n\nContent Strategy Category: {category.upper()}\n"
+        category_context += f"Focus on creating content that serves the {category} goal:\n"
+        if category == "attract":
+            category_context += "- Build awareness and trust\n- Get the right people to notice and remember you"
+        elif category == "nurture":
+            category_context += "- Show authority and create demand\n- Build trust and keep audience engaged"
+        elif category == "convert":
+            category_context += "- Qualify and filter buyers\n- Move them toward working with you"
+        enhanced_prompt += category_context
+    return enhanced_prompt
+
+
+def format_agent_input(draft: str, template_text: Optional[str] = None, feedback: Optional[str] = None) -> str:
+    """Format Agent input: draft, optional template to follow, optional user feedback."""
+    input_text = (
+        "Review and transform this draft into a LinkedIn-ready post following the required format.\n\n"
+        + (f"Template to follow (style/structure):\n{template_text}\n\n" if template_text else "")
+        + f"Draft:\n{draft}"
+    )
+    if feedback:
+        input_text += f"\n\nUser feedback to incorporate:\n{feedback}"
+    return input_text
+
+
+def format_agent_metadata(version_used: Optional[str], chosen_template: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Message metadata for a Format Agent reply (persist the current version string)."""
+    return {
+        "model": "gpt-5-mini",
+        "system_prompt_version": version_used,
+        "template_id": (chosen_template or {}).get("id") if chosen_template else None,
+        "template_category": (chosen_template or {}).get("category") if chosen_template else None,
+        "template_format": (chosen_template or {}).get("format") if chosen_template else None,
+    }
+
+
+def is_satisfaction_response(response: str) -> bool:
+    """Check if user response indicates satisfaction"""
+    response_lower = response.lower()
+    return any(indicator in response_lower for indicator in SATISFACTION_INDICATORS)
+
+
+def template_lookup(parsed_instruction: Dict[str, Optional[str]], category: Optional[str] = None) -> Optional[Tuple[str, str]]:
+    """(category, format) to prefetch a Format Agent template for, if the request names both."""
+    template_category = parsed_instruction.get("category") or category
+    template_format = parsed_instruction.get("format")
+    if template_category and template_format:
+        return template_category, template_format
+    return None
+
+
+class AsyncChatStore(ContentInstructionMixin):
+    """Conversation store behind the agent workflow (AsyncClient + AsyncOpenAI).
+
+    The sync ChatStore runs these methods on a private event loop; admin
+    operations (templates CRUD, set_system_prompt, jobs) live on ChatStore only.
+    Pass the sync store's message_writer so both write through one
+    write-behind queue and read the same not-yet-stored messages.
+    """
+
+    def __init__(
+        self,
+        client: Optional[AsyncClient] = None,
+        prompt_cache_ttl: Optional[float] = None,
+        prompt_cache: Optional[PromptCache] = None,
+        message_writer: Optional[MessageWriter] = None,
+        write_behind: Optional[bool] = None,
+    ) -> None:
+        self._client: Optional[AsyncClient] = client
+        self._client_lock = asyncio.Lock()
+        self.llm = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.context_planner = ContextPlanner()
+        self.prompt_cache = prompt_cache or PromptCache(PROMPT_CACHE_TTL_SECONDS if prompt_cache_ttl is None else prompt_cache_ttl)
+        # The writer runs on its own thread with the sync client
+        self._owns_writer = message_writer is None and (MESSAGE_WRITE_BEHIND if write_behind is None else write_behind)
+        self.message_writer = MessageWriter(_create_client()) if self._owns_writer else message_writer
+
+        self._unsummarized_counts: Dict[str, int] = {}
+        self._summaries_in_flight: Set[str] = set()
+        self._background_tasks: Set["asyncio.Task[Any]"] = set()
+
+    async def db(self) -> AsyncClient:
+        """The async Supabase client, created on first use."""
+        if self._client is None:
+            async with self._client_lock:
+                if self._client is None:
+                    self._client = await acreate_client(*_supabase_credentials())
+        return self._client
+
+    async def aclose(self) -> None:
+        """Wait for background summaries to finish (and stop the message writer if this store created it)."""
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        if self._owns_writer:
+            await asyncio.to_thread(self.message_writer.close)
+
+    async def flush(self) -> None:
+        """Wait until queued messages are written; raises MessageWriteError if some can't be stored."""
+        if self.message_writer is not None:
+            await asyncio.to_thread(self.message_writer.flush)
+
+    # Conversations
+    async def create_conversation(self, title: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
+        row = {"title": title, "user_id": user_id}
+        res = await (await self.db()).table("conversations").insert(row).execute()
+        return res.data[0]
+
+    # Messages
+    async def add_message(
+        self,
+        conversation_id: str,
+        role: str,
+        content: str,
+        user_id: Optional[str] = None,
+        agent_name: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        durable: bool = False,
+    ) -> Dict[str, Any]:
+        """Insert a message.
+
+        In write-behind mode the row is queued and returned immediately; pass
+        durable=True when the caller needs the row committed before continuing
+        (raises MessageWriteError if earlier queued messages can't be stored).
+        """
+        row = {
+            "conversation_id": conversation_id,
+            "role": role,
+            "content": content,
+            "user_id": user_id,
+            "agent_name": agent_name,
+            "metadata": metadata or {},
+        }
+        saved = await self._persist_message(row, durable)
+        self._note_new_message(conversation_id)
+        return saved
+
+    async def _persist_message(self, row: Dict[str, Any], durable: bool) -> Dict[str, Any]:
+        writer = self.message_writer
+        if writer is None or not writer.running:
+            res = await (await self.db()).table("messages").insert(row).execute()
+            return res.data[0]
+
+        if durable:
+            # Earlier queued messages must land first to keep created_at order meaningful
+            await self.flush()
+            res = await (await self.db()).table("messages").insert(stamp_message(row)).execute()
+            return res.data[0]
+
+        if not writer.submit(row):
+            # Backpressure: the batched insert is blocking, keep it off the event loop
+            await asyncio.to_thread(writer.write, [row])
+        return row
+
+    def _merge_pending_messages(
+        self,
+        conversation_id: str,
+        rows: List[Dict[str, Any]],
+        limit: int,
+        before_iso: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Overlay not-yet-written messages on rows read from the DB (oldest first)."""
+        if self.message_writer is None:
+            return rows
+        return self.message_writer.merge_pending(conversation_id, rows, limit, before_iso)
+
+    async def get_messages(
+        self,
+        conversation_id: str,
+        limit: int = 100,
+        before_iso: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        q = (
+            (await self.db()).table("messages")
+            .select("*")
+            .eq("conversation_id", conversation_id)
+            .order("created_at", desc=True)
+            .limit(limit)
+        )
+        if before_iso:
+            q = q.lt("created_at", before_iso)
+        res = await q.execute()
+        return self._merge_pending_messages(conversation_id, list(reversed(res.data)), limit, before_iso)
+
+    # State management
+    async def get_conversation_state(self, conversation_id: str) -> Dict[str, Any]:
+        """Get the current state of a conversation"""
+        res = await (await self.db()).table("conversations").select("state").eq("id", conversation_id).single().execute()
+        return res.data.get("state", {}) if res.data else {}
+
+    async def update_conversation_state(self, conversation_id: str, state_updates: Dict[str, Any]) -> Dict[str, Any]:
+        """Update conversation state (merges with existing state).
+
+        The merge runs server-side (`state || patch` in merge_conversation_state),
+        so it is a single round trip and concurrent updates don't overwrite each other.
+        """
+        res = await (await self.db()).rpc(
+            "merge_conversation_state",
+            {"p_conversation_id": conversation_id, "p_patch": state_updates},
+        ).execute()
+        return res.data[0] if res.data else {}
+
+    # Summary management
+    async def update_running_summary(self, conversation_id: str, recent_turns: int = 200) -> Optional[str]:
+        """Fold messages newer than the summary watermark into conversations.summary.
+
+        Only the previous summary plus the new messages go to the LLM, in chunks
+        of at most SUMMARY_TOKEN_BUDGET tokens; recent_turns caps how many new
+        messages are read per call. The watermark (summarized_through /
+        summarized_message_id) advances with each chunk.
+        """
+        # Queued write-behind rows must be in the DB before we read past the watermark
+        await self.flush()
+        db = await self.db()
+        res = await (
+            db.table("conversations")
+            .select("summary, summarized_through")
+            .eq("id", conversation_id)
+            .single()
+            .execute()
+        )
+        conv = res.data or {}
+        summary = conv.get("summary")
+        watermark = conv.get("summarized_through")
+
+        q = (
+            db.table("messages")
+            .select("id, role, content, created_at")
+            .eq("conversation_id", conversation_id)
+            .order("created_at")
+            .limit(recent_turns)
+        )
+        if watermark:
+            q = q.gt("created_at", watermark)
+        pending = (await q.execute()).data or []
+
+        while pending:
+            # Token counting (tiktoken) is CPU-bound; keep it off the event loop
+            chunk = await asyncio.to_thread(self.context_planner.fit_oldest, pending, SUMMARY_TOKEN_BUDGET)
+            pending = pending[len(chunk):]
+            transcript = "\n".join([f"{m['role']}: {m['content']}" for m in chunk])
+
+            prompt = [
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": f"Current summary:\n{summary or '(none yet)'}\n\nNew messages:\n{transcript}"}
+            ]
+            llm_res = await self.llm.chat.completions.create(model="gpt-5-mini", messages=prompt)
+            summary = llm_res.choices[0].message.content
+
+            await db.table("conversations").update({
+                "summary": summary,
+                "summarized_through": chunk[-1]["created_at"],
+                "summarized_message_id": chunk[-1]["id"],
+            }).eq("id", conversation_id).execute()
+
+        return summary
+
+    def _note_new_message(self, conversation_id: str) -> None:
+        """Count a new message and schedule a background summary every SUMMARY_EVERY_N_MESSAGES."""
+        if SUMMARY_EVERY_N_MESSAGES <= 0:
+            return
+        count = self._unsummarized_counts.get(conversation_id, 0) + 1
+        if count < SUMMARY_EVERY_N_MESSAGES or conversation_id in self._summaries_in_flight:
+            self._unsummarized_counts[conversation_id] = count
+            return
+        self._unsummarized_counts[conversation_id] = 0
+        self._summaries_in_flight.add(conversation_id)
+        task = asyncio.create_task(self._background_summary(conversation_id))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _background_summary(self, conversation_id: str) -> None:
+        try:
+            await self.update_running_summary(conversation_id)
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"❌ Background summary failed for {conversation_id}: {e}")
+        finally:
+            self._summaries_in_flight.discard(conversation_id)
+
+    # System prompts
+    async def _get_current_prompt_entry(self, agent_name: str) -> Optional[Dict[str, Any]]:
+        """Get the current prompt text and version for an agent, cached for PROMPT_CACHE_TTL_SECONDS."""
+        hit, entry = self.prompt_cache.get(agent_name)
+        if hit:
+            return entry
+
+        # Prompt and version in one query so both getters share a single round trip
+        res = await (
+            (await self.db()).table("system_prompts")
+            .select("prompt, version")
+            .eq("agent_name", agent_name)
+            .eq("is_current", True)
+            .limit(1)
+            .execute()
+        )
+        entry = res.data[0] if res.data else None
+        self.prompt_cache.put(agent_name, entry)
+        return entry
+
+    async def get_system_prompt(self, agent_name: str) -> Optional[str]:
+        """Get the current system prompt for agent."""
+        entry = await self._get_current_prompt_entry(agent_name)
+        return entry.get("prompt") if entry else None
+
+    async def get_current_prompt_version(self, agent_name: str) -> Optional[str]:
+        """Get the current version string for an agent's system prompt."""
+        entry = await self._get_current_prompt_entry(agent_name)
+        return entry.get("version") if entry else None
+
+    def prompt_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for the prompt registry cache."""
+        return self.prompt_cache.stats()
+
+    # Context builder
+    async def load_agent_context(self, conversation_id: str, agent_name: str, recent_turns: int = 30) -> Dict[str, Any]:
+        """Fetch summary, current agent prompt and recent messages in a single round trip.
+
+        Returns {"summary": str | None, "prompt": {"prompt", "version"} | None, "messages": [...]}
+        with messages oldest first. The prompt also refreshes the prompt registry cache.
+        """
+        res = await (await self.db()).rpc(
+            "load_agent_context",
+            {"p_conversation_id": conversation_id, "p_agent_name": agent_name, "p_recent_turns": recent_turns},
+        ).execute()
+        data = res.data or {}
+        self.prompt_cache.put(agent_name, data.get("prompt"))
+        return {
+            "summary": data.get("summary"),
+            "prompt": data.get("prompt"),
+            "messages": self._merge_pending_messages(conversation_id, data.get("messages") or [], recent_turns),
+        }
+
+    async def build_context_for_agent(
+        self,
+        conversation_id: str,
+        agent_name: str,
+        recent_turns: Optional[int] = None,
+        token_budget: Optional[int] = None,
+    ) -> List[Dict[str, str]]:
+        """Build context using stored system prompt for agent.
+
+        Fills token_budget (default CONTEXT_TOKEN_BUDGET) with the system prompt,
+        then the summary, then as many of the newest turns as fit. recent_turns
+        caps how many messages are fetched (default CONTEXT_HISTORY_LIMIT).
+        """
+        return (await self.build_context_with_prompt(conversation_id, agent_name, recent_turns, token_budget))[0]
+
+    async def build_context_with_prompt(
+        self,
+        conversation_id: str,
+        agent_name: str,
+        recent_turns: Optional[int] = None,
+        token_budget: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, str]], Optional[Dict[str, Any]]]:
+        """build_context_for_agent plus the {"prompt", "version"} entry it was built from."""
+        loaded = await self.load_agent_context(
+            conversation_id, agent_name, recent_turns=recent_turns or CONTEXT_HISTORY_LIMIT
+        )
+        context = await asyncio.to_thread(
+            self.context_planner.plan,
+            token_budget or CONTEXT_TOKEN_BUDGET,
+            system_prompt=(loaded["prompt"] or {}).get("prompt"),
+            summary=loaded["summary"],
+            history=loaded["messages"],
+        )
+        return context, loaded["prompt"]
+
+    # Content Templates
+    async def get_template_by_id(self, template_id: str) -> Optional[Dict[str, Any]]:
+        """Get a specific template by ID."""
+        res = await (await self.db()).table("content_templates").select("*").eq("id", template_id).limit(1).execute()
+        return res.data[0] if res.data else None
+
+    async def get_latest_template_by_category_format(self, category: str, format: str) -> Optional[Dict[str, Any]]:
+        """Get the most recent template for a category/format pair."""
+        res = await (
+            (await self.db()).table("content_templates")
+            .select("*")
+            .eq("category", category)
+            .eq("format", format)
+            .order("created_at", desc=True)
+            .limit(1)
+            .execute()
+        )
+        return res.data[0] if res.data else None
+
+    # Readwise (the Readwise client is sync; keep it off the event loop)
+    async def aretrieve_readwise_content(self, url: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.retrieve_readwise_content, url)
+
+
+async def _timed(timings: Dict[str, float], stage: str, awaitable: Awaitable[Any]) -> Any:
+    """Await and record wall time as timings["<stage>_ms"]."""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[f"{stage}_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+
+async def _none() -> None:
+    return None
+
+
+class AsyncCoordinator:
+    """Orchestrates agent workflows with completion tracking (Coordinator wraps it for sync callers)."""
+
+    def __init__(
+        self,
+        store: AsyncChatStore,
+        client: AsyncOpenAI,
+        cache: Optional[LLMCache] = None,
+        bypass_cache: Optional[bool] = None,
+    ):
+        self.store = store
+        self.client = client
+        # Users asking again expect a fresh draft, so the response cache is opt-in
+        # (COORDINATOR_LLM_CACHE, or use_cache per call); bypass_cache overrides the default
+        self.cache = cache or get_llm_cache()
+        self.bypass_cache = (not COORDINATOR_LLM_CACHE) if bypass_cache is None else bypass_cache
+
+    async def _cached_completion(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Tuple[str, Optional[int]]]],
+        emit: Optional[EmitFn],
+        token_event: str,
+        use_cache: Optional[bool] = None,
+    ) -> str:
+        """Serve key from the response cache, or compute and store it. A hit is emitted as one delta.
+
+        use_cache overrides the coordinator's bypass_cache for this call.
+        """
+        if self.bypass_cache if use_cache is None else not use_cache:
+            return (await compute())[0]
+        # The cache's disk tier is SQLite; keep its reads and writes off the event loop
+        content = await asyncio.to_thread(self.cache.get, key)
+        if content is not None:
+            if emit:
+                emit(token_event, {"delta": content, "cached": True})
+            return content
+        content, tokens = await compute()
+        await asyncio.to_thread(self.cache.put, key, content, tokens)
+        return content
+
+    async def _complete_chat(
+        self,
+        messages: List[Dict[str, str]],
+        emit: Optional[EmitFn] = None,
+        token_event: str = "writer_token",
+        use_cache: Optional[bool] = None,
+    ) -> str:
+        """Chat Completions call (cached); streams deltas through emit when given."""
+        key = request_key(api="chat.completions", model="gpt-5-mini", messages=messages)
+        return await self._cached_completion(key, lambda: self._create_chat(messages, emit, token_event), emit, token_event, use_cache)
+
+    async def _create_chat(self, messages: List[Dict[str, str]], emit: Optional[EmitFn], token_event: str) -> Tuple[str, Optional[int]]:
+        if emit is None:
+            response = await self.client.chat.completions.create(model="gpt-5-mini", messages=messages)
+            return response.choices[0].message.content, _usage_tokens(response)
+
+        parts: List[str] = []
+        stream = await self.client.chat.completions.create(model="gpt-5-mini", messages=messages, stream=True)
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                emit(token_event, {"delta": delta})
+        return "".join(parts), None
+
+    async def _complete_response(
+        self,
+        emit: Optional[EmitFn] = None,
+        token_event: str = "format_token",
+        use_cache: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> str:
+        """Responses API call (cached); streams output_text deltas through emit when given."""
+        key = request_key(api="responses", **kwargs)
+        return await self._cached_completion(key, lambda: self._create_response(emit, token_event, **kwargs), emit, token_event, use_cache)
+
+    async def _create_response(self, emit: Optional[EmitFn], token_event: str, **kwargs: Any) -> Tuple[str, Optional[int]]:
+        if emit is None:
+            response = await self.client.responses.create(**kwargs)
+            return _response_text(response), _usage_tokens(response)
+
+        parts: List[str] = []
+        final_response = None
+        stream = await self.client.responses.create(stream=True, **kwargs)
+        async for event in stream:
+            event_type = getattr(event, "type", "")
+            if event_type == "response.output_text.delta":
+                parts.append(event.delta)
+                emit(token_event, {"delta": event.delta})
+            elif event_type == "response.completed":
+                final_response = event.response
+        content = "".join(parts) or (_response_text(final_response) if final_response is not None else "")
+        return content, _usage_tokens(final_response)
+
+    async def process_request(
+        self,
+        user_request: str,
+        conversation_id: str,
+        category: Optional[str] = None,
+        emit: Optional[EmitFn] = None,
+        use_cache: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """Process user request through agent workflow.
+
+        With emit, stage transitions and Writer/Format Agent tokens are reported
+        as they happen (see server.py SSE endpoints). use_cache=True lets an
+        identical earlier request be answered from the response cache.
+        """
+        await self.store.add_message(conversation_id, "user", user_request)
+        await self.store.update_conversation_state(conversation_id, {
+            "status": "in_progress",
+            "writer_complete": False,
+            "format_agent_complete": False,
+            "waiting_for_user": False,
+            "user_request": user_request,
+            "category": category
+        })
+
+        print("Starting Writer agent...")
+        if emit:
+            emit("stage", {"stage": "writer", "status": "started"})
+        prep = await self._prepare_writer(conversation_id, user_request, category)
+        writer_result = await self._call_writer(conversation_id, user_request, category, emit=emit, prep=prep, use_cache=use_cache)
+        template = prep["template"]
+        await self.store.update_conversation_state(conversation_id, {
+            "writer_complete": True,
+            "current_draft": writer_result,
+            "needs_review": True,
+            "template_id": template.get("id") if template else None
+        })
+        if emit:
+            emit("stage", {"stage": "writer", "status": "completed"})
+
+        print("Starting Format Agent...")
+        if emit:
+            emit("stage", {"stage": "format_agent", "status": "started"})
+        format_result = await self._call_format_agent(
+            conversation_id, writer_result, template=template, emit=emit, use_cache=use_cache
+        )
+        await self.store.update_conversation_state(conversation_id, {
+            "format_agent_complete": True,
+            "final_output": format_result,
+            "waiting_for_user": True,
+            "status": "waiting_for_approval"
+        })
+        if emit:
+            emit("stage", {"stage": "format_agent", "status": "completed"})
+
+        print("Workflow complete - waiting for user approval")
+        return {
+            "status": "waiting_for_approval",
+            "final_output": format_result,
+            "conversation_id": conversation_id
+        }
+
+    async def continue_after_user_input(
+        self,
+        conversation_id: str,
+        user_response: str,
+        emit: Optional[EmitFn] = None,
+        use_cache: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """Continue conversation after user provides input"""
+        state = await self.store.get_conversation_state(conversation_id)
+        if not state.get("waiting_for_user"):
+            return {"error": "No conversation waiting for user input"}
+
+        await self.store.add_message(conversation_id, "user", user_response)
+
+        if is_satisfaction_response(user_response):
+            await self.store.update_conversation_state(conversation_id, {
+                "status": "completed",
+                "waiting_for_user": False,
+                "user_satisfied": True
+            })
+            return {
+                "status": "completed",
+                "message": "Conversation completed successfully"
+            }
+
+        current_draft = state.get("current_draft", "")
+        if emit:
+            emit("stage", {"stage": "format_agent", "status": "started"})
+        format_result = await self._call_format_agent(
+            conversation_id, current_draft, template_id=state.get("template_id"), feedback=user_response, emit=emit,
+            use_cache=use_cache,
+        )
+        await self.store.update_conversation_state(conversation_id, {
+            "final_output": format_result,
+            "waiting_for_user": True,
+            "status": "waiting_for_approval"
+        })
+        if emit:
+            emit("stage", {"stage": "format_agent", "status": "completed"})
+
+        return {
+            "status": "waiting_for_approval",
+            "final_output": format_result,
+            "conversation_id": conversation_id
+        }
+
+    async def is_conversation_complete(self, conversation_id: str) -> bool:
+        """Check if conversation is complete"""
+        state = await self.store.get_conversation_state(conversation_id)
+        return (
+            state.get("status") == "completed" or
+            (state.get("format_agent_complete") and state.get("user_satisfied"))
+        )
+
+    async def _fetch_readwise(self, readwise_url: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not readwise_url:
+            return None
+        readwise_content = await self.store.aretrieve_readwise_content(readwise_url)
+        print(f"📖 Readwise content retrieved: {readwise_content['title']}")
+        return readwise_content
+
+    async def _prepare_writer(self, conversation_id: str, user_request: str, category: Optional[str] = None) -> Dict[str, Any]:
+        """Run the Writer's independent prep stages concurrently.
+
+        Readwise fetch, context load and template prefetch only depend on the
+        (local, instant) instruction parse. The prompt version comes from the
+        context load itself (load_agent_context returns the prompt it used), so
+        no separate lookup races it. Per-stage wall times land in "timings";
+        prep_ms is the critical path.
+        """
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+
+        parsed_instruction = self.store.parse_content_instruction(user_request)
+        print(f"🎯 Parsed instruction: ICP='{parsed_instruction['icp']}', Dream='{parsed_instruction['dream']}', Category='{parsed_instruction['category']}', Format='{parsed_instruction['format']}'")
+        readwise_url = self.store.extract_readwise_url(user_request)
+        lookup = template_lookup(parsed_instruction, category)
+
+        readwise_content, loaded, template = await asyncio.gather(
+            _timed(timings, "readwise", self._fetch_readwise(readwise_url)),
+            _timed(timings, "context", self.store.build_context_with_prompt(conversation_id, "Writer")),
+            _timed(timings, "template", self.store.get_latest_template_by_category_format(*lookup)) if lookup else _none(),
+            return_exceptions=True,
+        )
+        for result in (readwise_content, loaded):
+            if isinstance(result, BaseException):
+                raise result
+        context, prompt = loaded
+        if isinstance(template, BaseException):
+            # A missing template only means the Format Agent runs without one
+            print(f"⚠️  Template prefetch failed: {template}")
+            template = None
+
+        timings["prep_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return {
+            "parsed_instruction": parsed_instruction,
+            "readwise_url": readwise_url,
+            "readwise_content": readwise_content,
+            "context": context,
+            "prompt_version": (prompt or {}).get("version"),
+            "template": template,
+            "timings": timings,
+        }
+
+    async def _call_writer(
+        self,
+        conversation_id: str,
+        user_request: str,
+        category: Optional[str] = None,
+        emit: Optional[EmitFn] = None,
+        prep: Optional[Dict[str, Any]] = None,
+        use_cache: Optional[bool] = None,
+    ) -> str:
+        """Call Writer agent"""
+        if prep is None:
+            prep = await self._prepare_writer(conversation_id, user_request, category)
+        ctx = prep["context"]
+        parsed_instruction = prep["parsed_instruction"]
+        timings = prep["timings"]
+        ctx.append({"role": "user", "content": build_writer_prompt(user_request, prep["readwise_content"], parsed_instruction, category)})
+
+        content = await _timed(timings, "llm", self._complete_chat(ctx, emit=emit, token_event="writer_token", use_cache=use_cache))
+
+        metadata = {
+            "model": "gpt-5-mini",
+            "system_prompt_version": prep["prompt_version"],
+            "category": category,
+            "readwise_url": prep["readwise_url"],
+            "parsed_instruction": parsed_instruction,
+            "timings": timings
+        }
+        await self.store.add_message(conversation_id, "assistant", content, agent_name="Writer", metadata=metadata)
+        return content
+
+    async def _call_format_agent(
+        self,
+        conversation_id: str,
+        draft: str,
+        template_id: Optional[str] = None,
+        category: Optional[str] = None,
+        format: Optional[str] = None,
+        feedback: Optional[str] = None,
+        emit: Optional[EmitFn] = None,
+        template: Optional[Dict[str, Any]] = None,
+        use_cache: Optional[bool] = None,
+    ) -> str:
+        """Call Format Agent, with user feedback to incorporate if given (template: an already-loaded template row, skips the lookup)"""
+        print(f"🎯 Format Agent: Starting with {category}/{format}")
+
+        # Always use the prompt marked as current in system_prompts (is_current = true)
+        instructions = await self.store.get_system_prompt("Format Agent") or ""
+        print(f"📝 Format Agent: Got instructions ({len(instructions)} chars)")
+
+        # Resolve template to guide formatting if provided
+        template_text = None
+        chosen_template: Optional[Dict[str, Any]] = template
+        if chosen_template:
+            print(f"📋 Format Agent: Using prefetched template: {chosen_template.get('id')}")
+        elif template_id:
+            chosen_template = await self.store.get_template_by_id(template_id)
+            print(f"📋 Format Agent: Using template by ID: {template_id}")
+        elif category and format:
+            chosen_template = await self.store.get_latest_template_by_category_format(category, format)
+            print(f"📋 Format Agent: Using template by category/format: {category}/{format}")
+
+        if chosen_template and chosen_template.get("content"):
+            template_text = chosen_template["content"]
+            print(f"📋 Format Agent: Template loaded ({len(template_text)} chars)")
+        else:
+            print("📋 Format Agent: No template found")
+
+        input_text = format_agent_input(draft, template_text, feedback)
+        print(f"📤 Format Agent: Sending to gpt-5-mini ({len(input_text)} chars)")
+
+        # Use gpt-5-mini with Responses API for better formatting quality
+        content = await self._complete_response(
+            emit=emit, use_cache=use_cache, instructions=instructions, input=input_text, **FORMAT_AGENT_OPTIONS
+        )
+        print("📥 Format Agent: Got response from gpt-5-mini")
+
+        # Store message with version tracking (persist the current version string)
+        version_used = await self.store.get_current_prompt_version("Format Agent") or None
+        await self.store.add_message(
+            conversation_id,
+            "assistant",
+            content,
+            agent_name="Format Agent",
+            metadata=format_agent_metadata(version_used, chosen_template),
+        )
+        return content
@@ -1,36 +1,100 @@
+import asyncio
+import atexit
 import os
-import re
+import threading
 import requests
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional
 from pydantic import BaseModel
-from typing import Any, Dict, List, Optional
+from typing import Any, Coroutine, Dict, List, Optional, Tuple, TypeVar
 
-from dotenv import load_dotenv
-from supabase import Client, create_client
-from openai import OpenAI
-from .readwise_client import ReadwiseClient, ReadwiseDocument
+from supabase import Client
+from openai import AsyncOpenAI, OpenAI
+from .async_chat_store import (
+    PROMPT_CACHE_TTL_SECONDS,
+    AsyncChatStore,
+    AsyncCoordinator,
+    ContentInstructionMixin,
+    EmitFn,
+    PromptCache,
+    _create_client,
+)
+from .llm_cache import LLMCache
+from .message_writer import MESSAGE_WRITE_BEHIND, MessageWriter
 
-load_dotenv()
+T = TypeVar("T")
 
 
-def _create_client() -> Client:
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY")
-    if not url or not key:
-        raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY/ANON_KEY env vars")
-    return create_client(url, key)
+class _EventLoopThread:
+    """An event loop on a daemon thread that runs the async store/coordinator for sync callers."""
 
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="chatstore-loop", daemon=True)
+        self._thread.start()
 
-class ChatStore:
-    def __init__(self, client: Optional[Client] = None) -> None:
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run coro on the loop and block until it finishes."""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("ChatStore/Coordinator can't be called from their own event loop; await the async classes")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+_event_loop_thread: Optional[_EventLoopThread] = None
+_event_loop_lock = threading.Lock()
+
+
+def _get_event_loop_thread() -> _EventLoopThread:
+    """Process-wide loop shared by every ChatStore and Coordinator."""
+    global _event_loop_thread
+    if _event_loop_thread is None:
+        with _event_loop_lock:
+            if _event_loop_thread is None:
+                _event_loop_thread = _EventLoopThread()
+    return _event_loop_thread
+
+
+def _run(coro: Coroutine[Any, Any, T]) -> T:
+    return _get_event_loop_thread().run(coro)
+
+
+class ChatStore(ContentInstructionMixin):
+    """Sync store for scripts, the job runner, the Telegram bot and admin endpoints.
+
+    Conversations, messages, state, summaries, current prompts and agent
+    context are served by an AsyncChatStore (self.async_store) on a private
+    event loop, so both APIs share one implementation. Templates CRUD, prompt
+    versions and jobs use the sync client.
+    """
+
+    def __init__(
+        self,
+        client: Optional[Client] = None,
+        prompt_cache_ttl: Optional[float] = None,
+        write_behind: Optional[bool] = None,
+        prompt_cache: Optional[PromptCache] = None,
+        message_writer: Optional[MessageWriter] = None,
+    ) -> None:
         self.client: Client = client or _create_client()
-        self.llm = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+        # Pass a shared PromptCache so set_system_prompt invalidation reaches other stores too
+        self.prompt_cache = prompt_cache or PromptCache(PROMPT_CACHE_TTL_SECONDS if prompt_cache_ttl is None else prompt_cache_ttl)
+
+        # Write-behind: pass a shared MessageWriter so other stores see the same queue and overlay
+        self.write_behind = MESSAGE_WRITE_BEHIND if write_behind is None else write_behind
+        self.message_writer = message_writer or (MessageWriter(self.client) if self.write_behind else None)
+
+        # Does the actual work on the private event loop (its AsyncClient uses the SUPABASE_* env vars)
+        self.async_store = AsyncChatStore(
+            prompt_cache=self.prompt_cache, message_writer=self.message_writer, write_behind=self.write_behind
+        )
+        # Registered after the writer's own hook, so it runs first: summaries finish before the final flush
+        atexit.register(self.close)
 
     # Conversations
     def create_conversation(self, title: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
-        row = {"title": title, "user_id": user_id}
-        res = self.client.table("conversations").insert(row).execute()
-        return res.data[0]
+        return _run(self.async_store.create_conversation(title, user_id))
 
     def archive_conversation(self, conversation_id: str) -> Dict[str, Any]:
         res = (
@@ -57,17 +121,26 @@ class ChatStore:
         user_id: Optional[str] = None,
         agent_name: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None,
+        durable: bool = False,
     ) -> Dict[str, Any]:
-        row = {
-            "conversation_id": conversation_id,
-            "role": role,
-            "content": content,
-            "user_id": user_id,
-            "agent_name": agent_name,
-            "metadata": metadata or {},
-        }
-        res = self.client.table("messages").insert(row).execute()
-        return res.data[0]
+        """Insert a message (see AsyncChatStore.add_message for write-behind and durable)."""
+        return _run(self.async_store.add_message(conversation_id, role, content, user_id, agent_name, metadata, durable))
+
+    def flush(self) -> None:
+        """Block until every queued message has been written.
+
+        Raises MessageWriteError if some messages still can't be stored; they
+        stay queued (and on disk) for later retries.
+        """
+        if self.message_writer is not None:
+            self.message_writer.flush()
+
+    def close(self) -> None:
+        """Wait for background summaries, then flush queued messages and stop the write-behind worker."""
+        if _event_loop_thread is not None:
+            _run(self.async_store.aclose())
+        if self.message_writer is not None:
+            self.message_writer.close()
 
     def get_messages(
         self,
@@ -75,31 +148,16 @@ class ChatStore:
         limit: int = 100,
         before_iso: Optional[str] = None,
     ) -> List[Dict[str, Any]]:
-        q = (
-            self.client.table("messages")
-            .select("*")
-            .eq("conversation_id", conversation_id)
-            .order("created_at", desc=True)
-            .limit(limit)
-        )
-        if before_iso:
-            q = q.lt("created_at", before_iso)
-        res = q.execute()
-        return list(reversed(res.data))
+        return _run(self.async_store.get_messages(conversation_id, limit, before_iso))
 
     # State management
     def get_conversation_state(self, conversation_id: str) -> Dict[str, Any]:
         """Get the current state of a conversation"""
-        res = self.client.table("conversations").select("state").eq("id", conversation_id).single().execute()
-        return res.data.get("state", {}) if res.data else {}
+        return _run(self.async_store.get_conversation_state(conversation_id))
 
     def update_conversation_state(self, conversation_id: str, state_updates: Dict[str, Any]) -> Dict[str, Any]:
-        """Update conversation state (merges with existing state)"""
-        current_state = self.get_conversation_state(conversation_id)
-        new_state = {**current_state, **state_updates}
-        
-        res = self.client.table("conversations").update({"state": new_state}).eq("id", conversation_id).execute()
-        return res.data[0] if res.data else {}
+        """Update conversation state (merges with existing state, server-side)."""
+        return _run(self.async_store.update_conversation_state(conversation_id, state_updates))
 
     # Summary management
     def get_conversation_summary(self, conversation_id: str) -> Optional[str]:
@@ -107,36 +165,28 @@ class ChatStore:
         return res.data.get("summary") if res.data else None
 
     def update_running_summary(self, conversation_id: str, recent_turns: int = 200) -> Optional[str]:
-        """Summarize recent messages and store to conversations.summary"""
-        messages = self.get_messages(conversation_id, limit=recent_turns)
-        if not messages:
-            return None
+        """Fold messages newer than the summary watermark into conversations.summary."""
+        return _run(self.async_store.update_running_summary(conversation_id, recent_turns))
 
-        transcript = "\n".join([f"{m['role']}: {m['content']}" for m in messages])
-
-        prompt = [
-            {"role": "system", "content": "Summarize key facts, decisions, and user preferences. Be concise."},
-            {"role": "user", "content": transcript[:12000]}
-        ]
-        res = self.llm.chat.completions.create(model="gpt-5-mini", messages=prompt)
-        summary = res.choices[0].message.content
+    # System prompts management
+    def invalidate_prompt_cache(self, agent_name: Optional[str] = None) -> None:
+        """Drop cached prompts for one agent, or for all agents if agent_name is None."""
+        self.prompt_cache.invalidate(agent_name)
 
-        self.client.table("conversations").update({"summary": summary}).eq("id", conversation_id).execute()
-        return summary
+    def prompt_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for the prompt registry cache."""
+        return self.prompt_cache.stats()
 
-    # System prompts management
     def get_system_prompt(self, agent_name: str, version: Optional[str] = None) -> Optional[str]:
         """Get system prompt for agent. If version is None, gets current version."""
         if version:
             res = self.client.table("system_prompts").select("prompt").eq("agent_name", agent_name).eq("version", version).single().execute()
-        else:
-            res = self.client.table("system_prompts").select("prompt").eq("agent_name", agent_name).eq("is_current", True).single().execute()
-        return res.data.get("prompt") if res.data else None
+            return res.data.get("prompt") if res.data else None
+        return _run(self.async_store.get_system_prompt(agent_name))
 
     def get_current_prompt_version(self, agent_name: str) -> Optional[str]:
         """Get the current version string for an agent's system prompt."""
-        res = self.client.table("system_prompts").select("version").eq("agent_name", agent_name).eq("is_current", True).single().execute()
-        return res.data.get("version") if res.data else None
+        return _run(self.async_store.get_current_prompt_version(agent_name))
 
     def set_system_prompt(self, agent_name: str, prompt: str, version: str, set_as_current: bool = True) -> Dict[str, Any]:
         """Set system prompt for agent. If set_as_current=True, marks as current and unmarks others."""
@@ -152,24 +202,33 @@ class ChatStore:
         if set_as_current:
             self.client.table("system_prompts").update({"is_current": False}).eq("agent_name", agent_name).neq("version", version).execute()
         
+        self.invalidate_prompt_cache(agent_name)
         return res.data[0] if res.data else {}
 
     # Context builder
-    def build_context_for_agent(self, conversation_id: str, agent_name: str, recent_turns: int = 30) -> List[Dict[str, str]]:
-        """Build context using stored system prompt for agent"""
-        messages: List[Dict[str, str]] = []
-        summary = self.get_conversation_summary(conversation_id)
-        if summary:
-            messages.append({"role": "system", "content": f"Conversation summary:\n{summary}"})
-        
-        # Get agent's system prompt from DB
-        agent_prompt = self.get_system_prompt(agent_name)
-        if agent_prompt:
-            messages.append({"role": "system", "content": agent_prompt})
-        
-        recent = self.get_messages(conversation_id, limit=recent_turns)
-        messages.extend({"role": m["role"], "content": m["content"]} for m in recent)
-        return messages
+    def load_agent_context(self, conversation_id: str, agent_name: str, recent_turns: int = 30) -> Dict[str, Any]:
+        """Fetch summary, current agent prompt and recent messages in a single round trip."""
+        return _run(self.async_store.load_agent_context(conversation_id, agent_name, recent_turns))
+
+    def build_context_for_agent(
+        self,
+        conversation_id: str,
+        agent_name: str,
+        recent_turns: Optional[int] = None,
+        token_budget: Optional[int] = None,
+    ) -> List[Dict[str, str]]:
+        """Build context using stored system prompt for agent (see AsyncChatStore.build_context_for_agent)."""
+        return _run(self.async_store.build_context_for_agent(conversation_id, agent_name, recent_turns, token_budget))
+
+    def build_context_with_prompt(
+        self,
+        conversation_id: str,
+        agent_name: str,
+        recent_turns: Optional[int] = None,
+        token_budget: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, str]], Optional[Dict[str, Any]]]:
+        """build_context_for_agent plus the {"prompt", "version"} entry it was built from."""
+        return _run(self.async_store.build_context_with_prompt(conversation_id, agent_name, recent_turns, token_budget))
 
     # Content Templates
     def create_template(
@@ -214,8 +273,7 @@ class ChatStore:
 
     def get_template_by_id(self, template_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific template by ID."""
-        res = self.client.table("content_templates").select("*").eq("id", template_id).single().execute()
-        return res.data if res.data else None
+        return _run(self.async_store.get_template_by_id(template_id))
 
     def get_latest_template_by_category_format(
         self,
@@ -223,19 +281,7 @@ class ChatStore:
         format: str,
     ) -> Optional[Dict[str, Any]]:
         """Get the most recent template for a category/format pair."""
-        res = (
-            self.client
-            .table("content_templates")
-            .select("*")
-            .eq("category", category)
-            .eq("format", format)
-            .order("created_at", desc=True)
-            .limit(1)
-            .execute()
-        )
-        if res.data:
-            return res.data[0]
-        return None
+        return _run(self.async_store.get_latest_template_by_category_format(category, format))
 
     def update_template(
         self,
@@ -251,448 +297,127 @@ class ChatStore:
         res = self.client.table("content_templates").delete().eq("id", template_id).execute()
         return len(res.data) > 0
 
-    # Readwise Content Retrieval
-    def extract_readwise_url(self, text: str) -> Optional[str]:
-        """Extract Readwise URL from text if present."""
-        # First try YAML format: - url: <url>
-        yaml_url_pattern = r'-\s*url:\s*(https://read\.readwise\.io/[^\s\]]+)'
-        match = re.search(yaml_url_pattern, text, re.IGNORECASE)
-        if match:
-            return match.group(1)
-        
-        # Fallback to direct URL pattern
-        readwise_pattern = r'https://read\.readwise\.io/[^\s\]]+'
-        match = re.search(readwise_pattern, text)
-        return match.group(0) if match else None
-
-    def retrieve_readwise_content(self, url: str) -> Dict[str, Any]:
-        """Retrieve content from Readwise URL using the proper Readwise API."""
-        try:
-            print(f"📖 Retrieving Readwise content from: {url}")
-            
-            # Extract document ID from Readwise URL
-            # URL format: https://read.readwise.io/new/read/01k56vzpz8cz9zncnsj2drsqer
-            doc_id_match = re.search(r'/read/([a-zA-Z0-9]+)', url)
-            if not doc_id_match:
-                raise ValueError(f"Could not extract document ID from URL: {url}")
-            
-            document_id = doc_id_match.group(1)
-            print(f"📖 Extracted document ID: {document_id}")
-            
-            # Use the existing Readwise client
-            client = ReadwiseClient()
-            document = client.get_document_content(document_id, include_html=True)
-            
-            if not document:
-                raise ValueError(f"Document {document_id} not found in Readwise")
-            
-            print(f"✅ Retrieved: {document.title} ({document.word_count} words)")
-            print(f"Author: {document.author}")
-            print(f"URL: {document.url}")
-            
-            # Use html_content if available, otherwise fall back to content
-            content = document.html_content or document.content or ""
-            
-            # Clean the content for better processing
-            if content:
-                # Remove HTML tags and clean up whitespace
-                clean_content = re.sub(r'<[^>]+>', ' ', content)
-                clean_content = re.sub(r'\s+', ' ', clean_content).strip()
-                
-                # Limit content length for processing
-                if len(clean_content) > 8000:
-                    clean_content = clean_content[:8000] + "..."
-            else:
-                clean_content = "No content available"
-            
-            result = {
-                "title": document.title,
-                "content": clean_content,
-                "html_content": document.html_content,
-                "author": document.author,
-                "url": document.url,
-                "word_count": document.word_count,
-                "document_id": document_id,
-                "success": True,
-                "content_length": len(clean_content)
-            }
-            
-            print(f"✅ Retrieved Readwise content: {result['content_length']} characters")
-            return result
-            
-        except Exception as e:
-            print(f"❌ Error retrieving Readwise content: {e}")
-            return {
-                "title": "Error",
-                "content": f"Failed to retrieve content from {url}: {str(e)}",
-                "url": url,
-                "success": False,
-                "error": str(e)
-            }
-
-    def parse_content_instruction(self, instruction: str) -> Dict[str, Optional[str]]:
-        """Parse YAML-style instruction format:
-        - url: <url>
-        - icp: <target audience>
-        - dream: <desired outcome>
-        - category: <content category>
-        - format: <content format>
-        """
-        result = {
-            "icp": None,
-            "dream": None,
-            "category": None,
-            "format": None,
-            "instruction_text": instruction
-        }
-        
-        # Pattern to match YAML-style key-value pairs
-        yaml_pattern = r'-\s*(\w+):\s*(.+?)(?=\n\s*-\s*\w+:|$)'
-        matches = re.findall(yaml_pattern, instruction, re.MULTILINE | re.DOTALL)
-        
-        for key, value in matches:
-            key = key.strip().lower()
-            value = value.strip()
-            
-            if key == "icp":
-                result["icp"] = value
-            elif key == "dream":
-                result["dream"] = value
-            elif key == "category":
-                result["category"] = value
-            elif key == "format":
-                result["format"] = value
-        
-        return result
+    # Coordinator jobs
+    def create_job(self, kind: str, payload: Dict[str, Any], conversation_id: Optional[str] = None) -> Dict[str, Any]:
+        """Persist a queued coordinator job."""
+        row = {"kind": kind, "payload": payload, "status": "queued", "conversation_id": conversation_id}
+        res = self.client.table("coordinator_jobs").insert(row).execute()
+        return res.data[0]
 
+    def update_job(self, job_id: str, **updates: Any) -> Optional[Dict[str, Any]]:
+        res = self.client.table("coordinator_jobs").update(updates).eq("id", job_id).execute()
+        return res.data[0] if res.data else None
 
-class Coordinator:
-    """Orchestrates agent workflows with completion tracking"""
-    
-    def __init__(self, store: ChatStore, client: OpenAI):
-        self.store = store
-        self.client = client
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        res = self.client.table("coordinator_jobs").select("*").eq("id", job_id).limit(1).execute()
+        return res.data[0] if res.data else None
 
-    def process_request(self, user_request: str, conversation_id: str, category: Optional[str] = None) -> Dict[str, Any]:
-        """Process user request through agent workflow"""
-        # Add user message
-        self.store.add_message(conversation_id, "user", user_request)
-        
-        # Reset conversation state
-        self.store.update_conversation_state(conversation_id, {
-            "status": "in_progress",
-            "writer_complete": False,
-            "format_agent_complete": False,
-            "waiting_for_user": False,
-            "user_request": user_request,
-            "category": category
-        })
-        
-        # Step 1: Writer
-        print("Starting Writer agent...")
-        writer_result = self._call_writer(conversation_id, user_request, category)
-        
-        # Update state after writer
-        self.store.update_conversation_state(conversation_id, {
-            "writer_complete": True,
-            "current_draft": writer_result,
-            "needs_review": True
-        })
-        
-        # Step 2: Format Agent
-        print("Starting Format Agent...")
-        format_result = self._call_format_agent(conversation_id, writer_result)
-        
-        # Update state after format agent
-        self.store.update_conversation_state(conversation_id, {
-            "format_agent_complete": True,
-            "final_output": format_result,
-            "waiting_for_user": True,
-            "status": "waiting_for_approval"
-        })
-        
-        print("Workflow complete - waiting for user approval")
-        return {
-            "status": "waiting_for_approval",
-            "final_output": format_result,
-            "conversation_id": conversation_id
-        }
+    def list_queued_jobs(self, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Queued jobs, oldest first (used to pick up work after a restart)."""
+        res = (
+            self.client.table("coordinator_jobs")
+            .select("*")
+            .eq("status", "queued")
+            .order("created_at")
+            .limit(limit)
+            .execute()
+        )
+        return res.data
 
-    def continue_after_user_input(self, conversation_id: str, user_response: str) -> Dict[str, Any]:
-        """Continue conversation after user provides input"""
-        state = self.store.get_conversation_state(conversation_id)
-        
-        if not state.get("waiting_for_user"):
-            return {"error": "No conversation waiting for user input"}
-        
-        # Add user response
-        self.store.add_message(conversation_id, "user", user_response)
-        
-        # Check if user wants to continue or is satisfied
-        if self._is_satisfaction_response(user_response):
-            # Mark as complete
-            self.store.update_conversation_state(conversation_id, {
-                "status": "completed",
-                "waiting_for_user": False,
-                "user_satisfied": True
-            })
-            return {
-                "status": "completed",
-                "message": "Conversation completed successfully"
-            }
-        else:
-            # User wants changes - call Format Agent with feedback
-            current_draft = state.get("current_draft", "")
-            format_result = self._call_format_agent_with_feedback(conversation_id, current_draft, user_response)
-            
-            # Update state
-            self.store.update_conversation_state(conversation_id, {
-                "final_output": format_result,
-                "waiting_for_user": True,
-                "status": "waiting_for_approval"
-            })
-            
-            return {
-                "status": "waiting_for_approval",
-                "final_output": format_result,
-                "conversation_id": conversation_id
-            }
+    def claim_job(self, job_id: str, worker: str, attempts: int) -> Optional[Dict[str, Any]]:
+        """Move a queued job to running for worker; None if another worker claimed it first.
 
-    def is_conversation_complete(self, conversation_id: str) -> bool:
-        """Check if conversation is complete"""
-        state = self.store.get_conversation_state(conversation_id)
-        return (
-            state.get("status") == "completed" or
-            (state.get("format_agent_complete") and state.get("user_satisfied"))
+        The status filter makes this a single conditional UPDATE, so of several
+        instances racing for the same job exactly one gets the row back.
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        res = (
+            self.client.table("coordinator_jobs")
+            .update({"status": "running", "worker": worker, "attempts": attempts, "started_at": now, "heartbeat_at": now})
+            .eq("id", job_id)
+            .eq("status", "queued")
+            .execute()
         )
+        return res.data[0] if res.data else None
 
-    def _call_writer(self, conversation_id: str, user_request: str, category: Optional[str] = None) -> str:
-        """Call Writer agent"""
-        ctx = self.store.build_context_for_agent(conversation_id, "Writer", recent_turns=10)
-        
-        # Check for Readwise URL and retrieve content
-        readwise_url = self.store.extract_readwise_url(user_request)
-        readwise_content = None
-        if readwise_url:
-            readwise_content = self.store.retrieve_readwise_content(readwise_url)
-            print(f"📖 Readwise content retrieved: {readwise_content['title']}")
-        
-        # Parse instruction format if present
-        parsed_instruction = self.store.parse_content_instruction(user_request)
-        print(f"🎯 Parsed instruction: ICP='{parsed_instruction['icp']}', Dream='{parsed_instruction['dream']}', Category='{parsed_instruction['category']}', Format='{parsed_instruction['format']}'")
-        
-        # Build enhanced prompt
-        enhanced_prompt = user_request
-        
-        # Add Readwise content if available
-        if readwise_content and readwise_content.get("success"):
-            enhanced_prompt += f"\n\n--- READWISE ARTICLE TO SUMMARIZE ---\n"
-            enhanced_prompt += f"Title: {readwise_content['title']}\n"
-            enhanced_prompt += f"Author: {readwise_content.get('author', 'Unknown')}\n"
-            enhanced_prompt += f"URL: {readwise_content['url']}\n"
-            enhanced_prompt += f"Word Count: {readwise_content.get('word_count', 'Unknown')}\n"
-            enhanced_prompt += f"Content: {readwise_content['content']}\n"
-            enhanced_prompt += f"--- END READWISE ARTICLE ---\n"
-            enhanced_prompt += f"\nTASK: Summarize this article and create LinkedIn content based on it.\n"
-        
-        # Add parsed instruction context
-        if parsed_instruction["icp"] or parsed_instruction["dream"]:
-            enhanced_prompt += f"\n\n--- CONTENT STRATEGY ---\n"
-            if parsed_instruction["icp"]:
-                enhanced_prompt += f"Target ICP: {parsed_instruction['icp']}\n"
-            if parsed_instruction["dream"]:
-                enhanced_prompt += f"Desired Outcome: {parsed_instruction['dream']}\n"
-            if parsed_instruction["category"]:
-                enhanced_prompt += f"Content Category: {parsed_instruction['category']}\n"
-            if parsed_instruction["format"]:
-                enhanced_prompt += f"Content Format: {parsed_instruction['format']}\n"
-            enhanced_prompt += f"--- END CONTENT STRATEGY ---\n"
-        
-        # Add category context to user prompt if provided
-        if category:
-            category_context = f"\n\nContent Strategy Category: {category.upper()}\n"
-            category_context += f"Focus on creating content that serves the {category} goal:\n"
-            if category == "attract":
-                category_context += "- Build awareness and trust\n- Get the right people to notice and remember you"
-            elif category == "nurture":
-                category_context += "- Show authority and create demand\n- Build trust and keep audience engaged"
-            elif category == "convert":
-                category_context += "- Qualify and filter buyers\n- Move them toward working with you"
-            enhanced_prompt += category_context
-        
-        ctx.append({"role": "user", "content": enhanced_prompt})
-        
-        response = self.client.chat.completions.create(model="gpt-5-mini", messages=ctx)
-        content = response.choices[0].message.content
-        
-        # Store message with version tracking and metadata
-        metadata = {
-            "model": "gpt-5-mini", 
-            "system_prompt_version": self.store.get_current_prompt_version("Writer"), 
-            "category": category,
-            "readwise_url": readwise_url,
-            "parsed_instruction": parsed_instruction
-        }
-        
-        self.store.add_message(
-            conversation_id, "assistant", content, 
-            agent_name="Writer",
-            metadata=metadata
+    def heartbeat_jobs(self, job_ids: List[str], worker: str) -> None:
+        """Mark running jobs as still alive."""
+        (
+            self.client.table("coordinator_jobs")
+            .update({"heartbeat_at": datetime.now(timezone.utc).isoformat()})
+            .in_("id", job_ids)
+            .eq("worker", worker)
+            .eq("status", "running")
+            .execute()
         )
-        
-        return content
 
-    def _call_format_agent(
-        self,
-        conversation_id: str,
-        draft: str,
-        template_id: Optional[str] = None,
-        category: Optional[str] = None,
-        format: Optional[str] = None,
-    ) -> str:
-        """Call Format Agent"""
-        print(f"🎯 Format Agent: Starting with {category}/{format}")
-        
-        # Always use the prompt marked as current in system_prompts (is_current = true)
-        instructions = self.store.get_system_prompt("Format Agent") or ""
-        print(f"📝 Format Agent: Got instructions ({len(instructions)} chars)")
-
-        # Resolve template to guide formatting if provided
-        template_text = None
-        chosen_template: Optional[Dict[str, Any]] = None
-        if template_id:
-            chosen_template = self.store.get_template_by_id(template_id)
-            print(f"📋 Format Agent: Using template by ID: {template_id}")
-        elif category and format:
-            chosen_template = self.store.get_latest_template_by_category_format(category, format)
-            print(f"📋 Format Agent: Using template by category/format: {category}/{format}")
-        
-        if chosen_template and chosen_template.get("content"):
-            template_text = chosen_template["content"]
-            print(f"📋 Format Agent: Template loaded ({len(template_text)} chars)")
-        else:
-            print("📋 Format Agent: No template found")
-
-        # Prepare input
-        input_text = (
-            "Review and transform this draft into a LinkedIn-ready post following the required format.\n\n"
-            + (f"Template to follow (style/structure):\n{template_text}\n\n" if template_text else "")
-            + f"Draft:\n{draft}"
-        )
-        print(f"📤 Format Agent: Sending to gpt-5-mini ({len(input_text)} chars)")
-
-        # Use gpt-5-mini with Responses API for better formatting quality
-        response = self.client.responses.create(
-            model="gpt-5-mini",
-            instructions=instructions,
-            input=input_text,
-            reasoning={"effort": "medium"},
-            text={"format": {"type": "text"}, "verbosity": "medium"},
-        )
-        
-        print("📥 Format Agent: Got response from gpt-5-mini")
-
-        content = getattr(response, "output_text", "") or ""
-        if not content:
-            # Fallback extraction if SDK structure changes
-            for item in getattr(response, "output", []) or []:
-                for block in getattr(item, "content", []) or []:
-                    if getattr(block, "type", "") in ("output_text", "input_text"):
-                        text_val = getattr(block, "text", "") or ""
-                        if text_val:
-                            content = text_val
-                            break
-                if content:
-                    break
-
-        # Store message with version tracking (persist the current version string)
-        version_used = self.store.get_current_prompt_version("Format Agent") or None
-        self.store.add_message(
-            conversation_id,
-            "assistant",
-            content,
-            agent_name="Format Agent",
-            metadata={
-                "model": "gpt-5-mini",
-                "system_prompt_version": version_used,
-                "template_id": (chosen_template or {}).get("id") if chosen_template else None,
-                "template_category": (chosen_template or {}).get("category") if chosen_template else None,
-                "template_format": (chosen_template or {}).get("format") if chosen_template else None,
-            },
+    def fail_orphaned_jobs(self, stale_seconds: float) -> List[Dict[str, Any]]:
+        """Fail running jobs whose worker stopped heartbeating (the process died mid-run)."""
+        now = datetime.now(timezone.utc)
+        stale_before = (now - timedelta(seconds=stale_seconds)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        res = (
+            self.client.table("coordinator_jobs")
+            .update({
+                "status": "failed",
+                "error": "Interrupted: the worker running this job stopped",
+                "finished_at": now.isoformat(),
+            })
+            .eq("status", "running")
+            .or_(f"heartbeat_at.is.null,heartbeat_at.lt.{stale_before}")
+            .execute()
         )
+        return res.data
 
-        return content
 
-    def _call_format_agent_with_feedback(
+class Coordinator:
+    """Sync wrapper around AsyncCoordinator; the workflow runs on the store's private event loop."""
+    
+    def __init__(
         self,
-        conversation_id: str,
-        draft: str,
-        feedback: str,
-        template_id: Optional[str] = None,
-        category: Optional[str] = None,
-        format: Optional[str] = None,
-    ) -> str:
-        """Call Format Agent with user feedback"""
-        # Always use the prompt marked as current in system_prompts (is_current = true)
-        instructions = self.store.get_system_prompt("Format Agent") or ""
-
-        # Resolve template
-        template_text = None
-        chosen_template: Optional[Dict[str, Any]] = None
-        if template_id:
-            chosen_template = self.store.get_template_by_id(template_id)
-        elif category and format:
-            chosen_template = self.store.get_latest_template_by_category_format(category, format)
-        if chosen_template and chosen_template.get("content"):
-            template_text = chosen_template["content"]
-
-        response = self.client.responses.create(
-            model="gpt-5-mini",
-            instructions=instructions,
-            input=(
-                "Review and transform this draft into a LinkedIn-ready post following the required format.\n\n"
-                + (f"Template to follow (style/structure):\n{template_text}\n\n" if template_text else "")
-                + f"Draft:\n{draft}\n\nUser feedback to incorporate:\n{feedback}"
-            ),
-            reasoning={"effort": "medium"},
-            text={"format": {"type": "text"}, "verbosity": "medium"},
+        store: ChatStore,
+        client: Optional[OpenAI] = None,
+        cache: Optional[LLMCache] = None,
+        bypass_cache: Optional[bool] = None,
+    ):
+        self.store = store
+        self.client = client
+        # Same account and endpoint as the given client, but async for the event loop
+        async_client = (
+            AsyncOpenAI(api_key=client.api_key, base_url=client.base_url)
+            if client is not None
+            else AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         )
+        self.async_coordinator = AsyncCoordinator(store.async_store, async_client, cache, bypass_cache)
 
-        content = getattr(response, "output_text", "") or ""
-        if not content:
-            for item in getattr(response, "output", []) or []:
-                for block in getattr(item, "content", []) or []:
-                    if getattr(block, "type", "") in ("output_text", "input_text"):
-                        text_val = getattr(block, "text", "") or ""
-                        if text_val:
-                            content = text_val
-                            break
-                if content:
-                    break
-
-        version_used = self.store.get_current_prompt_version("Format Agent") or None
-        self.store.add_message(
-            conversation_id,
-            "assistant",
-            content,
-            agent_name="Format Agent",
-            metadata={
-                "model": "gpt-5-mini",
-                "system_prompt_version": version_used,
-                "template_id": (chosen_template or {}).get("id") if chosen_template else None,
-                "template_category": (chosen_template or {}).get("category") if chosen_template else None,
-                "template_format": (chosen_template or {}).get("format") if chosen_template else None,
-            },
-        )
+    @property
+    def cache(self) -> LLMCache:
+        return self.async_coordinator.cache
+
+    @property
+    def bypass_cache(self) -> bool:
+        return self.async_coordinator.bypass_cache
 
-        return content
+    def process_request(
+        self,
+        user_request: str,
+        conversation_id: str,
+        category: Optional[str] = None,
+        emit: Optional[EmitFn] = None,
+        use_cache: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """Process user request through agent workflow (emit is called from the loop thread)."""
+        return _run(self.async_coordinator.process_request(user_request, conversation_id, category, emit, use_cache))
 
-    def _is_satisfaction_response(self, response: str) -> bool:
-        """Check if user response indicates satisfaction"""
-        satisfaction_indicators = [
-            "perfect", "great", "good", "looks good", "that works", 
-            "i'm satisfied", "done", "complete", "thanks", "approve"
-        ]
-        response_lower = response.lower()
-        return any(indicator in response_lower for indicator in satisfaction_indicators)
+    def continue_after_user_input(
+        self,
+        conversation_id: str,
+        user_response: str,
+        emit: Optional[EmitFn] = None,
+        use_cache: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """Continue conversation after user provides input"""
+        return _run(self.async_coordinator.continue_after_user_input(conversation_id, user_response, emit, use_cache))
 
+    def is_conversation_complete(self, conversation_id: str) -> bool:
+        """Check if conversation is complete"""
+        return _run(self.async_coordinator.is_conversation_complete(conversation_id))
@@ -0,0 +1,128 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# tiktoken gives exact counts for OpenAI models; fall back to a rough estimate without it.
+try:
+    import tiktoken  # type: ignore
+    _HAS_TIKTOKEN = True
+except Exception:
+    _HAS_TIKTOKEN = False
+
+# Chat format adds a few tokens per message for role and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class ContextPlanner:
+    """Fits agent context into a token budget.
+
+    Priority order: system prompt, conversation summary, newest turns, then
+    older turns. Token counts are memoized per message id so repeated builds
+    over the same history don't re-tokenize it.
+    """
+
+    def __init__(self, model: str = "gpt-5-mini", max_cached_messages: int = 10000) -> None:
+        self.model = model
+        self.max_cached_messages = max_cached_messages
+        self._encoding = self._load_encoding(model)
+        self._message_tokens: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_encoding(model: str) -> Optional[Any]:
+        if not _HAS_TIKTOKEN:
+            return None
+        try:
+            return tiktoken.encoding_for_model(model)
+        except Exception:
+            pass
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            return None
+
+    def count_tokens(self, text: str) -> int:
+        """Token count for a piece of text (approximate if no tokenizer is available)."""
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(text) // 4 + 1
+
+    def message_tokens(self, message: Dict[str, Any]) -> int:
+        """Token cost of one chat message, memoized by message id when it has one."""
+        message_id = message.get("id")
+        if message_id is not None:
+            with self._lock:
+                cached = self._message_tokens.get(message_id)
+                if cached is not None:
+                    self._message_tokens.move_to_end(message_id)
+                    return cached
+
+        tokens = self.count_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+        if message_id is not None:
+            with self._lock:
+                self._message_tokens[message_id] = tokens
+                while len(self._message_tokens) > self.max_cached_messages:
+                    self._message_tokens.popitem(last=False)
+        return tokens
+
+    def fit_newest(self, messages: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+        """Keep the newest messages (input oldest first) that fit in budget, oldest first."""
+        selected: List[Dict[str, Any]] = []
+        remaining = budget
+        for message in reversed(messages):
+            cost = self.message_tokens(message)
+            if cost > remaining:
+                break
+            selected.append(message)
+            remaining -= cost
+        selected.reverse()
+        return selected
+
+    def fit_oldest(self, messages: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+        """Leading run of messages (oldest first) that fits in budget; always at least one."""
+        selected: List[Dict[str, Any]] = []
+        remaining = budget
+        for message in messages:
+            cost = self.message_tokens(message)
+            if selected and cost > remaining:
+                break
+            selected.append(message)
+            remaining -= cost
+        return selected
+
+    def plan(
+        self,
+        budget: int,
+        system_prompt: Optional[str] = None,
+        summary: Optional[str] = None,
+        history: Optional[List[Dict[str, Any]]] = None,
+    ) -> List[Dict[str, str]]:
+        """Build the message list for an agent call within budget tokens."""
+        remaining = budget
+
+        prompt_message = None
+        if system_prompt:
+            prompt_message = {"role": "system", "content": system_prompt}
+            # The agent prompt is always sent, even if it alone exceeds the budget
+            remaining -= self.count_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+
+        summary_message = None
+        if summary:
+            content = f"Conversation summary:\n{summary}"
+            cost = self.count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+            if cost <= remaining:
+                summary_message = {"role": "system", "content": content}
+                remaining -= cost
+
+        turns = self.fit_newest(history or [], max(remaining, 0))
+
+        messages: List[Dict[str, str]] = []
+        if summary_message:
+            messages.append(summary_message)
+        if prompt_message:
+            messages.append(prompt_message)
+        messages.extend({"role": m["role"], "content": m["content"]} for m in turns)
+        return messages
@@ -11,6 +11,8 @@ create table if not exists public.conversations (
   title text,
   status text check (status in ('active','archived')) default 'active',
   summary text, -- running summary of the conversation
+  summarized_through timestamptz, -- created_at of the last message folded into summary
+  summarized_message_id uuid, -- id of that message
   state jsonb default '{}'::jsonb, -- shared state between agents
   created_at timestamptz not null default now(),
   updated_at timestamptz not null default now()
@@ -59,6 +61,29 @@ create table if not exists public.content_templates (
   updated_at timestamptz not null default now()
 );
 
+-- Background coordinator jobs (POST /coordinator/jobs); persisted so queued work survives restarts
+create table if not exists public.coordinator_jobs (
+  id uuid primary key default gen_random_uuid(),
+  kind text not null check (kind in ('start','continue')),
+  payload jsonb not null default '{}'::jsonb,
+  status text not null check (status in ('queued','running','succeeded','failed')) default 'queued',
+  conversation_id uuid null references public.conversations(id) on delete set null,
+  result jsonb,
+  error text,
+  attempts int not null default 0,
+  started_at timestamptz,
+  finished_at timestamptz,
+  created_at timestamptz not null default now(),
+  updated_at timestamptz not null default now()
+);
+
+-- Columns added after the initial release (no-ops on fresh installs)
+alter table public.conversations add column if not exists summarized_through timestamptz;
+alter table public.conversations add column if not exists summarized_message_id uuid;
+-- Job claiming: which process runs a job, and when it last reported being alive
+alter table public.coordinator_jobs add column if not exists worker text;
+alter table public.coordinator_jobs add column if not exists heartbeat_at timestamptz;
+
 -- Indexes
 create index if not exists idx_messages_conversation_time on public.messages (conversation_id, created_at desc);
 create index if not exists idx_conversations_user_time on public.conversations (user_id, created_at desc);
@@ -66,6 +91,7 @@ create index if not exists idx_messages_metadata_gin on public.messages using gi
 create index if not exists idx_system_prompts_agent_current on public.system_prompts (agent_name, is_current);
 create index if not exists idx_content_templates_category_format on public.content_templates (category, format);
 create index if not exists idx_content_templates_tags_gin on public.content_templates using gin (tags);
+create index if not exists idx_coordinator_jobs_status_time on public.coordinator_jobs (status, created_at);
 
 -- updated_at trigger
 create or replace function public.set_updated_at() returns trigger as $$
@@ -84,10 +110,49 @@ create trigger trg_content_templates_updated_at
 before update on public.content_templates
 for each row execute function public.set_updated_at();
 
+drop trigger if exists trg_coordinator_jobs_updated_at on public.coordinator_jobs;
+create trigger trg_coordinator_jobs_updated_at
+before update on public.coordinator_jobs
+for each row execute function public.set_updated_at();
+
+-- Atomic state merge: one round trip, concurrent patches can't drop each other's keys
+create or replace function public.merge_conversation_state(p_conversation_id uuid, p_patch jsonb)
+returns setof public.conversations as $$
+  update public.conversations
+  set state = coalesce(state, '{}'::jsonb) || coalesce(p_patch, '{}'::jsonb)
+  where id = p_conversation_id
+  returning *;
+$$ language sql;
+
+-- One-round-trip context load for build_context_for_agent: summary, current agent prompt, newest messages
+create or replace function public.load_agent_context(p_conversation_id uuid, p_agent_name text, p_recent_turns int default 30)
+returns jsonb as $$
+  select jsonb_build_object(
+    'summary', (select c.summary from public.conversations c where c.id = p_conversation_id),
+    'prompt', (
+      select jsonb_build_object('prompt', sp.prompt, 'version', sp.version)
+      from public.system_prompts sp
+      where sp.agent_name = p_agent_name and sp.is_current
+      limit 1
+    ),
+    'messages', coalesce((
+      select jsonb_agg(jsonb_build_object('id', m.id, 'role', m.role, 'content', m.content, 'created_at', m.created_at) order by m.created_at)
+      from (
+        select id, role, content, created_at
+        from public.messages
+        where conversation_id = p_conversation_id
+        order by created_at desc
+        limit p_recent_turns
+      ) m
+    ), '[]'::jsonb)
+  );
+$$ language sql stable;
+
 -- Enable Row Level Security (future-ready)
 alter table public.conversations enable row level security;
 alter table public.messages enable row level security;
 alter table public.content_templates enable row level security;
+alter table public.coordinator_jobs enable row level security;
 
 -- Owner-style policies; service role bypasses these during server-side use
 drop policy if exists "select own conversations" on public.conversations;
@@ -126,5 +191,5 @@ create policy "delete own messages" on public.messages for delete using (
 
 -- Sanity checks
 select 'Chat schema ready' as status;
-select table_name from information_schema.tables where table_schema = 'public' and table_name in ('conversations','messages','system_prompts','content_templates');
+select table_name from information_schema.tables where table_schema = 'public' and table_name in ('conversations','messages','system_prompts','content_templates','coordinator_jobs');
 
@@ -0,0 +1,169 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .readwise_client import ReadwiseClient, ReadwiseDocument
+
+# Fetched Readwise documents (with HTML) are kept locally, keyed by document id
+READWISE_CACHE_PATH = os.getenv("READWISE_CACHE_PATH", ".cache/readwise_documents.sqlite3")
+READWISE_CACHE_MAX_MB = float(os.getenv("READWISE_CACHE_MAX_MB", "200"))
+# Within this window a cached document is served without any network call; after it,
+# a metadata-only request checks updated_at before the HTML is downloaded again
+READWISE_CACHE_FRESH_SECONDS = float(os.getenv("READWISE_CACHE_FRESH_SECONDS", "86400"))
+
+
+def strip_html(html: str) -> str:
+    """Remove HTML tags and collapse whitespace."""
+    text = re.sub(r'<[^>]+>', ' ', html or "")
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class ReadwiseDocumentCache:
+    """SQLite cache of Readwise documents plus their extracted clean text.
+
+    Entries are revalidated against Readwise's updated_at once they are older
+    than fresh_seconds, and the least recently used ones are evicted when the
+    cache grows past max_bytes.
+    """
+
+    def __init__(
+        self,
+        path: str = READWISE_CACHE_PATH,
+        max_bytes: int = int(READWISE_CACHE_MAX_MB * 1024 * 1024),
+        fresh_seconds: float = READWISE_CACHE_FRESH_SECONDS,
+        extract_text: Callable[[str], str] = strip_html,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        self.extract_text = extract_text
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._revalidated = 0
+        self._fetches = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS readwise_documents ("
+            "id TEXT PRIMARY KEY, updated_at TEXT, document TEXT NOT NULL, clean_text TEXT NOT NULL, "
+            "size_bytes INTEGER NOT NULL, validated_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS readwise_documents_last_used ON readwise_documents(last_used)")
+        self._db.commit()
+
+    def get(self, document_id: str) -> Optional[Tuple[ReadwiseDocument, str, float]]:
+        """(document, clean_text, validated_at) from the cache, or None. No network."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT document, clean_text, validated_at FROM readwise_documents WHERE id = ?",
+                (document_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE readwise_documents SET last_used = ? WHERE id = ?", (time.time(), document_id))
+            self._db.commit()
+        return ReadwiseDocument.model_validate_json(row[0]), row[1], row[2]
+
+    def put(self, document: ReadwiseDocument, clean_text: Optional[str] = None) -> str:
+        """Store a full document (with HTML); returns its clean text."""
+        if clean_text is None:
+            clean_text = self.extract_text(document.html_content or document.content or "")
+        payload = document.model_dump_json()
+        size = len(payload.encode("utf-8")) + len(clean_text.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO readwise_documents "
+                "(id, updated_at, document, clean_text, size_bytes, validated_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (document.id, document.updated_at, payload, clean_text, size, now, now),
+            )
+            self._evict()
+            self._db.commit()
+        return clean_text
+
+    def fetch(self, document_id: str, client: Optional[ReadwiseClient] = None) -> Optional[Tuple[ReadwiseDocument, str]]:
+        """(document, clean_text) for document_id, from the cache when still current.
+
+        Fresh entries cost no network call; stale ones cost a metadata-only
+        request, and the HTML is downloaded again only if updated_at changed.
+        """
+        cached = self.get(document_id)
+        if cached is not None:
+            document, clean_text, validated_at = cached
+            if time.time() - validated_at < self.fresh_seconds:
+                self._count("_hits")
+                return document, clean_text
+
+            client = client or ReadwiseClient()
+            current = client.get_document_content(document_id, include_html=False)
+            if current is None:
+                # Readwise unreachable or document gone; the cached copy is better than nothing
+                print(f"⚠️  Could not revalidate Readwise document {document_id}, serving cached copy")
+                self._count("_hits")
+                return document, clean_text
+            if current.updated_at == document.updated_at:
+                self._touch(document_id)
+                self._count("_revalidated")
+                return document, clean_text
+
+        client = client or ReadwiseClient()
+        document = client.get_document_content(document_id, include_html=True)
+        if document is None:
+            return None
+        self._count("_fetches")
+        return document, self.put(document)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT count(*), coalesce(sum(size_bytes), 0) FROM readwise_documents"
+            ).fetchone()
+            return {
+                "hits": self._hits,
+                "revalidated": self._revalidated,
+                "fetches": self._fetches,
+                "entries": entries,
+                "size_bytes": size,
+                "max_bytes": self.max_bytes,
+            }
+
+    # Internals
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _touch(self, document_id: str) -> None:
+        with self._lock:
+            self._db.execute("UPDATE readwise_documents SET validated_at = ? WHERE id = ?", (time.time(), document_id))
+            self._db.commit()
+
+    def _evict(self) -> None:
+        (total,) = self._db.execute("SELECT coalesce(sum(size_bytes), 0) FROM readwise_documents").fetchone()
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT id, size_bytes FROM readwise_documents ORDER BY last_used").fetchall()
+        # Keep at least the most recently used document, even if it alone exceeds the budget
+        for document_id, size in rows[:-1]:
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM readwise_documents WHERE id = ?", (document_id,))
+            total -= size
+
+
+_default_cache: Optional[ReadwiseDocumentCache] = None
+_default_lock = threading.Lock()
+
+
+def get_document_cache() -> ReadwiseDocumentCache:
+    """Process-wide document cache configured from the READWISE_CACHE_* env vars."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = ReadwiseDocumentCache()
+    return _default_cache
@@ -0,0 +1,186 @@
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+from openai import OpenAI
+
+from .llm_cache import LLMCache, get_llm_cache, request_key
+
+# tiktoken gives exact counts for OpenAI models; fall back to a rough estimate without it.
+try:
+    import tiktoken  # type: ignore
+    _HAS_TIKTOKEN = True
+except Exception:
+    _HAS_TIKTOKEN = False
+
+DIGEST_MODEL = os.getenv("DIGEST_MODEL", "gpt-5-mini")
+# Documents up to this many tokens are used as-is; longer ones are digested
+DIGEST_THRESHOLD_TOKENS = int(os.getenv("DIGEST_THRESHOLD_TOKENS", "2000"))
+DIGEST_CHUNK_TOKENS = int(os.getenv("DIGEST_CHUNK_TOKENS", "3000"))
+DIGEST_WORKERS = int(os.getenv("DIGEST_WORKERS", "4"))
+
+_encodings: dict = {}
+
+
+def _encoding_for(model: str) -> Optional[Any]:
+    if not _HAS_TIKTOKEN:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except Exception:
+            try:
+                _encodings[model] = tiktoken.get_encoding("o200k_base")
+            except Exception:
+                _encodings[model] = None
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str = DIGEST_MODEL) -> int:
+    """Token count for text (approximate if no tokenizer is available)."""
+    if not text:
+        return 0
+    encoding = _encoding_for(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+MAP_PROMPT = (
+    "You are condensing one section of a longer article so it can be combined with the other sections. "
+    "Keep every concrete claim, number, name, example, and quote worth citing. Drop navigation, boilerplate, "
+    "and repetition. Write dense prose, no preamble."
+)
+REDUCE_PROMPT = (
+    "Combine these section notes from one article into a single digest in the article's order. "
+    "Preserve concrete claims, numbers, names, examples, and the author's conclusions; remove overlap. "
+    "No preamble."
+)
+
+
+class DocumentDigester:
+    """Map-reduce digest of long documents.
+
+    Text is split into token-bounded chunks on paragraph/sentence boundaries,
+    chunks are summarized in parallel, and the notes are reduced (recursively
+    if they still don't fit one chunk) into a single digest. Each LLM call and
+    the final digest go through the response cache, keyed by document id and
+    a hash of the text, so a document is digested once.
+    """
+
+    def __init__(
+        self,
+        client: Optional[OpenAI] = None,
+        model: str = DIGEST_MODEL,
+        threshold_tokens: int = DIGEST_THRESHOLD_TOKENS,
+        chunk_tokens: int = DIGEST_CHUNK_TOKENS,
+        workers: int = DIGEST_WORKERS,
+        cache: Optional[LLMCache] = None,
+    ) -> None:
+        self.client = client or OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.model = model
+        self.threshold_tokens = threshold_tokens
+        self.chunk_tokens = chunk_tokens
+        self.workers = workers
+        self.cache = cache or get_llm_cache()
+
+    def count_tokens(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    def needs_digest(self, text: str) -> bool:
+        return self.count_tokens(text) > self.threshold_tokens
+
+    def digest(self, document_id: str, text: str) -> str:
+        """Digest of text (or text itself if it's short enough to use directly)."""
+        if not self.needs_digest(text):
+            return text
+        key = request_key(
+            api="document_digest",
+            document_id=document_id,
+            text_sha256=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            model=self.model,
+            chunk_tokens=self.chunk_tokens,
+        )
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        chunks = self.split(text)
+        print(f"🧩 Digesting document {document_id}: {len(chunks)} chunks")
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="digest") as pool:
+            notes = list(pool.map(lambda chunk: self._complete(MAP_PROMPT, chunk), chunks))
+            # Reduce in groups that fit one chunk until a single digest remains
+            while len(notes) > 1:
+                groups = self._group(notes)
+                if len(groups) == len(notes):
+                    # Each note alone fills a chunk; reduce pairwise so the loop always shrinks
+                    groups = [notes[i:i + 2] for i in range(0, len(notes), 2)]
+                notes = list(pool.map(lambda group: self._complete(REDUCE_PROMPT, "\n\n---\n\n".join(group)), groups))
+
+        digest = notes[0]
+        self.cache.put(key, digest, self.count_tokens(text))
+        return digest
+
+    def split(self, text: str) -> List[str]:
+        """Token-bounded chunks, breaking on paragraphs, then sentences, then characters."""
+        pieces: List[str] = []
+        for paragraph in re.split(r"\n\s*\n", text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if self.count_tokens(paragraph) <= self.chunk_tokens:
+                pieces.append(paragraph)
+                continue
+            for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+                if self.count_tokens(sentence) <= self.chunk_tokens:
+                    pieces.append(sentence)
+                else:
+                    step = self.chunk_tokens * 4
+                    pieces.extend(sentence[i:i + step] for i in range(0, len(sentence), step))
+        return ["\n\n".join(group) for group in self._group(pieces)]
+
+    def _group(self, pieces: List[str]) -> List[List[str]]:
+        """Pack consecutive pieces into groups of at most chunk_tokens."""
+        groups: List[List[str]] = []
+        current: List[str] = []
+        used = 0
+        for piece in pieces:
+            cost = self.count_tokens(piece)
+            if current and used + cost > self.chunk_tokens:
+                groups.append(current)
+                current, used = [], 0
+            current.append(piece)
+            used += cost
+        if current:
+            groups.append(current)
+        return groups
+
+    def _complete(self, instructions: str, text: str) -> str:
+        messages = [
+            {"role": "system", "content": instructions},
+            {"role": "user", "content": text},
+        ]
+
+        def compute():
+            response = self.client.chat.completions.create(model=self.model, messages=messages)
+            usage = getattr(response, "usage", None)
+            return response.choices[0].message.content or "", getattr(usage, "total_tokens", None)
+
+        return self.cache.cached(request_key(api="chat.completions", model=self.model, messages=messages), compute)
+
+
+_default_digester: Optional[DocumentDigester] = None
+_default_lock = threading.Lock()
+
+
+def get_document_digester() -> DocumentDigester:
+    """Process-wide digester configured from the DIGEST_* env vars."""
+    global _default_digester
+    if _default_digester is None:
+        with _default_lock:
+            if _default_digester is None:
+                _default_digester = DocumentDigester()
+    return _default_digester
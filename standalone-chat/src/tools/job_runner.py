@@ -0,0 +1,248 @@
+import os
+import queue
+import socket
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from .chat_store import ChatStore, Coordinator
+
+COORDINATOR_JOB_WORKERS = int(os.getenv("COORDINATOR_JOB_WORKERS", "2"))
+COORDINATOR_JOB_QUEUE_SIZE = int(os.getenv("COORDINATOR_JOB_QUEUE_SIZE", "100"))
+# Running jobs are touched this often; ones silent for COORDINATOR_JOB_STALE_SECONDS are failed as interrupted
+COORDINATOR_JOB_HEARTBEAT_SECONDS = float(os.getenv("COORDINATOR_JOB_HEARTBEAT_SECONDS", "30"))
+COORDINATOR_JOB_STALE_SECONDS = float(os.getenv("COORDINATOR_JOB_STALE_SECONDS", "120"))
+
+TERMINAL_JOB_STATUSES = ("succeeded", "failed")
+
+# Jobs kept in memory for fast polling; older ones are read back from the DB
+MAX_TRACKED_JOBS = 1000
+
+_STOP = object()
+
+
+class JobQueueFull(Exception):
+    """Raised when the job queue is at COORDINATOR_JOB_QUEUE_SIZE."""
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class JobRunner:
+    """Runs coordinator workflows on a bounded worker pool.
+
+    Jobs are persisted in coordinator_jobs before they are queued, so work that
+    was still queued when the process stopped is picked up again by start().
+    Workers claim a job with a conditional update before running it, so with
+    several instances each job runs once. A job that was running when its
+    process died is not re-run (its side effects may already be stored): once
+    its heartbeat is stale it is marked failed as interrupted.
+    """
+
+    def __init__(
+        self,
+        store: ChatStore,
+        coordinator: Coordinator,
+        workers: int = COORDINATOR_JOB_WORKERS,
+        max_queue: int = COORDINATOR_JOB_QUEUE_SIZE,
+    ) -> None:
+        self.store = store
+        self.coordinator = coordinator
+        self.workers = workers
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._threads: List[threading.Thread] = []
+        # Latest known row per job this process touched, so polling doesn't hit the DB
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Job ids this process has picked up, so a job queued twice (submit racing recovery) runs once
+        self._claimed: set = set()
+        # Job ids this process is running, kept alive by the heartbeat thread
+        self._running: set = set()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stopped = threading.Event()
+
+    # Lifecycle
+    def start(self) -> None:
+        """Start workers and re-enqueue jobs left unfinished by a previous process."""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"coordinator-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._stopped.clear()
+        threading.Thread(target=self._recover, name="coordinator-job-recovery", daemon=True).start()
+        threading.Thread(target=self._heartbeat_loop, name="coordinator-job-heartbeat", daemon=True).start()
+
+    def shutdown(self) -> None:
+        """Stop workers once their current job finishes; queued jobs stay queued in the DB."""
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        self._threads = []
+        self._stopped.set()
+
+    def _recover(self) -> None:
+        self._fail_orphaned()
+        try:
+            jobs = self.store.list_queued_jobs()
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"❌ Could not load queued jobs: {e}")
+            return
+        if jobs:
+            print(f"♻️  Re-queueing {len(jobs)} queued coordinator jobs")
+        for job in jobs:
+            with self._lock:
+                if job["id"] in self._jobs:
+                    continue
+            self._remember(job)
+            # Blocking put: recovered work waits for queue space instead of being dropped
+            self._queue.put(job["id"])
+
+    # Public API
+    def submit(self, kind: str, payload: Dict[str, Any], conversation_id: Optional[str] = None) -> Dict[str, Any]:
+        """Persist and enqueue a job; raises JobQueueFull when the queue is at capacity."""
+        if self._queue.full():
+            raise JobQueueFull("Coordinator job queue is full, retry later")
+        job = self.store.create_job(kind, payload, conversation_id=conversation_id)
+        self._remember(job)
+        try:
+            self._queue.put_nowait(job["id"])
+        except queue.Full:
+            self._update(job["id"], status="failed", error="Job queue full", finished_at=_now_iso())
+            raise JobQueueFull("Coordinator job queue is full, retry later")
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        return self.store.get_job(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._threads),
+            "queued": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+        }
+
+    # Internals
+    def _remember(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self._track(job)
+
+    def _track(self, job: Dict[str, Any]) -> None:
+        self._jobs[job["id"]] = job
+        self._jobs.move_to_end(job["id"])
+        while len(self._jobs) > MAX_TRACKED_JOBS:
+            self._jobs.popitem(last=False)
+
+    def _update(self, job_id: str, **updates: Any) -> None:
+        try:
+            row = self.store.update_job(job_id, **updates)
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"❌ Could not persist job {job_id} update: {e}")
+            row = None
+        with self._lock:
+            current = dict(self._jobs.get(job_id) or {"id": job_id})
+            current.update(row or updates)
+            self._track(current)
+
+    def _fail_orphaned(self) -> None:
+        try:
+            jobs = self.store.fail_orphaned_jobs(COORDINATOR_JOB_STALE_SECONDS)
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"❌ Could not check for interrupted jobs: {e}")
+            return
+        for job in jobs:
+            print(f"⚠️  Coordinator job {job['id']} was interrupted (worker {job.get('worker')}); marked failed")
+            with self._lock:
+                if job["id"] in self._jobs:
+                    self._track(job)
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stopped.wait(COORDINATOR_JOB_HEARTBEAT_SECONDS):
+            with self._lock:
+                running = list(self._running)
+            if running:
+                try:
+                    self.store.heartbeat_jobs(running, self.worker_id)
+                except Exception as e:  # pylint: disable=broad-except
+                    print(f"❌ Could not heartbeat running jobs: {e}")
+            self._fail_orphaned()
+
+    def _worker_loop(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            if job_id is _STOP:
+                break
+            self._run(job_id)
+
+    def _run(self, job_id: str) -> None:
+        with self._lock:
+            if job_id in self._claimed:
+                return
+            self._claimed.add(job_id)
+        try:
+            self._run_claimed(job_id)
+        finally:
+            with self._lock:
+                self._claimed.discard(job_id)
+
+    def _run_claimed(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if job is None or job.get("status") in TERMINAL_JOB_STATUSES:
+            return
+
+        try:
+            claimed = self.store.claim_job(job_id, self.worker_id, attempts=(job.get("attempts") or 0) + 1)
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"❌ Could not claim coordinator job {job_id}: {e}")
+            return
+        if claimed is None:
+            # Another instance got it first (or it is no longer queued); show its current row when polled
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            return
+        self._remember(claimed)
+
+        payload = claimed.get("payload") or {}
+        with self._lock:
+            self._running.add(job_id)
+        print(f"⚙️  Running coordinator job {job_id} ({claimed['kind']})")
+        try:
+            if claimed["kind"] == "start":
+                conversation_id = claimed.get("conversation_id")
+                if not conversation_id:
+                    conv = self.store.create_conversation(title=payload.get("conversation_title") or "New conversation")
+                    conversation_id = conv["id"]
+                    self._update(job_id, conversation_id=conversation_id)
+                result = self.coordinator.process_request(
+                    payload["user_request"], conversation_id, payload.get("category"), use_cache=payload.get("use_cache")
+                )
+            else:
+                conversation_id = payload["conversation_id"]
+                result = self.coordinator.continue_after_user_input(
+                    conversation_id, payload["user_response"], use_cache=payload.get("use_cache")
+                )
+            self._update(
+                job_id,
+                status="succeeded",
+                result={"conversation_id": conversation_id, **result},
+                finished_at=_now_iso(),
+            )
+            print(f"✅ Coordinator job {job_id} finished")
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"❌ Coordinator job {job_id} failed: {e}")
+            self._update(job_id, status="failed", error=str(e), finished_at=_now_iso())
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
@@ -0,0 +1,341 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from postgrest.exceptions import APIError
+from supabase import Client
+
+# Write-behind message persistence (off by default)
+MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "").lower() in ("1", "true", "yes")
+MESSAGE_WRITE_QUEUE_SIZE = int(os.getenv("MESSAGE_WRITE_QUEUE_SIZE", "1000"))
+MESSAGE_WRITE_BATCH_SIZE = int(os.getenv("MESSAGE_WRITE_BATCH_SIZE", "50"))
+MESSAGE_WRITE_FLUSH_INTERVAL = float(os.getenv("MESSAGE_WRITE_FLUSH_INTERVAL", "0.2"))
+MESSAGE_WRITE_MAX_ATTEMPTS = 3
+# Rows that still failed after MESSAGE_WRITE_MAX_ATTEMPTS are kept here (and retried) until stored or dead-lettered
+MESSAGE_SPILL_PATH = os.getenv("MESSAGE_SPILL_PATH", ".cache/unwritten_messages.jsonl")
+MESSAGE_WRITE_RETRY_SECONDS = float(os.getenv("MESSAGE_WRITE_RETRY_SECONDS", "5"))
+# Rows that can never be stored (deleted conversation, malformed payload) are moved here, one JSON line each
+MESSAGE_DEAD_LETTER_PATH = os.getenv("MESSAGE_DEAD_LETTER_PATH", ".cache/dead_letter_messages.jsonl")
+
+_STOP = object()
+
+
+def _created_at_key(row: Dict[str, Any]) -> datetime:
+    return datetime.fromisoformat(row["created_at"])
+
+
+def _error_code(error: Exception) -> str:
+    return str(error.code or "") if isinstance(error, APIError) else ""
+
+
+def _is_outage(error: Exception) -> bool:
+    """Database unreachable or overloaded: every row would fail alike, so nothing is counted against the rows."""
+    if isinstance(error, httpx.TransportError):
+        return True
+    code = _error_code(error)
+    if code.isdigit() and len(code) == 3:
+        # HTTP status of a response that wasn't PostgREST JSON (e.g. a gateway error)
+        return code.startswith("5") or code == "429"
+    # PGRST00x: PostgREST can't reach the database; SQLSTATE 08/53/57P: connection, resources, shutdown
+    return code.startswith(("PGRST00", "08", "53", "57P"))
+
+
+def _is_permanent(error: Exception) -> bool:
+    """Errors a retry can't fix: rejected requests, bad data, constraint violations, unknown columns."""
+    code = _error_code(error)
+    if code.isdigit() and len(code) == 3:
+        return code.startswith("4") and code != "429"
+    return code.startswith(("PGRST1", "PGRST2", "22", "23", "42"))
+
+
+def stamp_message(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Give row a client-side id and created_at, so queued rows keep their order and can be deduped on read."""
+    row["id"] = str(uuid.uuid4())
+    row["created_at"] = datetime.now(timezone.utc).isoformat()
+    return row
+
+
+class MessageWriteError(Exception):
+    """Raised by flush() (and durable writes) while queued messages could not be stored."""
+
+
+class MessageWriter:
+    """Write-behind queue for chat messages, shared by ChatStore and AsyncChatStore.
+
+    Rows get a client-side id and created_at, are queued for a batched insert
+    on a background thread, and stay in a per-conversation overlay until they
+    are stored, so reads through either store see them right away. Sharing one
+    writer keeps a single queue and overlay per process.
+    """
+
+    def __init__(self, client: Client) -> None:
+        self.client = client
+        self._pending_messages: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._pending_lock = threading.Lock()
+        self._write_queue: "queue.Queue[Any]" = queue.Queue(maxsize=MESSAGE_WRITE_QUEUE_SIZE)
+        # Rows whose insert kept failing: stay in the overlay, spilled to disk, retried until stored
+        self._unwritten: Dict[str, Dict[str, Any]] = {}
+        # Failed single-row inserts per row id; a row is dead-lettered after MESSAGE_WRITE_MAX_ATTEMPTS
+        self._row_attempts: Dict[str, int] = {}
+        self._write_error: Optional[Exception] = None
+        self._write_lock = threading.Lock()
+        self._load_spilled_messages()
+        self._writer_thread: Optional[threading.Thread] = threading.Thread(
+            target=self._write_behind_loop, name="message-writer", daemon=True
+        )
+        self._writer_thread.start()
+        atexit.register(self.close)
+
+    @property
+    def running(self) -> bool:
+        return self._writer_thread is not None
+
+    def submit(self, row: Dict[str, Any]) -> bool:
+        """Stamp id/created_at on row, add it to the overlay and queue it.
+
+        Returns False when the queue is full; the caller then writes the row
+        itself with write([row]) (backpressure instead of unbounded growth).
+        """
+        stamp_message(row)
+        with self._pending_lock:
+            self._pending_messages.setdefault(row["conversation_id"], {})[row["id"]] = row
+        try:
+            self._write_queue.put_nowait(row)
+        except queue.Full:
+            return False
+        return True
+
+    def write(self, rows: List[Dict[str, Any]]) -> bool:
+        """Multi-row insert of queued messages, retried a few times.
+
+        Rows carry client-side ids, so the insert ignores ids already stored and
+        a retry after a partly successful attempt can't duplicate messages.
+        If the database rejects the batch, rows are inserted one at a time: a
+        row that can't be stored (permanent error, or failing on its own in
+        MESSAGE_WRITE_MAX_ATTEMPTS writes) goes to MESSAGE_DEAD_LETTER_PATH so
+        it can't block later messages. Rows that still fail (plus any
+        earlier unwritten ones) stay in the read overlay and in
+        MESSAGE_SPILL_PATH until a later retry stores them. Returns False while
+        some rows remain unwritten.
+        """
+        with self._write_lock:
+            ids = {row["id"] for row in rows}
+            with self._pending_lock:
+                retry = [row for row in self._unwritten.values() if row["id"] not in ids]
+            rows = retry + rows
+            if not rows:
+                return True
+            error: Optional[Exception] = None
+            for attempt in range(1, MESSAGE_WRITE_MAX_ATTEMPTS + 1):
+                try:
+                    self._upsert(rows)
+                    error = None
+                    break
+                except Exception as e:  # pylint: disable=broad-except
+                    error = e
+                    print(f"❌ Message batch insert failed (attempt {attempt}/{MESSAGE_WRITE_MAX_ATTEMPTS}, {len(rows)} rows): {e}")
+                    if not _is_outage(e):
+                        break
+                    if attempt < MESSAGE_WRITE_MAX_ATTEMPTS:
+                        time.sleep(0.5 * attempt)
+
+            if error is None:
+                done, failed, dead = rows, [], []
+            elif _is_outage(error):
+                # Database unreachable: keep every row for the next retry
+                done, failed, dead = [], rows, []
+            else:
+                done, failed, dead = self._write_one_by_one(rows)
+            for row, _ in dead:
+                done.append(row)
+
+            with self._pending_lock:
+                for row in done:
+                    self._unwritten.pop(row["id"], None)
+                    self._row_attempts.pop(row["id"], None)
+                    pending = self._pending_messages.get(row["conversation_id"])
+                    if pending is not None:
+                        pending.pop(row["id"], None)
+                        if not pending:
+                            self._pending_messages.pop(row["conversation_id"], None)
+                for row in failed:
+                    self._unwritten[row["id"]] = row
+                if failed:
+                    self._write_error = error
+                elif not self._unwritten:
+                    self._write_error = None
+                unwritten = list(self._unwritten.values())
+            if dead:
+                self._dead_letter(dead)
+            if failed or retry:
+                self._save_spilled_messages(unwritten)
+            if failed:
+                print(f"💾 {len(unwritten)} messages not yet stored; kept in {MESSAGE_SPILL_PATH} and retried")
+            return not failed
+
+    def _upsert(self, rows: List[Dict[str, Any]]) -> None:
+        self.client.table("messages").upsert(rows, on_conflict="id", ignore_duplicates=True).execute()
+
+    def _write_one_by_one(
+        self, rows: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Tuple[Dict[str, Any], Exception]]]:
+        """Insert rows singly after a rejected batch: (stored, retry later, dead-lettered with their error)."""
+        stored: List[Dict[str, Any]] = []
+        failed: List[Dict[str, Any]] = []
+        dead: List[Tuple[Dict[str, Any], Exception]] = []
+        for i, row in enumerate(rows):
+            try:
+                self._upsert([row])
+                stored.append(row)
+                continue
+            except Exception as e:  # pylint: disable=broad-except
+                error = e
+            if _is_outage(error):
+                failed.extend(rows[i:])
+                break
+            if not _is_permanent(error):
+                self._row_attempts[row["id"]] = self._row_attempts.get(row["id"], 0) + 1
+                if self._row_attempts[row["id"]] < MESSAGE_WRITE_MAX_ATTEMPTS:
+                    failed.append(row)
+                    continue
+            dead.append((row, error))
+        return stored, failed, dead
+
+    def _dead_letter(self, dead: List[Tuple[Dict[str, Any], Exception]]) -> None:
+        """Append rows that can't be stored to MESSAGE_DEAD_LETTER_PATH (they leave the queue and the overlay)."""
+        for row, error in dead:
+            print(f"🪦 Message {row['id']} in conversation {row['conversation_id']} can't be stored, dead-lettered: {error}")
+        if not MESSAGE_DEAD_LETTER_PATH:
+            return
+        try:
+            directory = os.path.dirname(MESSAGE_DEAD_LETTER_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            failed_at = datetime.now(timezone.utc).isoformat()
+            with open(MESSAGE_DEAD_LETTER_PATH, "a", encoding="utf-8") as f:
+                f.writelines(
+                    json.dumps({"row": row, "error": str(error), "failed_at": failed_at}, default=str) + "\n"
+                    for row, error in dead
+                )
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"❌ Could not write dead-lettered messages to {MESSAGE_DEAD_LETTER_PATH}: {e}")
+
+    def _load_spilled_messages(self) -> None:
+        """Re-queue messages a previous process could not store."""
+        if not MESSAGE_SPILL_PATH or not os.path.exists(MESSAGE_SPILL_PATH):
+            return
+        try:
+            with open(MESSAGE_SPILL_PATH, encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"❌ Could not read unwritten messages from {MESSAGE_SPILL_PATH}: {e}")
+            return
+        with self._pending_lock:
+            for row in rows:
+                self._unwritten[row["id"]] = row
+                self._pending_messages.setdefault(row["conversation_id"], {})[row["id"]] = row
+        if rows:
+            print(f"💾 Retrying {len(rows)} unwritten messages from {MESSAGE_SPILL_PATH}")
+
+    def _save_spilled_messages(self, rows: List[Dict[str, Any]]) -> None:
+        if not MESSAGE_SPILL_PATH:
+            return
+        try:
+            if not rows:
+                if os.path.exists(MESSAGE_SPILL_PATH):
+                    os.remove(MESSAGE_SPILL_PATH)
+                return
+            directory = os.path.dirname(MESSAGE_SPILL_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{MESSAGE_SPILL_PATH}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(row, default=str) + "\n" for row in rows)
+            os.replace(tmp_path, MESSAGE_SPILL_PATH)
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"❌ Could not save unwritten messages to {MESSAGE_SPILL_PATH}: {e}")
+
+    def _write_behind_loop(self) -> None:
+        """Background worker: drain the queue in batches of up to MESSAGE_WRITE_BATCH_SIZE."""
+        stopping = False
+        while not stopping:
+            try:
+                # Wake up periodically while some rows are still unwritten
+                item = self._write_queue.get(timeout=MESSAGE_WRITE_RETRY_SECONDS if self._unwritten else None)
+            except queue.Empty:
+                self.write([])
+                continue
+            if item is _STOP:
+                self._write_queue.task_done()
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + MESSAGE_WRITE_FLUSH_INTERVAL
+            while len(batch) < MESSAGE_WRITE_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    nxt = self._write_queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    self._write_queue.task_done()
+                    stopping = True
+                    break
+                batch.append(nxt)
+
+            self.write(batch)
+            for _ in batch:
+                self._write_queue.task_done()
+
+    def flush(self) -> None:
+        """Block until every queued message has been written.
+
+        Raises MessageWriteError if some messages still can't be stored; they
+        stay queued (and on disk) for later retries.
+        """
+        if self._writer_thread is not None and self._writer_thread.is_alive():
+            self._write_queue.join()
+        if self._unwritten and not self.write([]):
+            with self._pending_lock:
+                count, error = len(self._unwritten), self._write_error
+            raise MessageWriteError(f"{count} messages not yet stored (kept in {MESSAGE_SPILL_PATH}): {error}")
+
+    def close(self) -> None:
+        """Flush queued messages and stop the background writer."""
+        if self._writer_thread is None:
+            return
+        if self._writer_thread.is_alive():
+            self._write_queue.put(_STOP)
+            self._writer_thread.join()
+        self._writer_thread = None
+        if self._unwritten and not self.write([]):
+            print(f"⚠️  {len(self._unwritten)} messages not stored; they stay in {MESSAGE_SPILL_PATH} for the next start")
+
+    def merge_pending(
+        self,
+        conversation_id: str,
+        rows: List[Dict[str, Any]],
+        limit: int,
+        before_iso: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Overlay not-yet-written messages on rows read from the DB (oldest first)."""
+        with self._pending_lock:
+            pending = list(self._pending_messages.get(conversation_id, {}).values())
+        if not pending:
+            return rows
+        if before_iso:
+            cutoff = datetime.fromisoformat(before_iso)
+            pending = [r for r in pending if _created_at_key(r) < cutoff]
+        seen = {r.get("id") for r in rows}
+        merged = rows + [r for r in pending if r["id"] not in seen]
+        merged.sort(key=_created_at_key)
+        return merged[-limit:] if limit else merged
@@ -4,6 +4,8 @@ from typing import Dict, List, Optional
 from pydantic import BaseModel
 from dotenv import load_dotenv, find_dotenv
 
+from .readwise_transport import ReadwiseTransport, get_readwise_transport
+
 # Ensure environment variables are loaded from the nearest .env if present
 load_dotenv(find_dotenv(usecwd=True), override=False)
 
@@ -33,8 +35,8 @@ class ReadwiseDocument(BaseModel):
     last_moved_at: str
 
 class ReadwiseClient:
-    def __init__(self, api_token: Optional[str] = None):
-        """Initialize Readwise API client."""
+    def __init__(self, api_token: Optional[str] = None, transport: Optional[ReadwiseTransport] = None):
+        """Initialize Readwise API client (transport defaults to the shared pooled one)."""
         # Try to get token from parameter, environment, or settings
         if api_token:
             self.api_token = api_token
@@ -64,6 +66,7 @@ class ReadwiseClient:
             raise ValueError("READWISE token not found. Set READWISE_TOKEN (or readwise_token) in .env")
 
         self.base_url = "https://readwise.io/api/v3"
+        self.transport = transport or get_readwise_transport()
         self.headers = {
             "Authorization": f"Token {self.api_token}",
             "Content-Type": "application/json"
@@ -74,9 +77,7 @@ class ReadwiseClient:
         url = f"{self.base_url}/{endpoint}"
 
         try:
-            response = requests.get(url, headers=self.headers, params=params, timeout=30)
-            response.raise_for_status()
-            return response.json()
+            return self.transport.get(url, headers=self.headers, params=params, timeout=30)
         except requests.exceptions.RequestException as e:
             print(f"Readwise API request failed: {e}")
             return {}